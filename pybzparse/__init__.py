@@ -1,4 +1,5 @@
 from pybzparse.parser import Parser
 import pybzparse.boxes
 import pybzparse.headers
+import pybzparse.index
 import pybzparse.utils
@@ -1,8 +1,14 @@
+import copy
+import weakref
 from abc import ABCMeta, abstractmethod
 
 from pybzparse import Parser
 
 from pybzparse.headers import FullBoxHeader
+from pybzparse.sample_index import SampleIndex
+from pybzparse.sources import PAYLOAD_CHUNK_SIZE, PayloadView, \
+                              read_at, read_bytes
+from pybzparse.writers import BufferWriter, get_writer
 from pybzparse.fields_lists import *
 from pybzparse.sub_fields_lists import EditListSubFieldsList, \
                                        TimeToSampleSubFieldsList, \
@@ -13,13 +19,20 @@ from pybzparse.sub_fields_lists import EditListSubFieldsList, \
                                        ChunkOffset64SubFieldsList, \
                                        ItemLocationSubFieldsList, \
                                        ItemPropertyAssociationSubFieldsList, \
-                                       HEVCConfigurationSubFieldsList
+                                       HEVCConfigurationSubFieldsList, \
+                                       TrackRunSubFieldsList, \
+                                       TrackFragmentRandomAccessSubFieldsList
 
 
 class MixinDictRepr(object):
     def __repr__(self, *args, **kwargs):
+        content = self.__dict__
+        if isinstance(self, AbstractFieldsList):
+            # The values of the fields are kept in slots
+            content = dict(content, **{"_" + field.name: field.value
+                                       for field in self.fields})
         return "{class_name} : {content!r} ".format(class_name=self.__class__.__name__,
-                                                    content=self.__dict__)
+                                                    content=content)
 
 
 class MixinMinimalRepr(object):
@@ -35,10 +48,36 @@ class AbstractBox(metaclass=ABCMeta):
         self._header = header
         self._remaining_bytes = 0
         self._padding = None
+        # The container of the box, set when the box is appended or parsed
+        self._parent = None
+        # The size of the box could be out of date
+        self._dirty = True
+        # The stream the box was parsed from. Its bytes are copied as they
+        # are while the box isn't modified
+        self._source = None
 
     def __bytes__(self):
         return b''.join([bytes(self._header), self._get_content_bytes(), self.padding])
 
+    def __getstate__(self):
+        # The fields of the box are kept in slots
+        state = AbstractFieldsList.__getstate__(self) \
+            if isinstance(self, AbstractFieldsList) else self.__dict__.copy()
+        # Memory-mapped payloads can't be pickled, copy them
+        for name, value in state.items():
+            if isinstance(value, memoryview):
+                state[name] = bytes(value)
+        # The parent is restored by its container
+        state["_parent"] = None
+        state["_source"] = None
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(self, AbstractFieldsList):
+            AbstractFieldsList.__setstate__(self, state)
+        else:
+            self.__dict__.update(state)
+
     @property
     def header(self):
         return self._header
@@ -46,6 +85,11 @@ class AbstractBox(metaclass=ABCMeta):
     @header.setter
     def header(self, value):
         self._header = value
+        self._mark_dirty()
+
+    @property
+    def dirty(self):
+        return self._dirty
 
     @property
     def padding(self):
@@ -55,6 +99,50 @@ class AbstractBox(metaclass=ABCMeta):
     @padding.setter
     def padding(self, value):
         self._padding = value
+        self._mark_dirty()
+
+    def mark_dirty(self):
+        """ Flag the box and its containers to have their size refreshed.
+        This is only needed after modifying the content of a box without
+        using its fields, like editing a list value or the columns of a
+        sample table in place """
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        self._mark_modified()
+        self._mark_size_dirty()
+
+    def _mark_size_dirty(self):
+        box = self
+        while box is not None and not box._dirty:
+            box._dirty = True
+            box = box._parent() if box._parent is not None else None
+
+    def _mark_modified(self):
+        # The bytes of the source are out of date for the box and its
+        # containers. A container with a sub-box without a source is already
+        # considered modified
+        box = self
+        while box is not None and box._source is not None:
+            box._source = None
+            box = box._parent() if box._parent is not None else None
+        self._reset_caches()
+
+    def _reset_caches(self):
+        # Values cached by the containers from their sub-boxes are out of
+        # date. Containers with a cache override this to reset it
+        parent = self._parent() if self._parent is not None else None
+        if parent is not None:
+            parent._reset_caches()
+
+    def _is_unmodified(self):
+        """ Whether the bytes of the box in its source are still its bytes """
+        if self._source is None:
+            return False
+        # Changes to the header aren't tracked, compare it with the source
+        return bytes(self._header) == read_at(self._source,
+                                              self._header.start_pos,
+                                              self._header.header_size)
 
     @abstractmethod
     def load(self, bstr):
@@ -65,24 +153,107 @@ class AbstractBox(metaclass=ABCMeta):
         self._remaining_bytes = self._header.start_pos + self._header.box_size - \
             bstr.bytepos
         if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+            self._padding = read_bytes(bstr, self._remaining_bytes)
+        self._dirty = False
+        self._source = bstr
 
     @abstractmethod
     def parse_impl(self, bstr):
         raise NotImplemented()
 
+    def _load_padding(self, bstr, pos):
+        # The bytes between the content and the end of the box
+        self._remaining_bytes = self._header.start_pos + \
+            self._header.box_size - pos
+        if self._remaining_bytes != 0:
+            self._padding = read_at(bstr, pos, self._remaining_bytes)
+
     def refresh_box_size(self):
-        # TODO: this could be optimized if needed
-        content_size = len(self._get_content_bytes())
-        padding_size = len(self.padding)
-        box_size = len(bytes(self._header)) + content_size + padding_size
-        if self._header.box_size != box_size:
-            self._header.update_box_size(content_size + padding_size)
+        if not self._dirty:
+            return
+        self._update_box_size(self._get_content_size())
+        self._dirty = False
+
+    def _update_box_size(self, content_size):
+        content_size += len(self.padding)
+        if self._header.content_size != content_size:
+            self._header.update_box_size(content_size)
 
     @abstractmethod
     def _get_content_bytes(self):
         raise NotImplemented()
 
+    def _get_content_size(self):
+        return len(self._get_content_bytes())
+
+    def write_to(self, target):
+        """
+        Serialize the box directly to the target without building the bytes
+        of its containers. The boxes which weren't modified since they were
+        parsed are copied from their source
+
+        :param target: A file object or a writable buffer
+        :return: the number of bytes written
+        """
+        writer = get_writer(target)
+        start_pos = writer.pos
+        self._write(writer)
+        return writer.pos - start_pos
+
+    def _write(self, writer):
+        if self._is_unmodified():
+            writer.copy_from(self._source, self._header.start_pos,
+                             self._header.box_size)
+        else:
+            self._write_serialized(writer)
+
+    def _write_serialized(self, writer):
+        writer.write_fields(self._header)
+        self._write_content(writer)
+        writer.write(self.padding)
+
+    def _write_content(self, writer):
+        writer.write(self._get_content_bytes())
+
+    def patch(self, buffer):
+        """
+        Write the box over its bytes in a writable buffer of the file it was
+        parsed from, like a writable MappedBitStream buffer. Only the values
+        of fixed size fields can be changed, the containers only patch their
+        header and fields, not their sub-boxes
+
+        :param buffer: writable bytes-like object of the whole file
+        :type buffer: memoryview, mmap.mmap, bytearray
+        :raises: ValueError if the size of the box or of its fields changed
+        """
+        start_pos = self._header.start_pos
+        if start_pos is None:
+            raise ValueError("Box {} wasn't parsed from a file"
+                             .format(self._header.type))
+        header = Parser.parse_header_buffer(buffer, start_pos)
+        if header.type != self._header.type or \
+           header.box_size != self._header.box_size:
+            raise ValueError("Box {} at {} doesn't match the box in the "
+                             "buffer".format(self._header.type, start_pos))
+
+        expected_size, size = self._get_patch_sizes(header)
+        if size != expected_size:
+            raise ValueError("Box {} at {} changed size from {} to {} bytes"
+                             .format(self._header.type, start_pos,
+                                     expected_size, size))
+
+        writer = BufferWriter(buffer, start_pos)
+        self._write_patch(writer)
+
+    def _get_patch_sizes(self, header):
+        return (header.box_size,
+                len(AbstractFieldsList.__bytes__(self._header)) +
+                self._get_content_size() + len(self.padding))
+
+    def _write_patch(self, writer):
+        # The values of the box are written even if it looks unmodified
+        self._write_serialized(writer)
+
     @classmethod
     def parse_box(cls, bstr, header):
         box = cls(header)
@@ -99,72 +270,221 @@ class AbstractFullBox(AbstractBox, metaclass=ABCMeta):
         return super().parse_box(bstr, full_box_header)
 
 
+class _BoxesList(list):
+    """ Sub-boxes of a container. The changes to the list mark the container
+    dirty and set the parent of the boxes added to it """
+
+    def __init__(self, container, boxes=()):
+        super().__init__(boxes)
+        self._container = weakref.ref(container)
+        for box in self:
+            box._parent = self._container
+
+    def __setitem__(self, key, value):
+        removed = self[key] if isinstance(key, slice) else [self[key]]
+        super().__setitem__(key, value)
+        added = self[key] if isinstance(key, slice) else [value]
+        self._changed(added, removed)
+
+    def __delitem__(self, key):
+        removed = self[key] if isinstance(key, slice) else [self[key]]
+        super().__delitem__(key)
+        self._changed(removed=removed)
+
+    def __iadd__(self, boxes):
+        boxes = list(boxes)
+        super().__iadd__(boxes)
+        self._changed(boxes)
+        return self
+
+    def __imul__(self, count):
+        super().__imul__(count)
+        self._changed(self)
+        return self
+
+    def append(self, box):
+        super().append(box)
+        self._changed((box,))
+
+    def extend(self, boxes):
+        self.__iadd__(boxes)
+
+    def insert(self, index, box):
+        super().insert(index, box)
+        self._changed((box,))
+
+    def pop(self, index=-1):
+        box = super().pop(index)
+        self._changed(removed=(box,))
+        return box
+
+    def remove(self, box):
+        super().remove(box)
+        self._changed(removed=(box,))
+
+    def clear(self):
+        removed = list(self)
+        super().clear()
+        self._changed(removed=removed)
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        super().reverse()
+        self._changed()
+
+    def _changed(self, added=(), removed=()):
+        for box in removed:
+            box._parent = None
+        for box in added:
+            box._parent = self._container
+        container = self._container()
+        if container is not None:
+            container._mark_dirty()
+
+
 class ContainerBox(AbstractBox, MixinDictRepr):
     def __init__(self, header):
         super().__init__(header)
 
         self._boxes_start_pos = None
-        self._boxes = []
+        self._boxes = _BoxesList(self)
+        # Source of the sub-boxes while their parsing is deferred
+        self._deferred_bstr = None
+        self._deferred_paths = None
 
     @property
     def boxes(self):
+        if self._deferred_bstr is not None:
+            self._parse_deferred_boxes()
         return self._boxes
 
+    def __getstate__(self):
+        # The source of deferred sub-boxes can't be pickled, parse them now
+        self.boxes
+        state = super().__getstate__()
+        state["_deferred_bstr"] = None
+        state["_boxes"] = list(self._boxes)
+        return state
+
     @property
     def boxes_start_pos(self):
         return self._boxes_start_pos
 
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._boxes = _BoxesList(self, self._boxes)
+
     def append(self, box):
-        self._boxes.append(box)
+        self.boxes.append(box)
 
     def clear(self):
-        del self._boxes[:]
+        self.boxes.clear()
 
     def pop(self):
-        return self._boxes.pop()
+        return self.boxes.pop()
 
     def load(self, bstr):
-        for box in self._boxes:
+        for box in self.boxes:
             box.load(bstr)
 
     def parse(self, bstr):
         self.parse_impl(bstr)
+        self._dirty = False
+        self._source = bstr
 
     def parse_impl(self, bstr):
         self._boxes_start_pos = bstr.bytepos
 
-    def parse_boxes(self, bstr, recursive=True):
+    def parse_boxes(self, bstr, recursive=True, lazy=False, paths=None):
+        self._deferred_bstr = None
+        self._deferred_paths = None
         bstr.bytepos = self._boxes_start_pos
-        self.parse_boxes_impl(bstr, recursive)
+        self.parse_boxes_impl(bstr, recursive, lazy, paths)
+        self._boxes = _BoxesList(self, self._boxes)
         # TODO: Validate in the specs if this check is needed
         self._remaining_bytes = self._header.start_pos + self._header.box_size - \
             bstr.bytepos
         if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+            self._padding = read_bytes(bstr, self._remaining_bytes)
+        self._dirty = False
 
-    def parse_boxes_impl(self, bstr, recursive=True):
+    def parse_boxes_impl(self, bstr, recursive=True, lazy=False, paths=None):
         self._boxes = []
         end_pos = self._header.start_pos + self._header.box_size
-        box_iterator = Parser.parse(bstr, recursive=recursive)
+        box_iterator = Parser.parse(bstr, recursive=recursive, lazy=lazy, paths=paths)
         while bstr.bytepos < end_pos:
             self._boxes.append(next(box_iterator))
 
+    def defer_boxes(self, bstr, paths=None):
+        """
+        Keep a handle to the source and only parse the sub-boxes when they
+        are first accessed through the boxes property
+
+        :param bstr: The bitstring holding the box
+        :param paths: Tree of the sub-boxes paths to decode
+        """
+        self._deferred_bstr = bstr
+        self._deferred_paths = paths
+
+    def _parse_deferred_boxes(self):
+        # Parse from a cursor sharing the source's data to leave the source
+        # where it was as a parse or reads could be ongoing on it
+        bstr = copy.copy(self._deferred_bstr)
+        self.parse_boxes(bstr, lazy=True, paths=self._deferred_paths)
+
     def refresh_box_size(self):
-        self.refresh_boxes_size()
+        if not self._dirty:
+            return
+        self._dirty = self.refresh_boxes_size()
         boxes_size = 0
-        for box in self._boxes:
+        for box in self.boxes:
             boxes_size += box.header.box_size
-        padding_size = len(self.padding)
-        box_size = len(bytes(self._header)) + boxes_size + padding_size
-        if self._header.box_size != box_size:
-            self._header.update_box_size(boxes_size + padding_size)
+        self._update_box_size(self._get_fields_size() + boxes_size)
 
     def refresh_boxes_size(self):
-        for box in self._boxes:
+        """
+        Refresh the size of the sub-boxes which could be out of date
+
+        :return: True if a sub-box is still dirty
+        """
+        dirty = False
+        for box in self.boxes:
             box.refresh_box_size()
+            dirty = dirty or box._dirty
+        return dirty
+
+    def _is_unmodified(self):
+        # Deferred sub-boxes can't have been modified
+        return super()._is_unmodified() and \
+            (self._deferred_bstr is not None or
+             all(box._is_unmodified() for box in self._boxes))
 
     def _get_content_bytes(self):
-        return b''.join([bytes(box) for box in self._boxes])
+        return b''.join([bytes(box) for box in self.boxes])
+
+    def _write_content(self, writer):
+        self._write_fields(writer)
+        for box in self.boxes:
+            box._write(writer)
+
+    def _write_fields(self, writer):
+        pass
+
+    def _get_fields_size(self):
+        return 0
+
+    def _get_patch_sizes(self, header):
+        # Only the fields before the sub-boxes are patched
+        return (self._boxes_start_pos - self._header.start_pos,
+                len(AbstractFieldsList.__bytes__(self._header)) +
+                self._get_fields_size())
+
+    def _write_patch(self, writer):
+        writer.write_fields(self._header)
+        self._write_fields(writer)
 
     @classmethod
     def parse_box(cls, bstr, header):
@@ -188,10 +508,12 @@ class UnknownBox(AbstractBox, MixinDictRepr):
     @payload.setter
     def payload(self, value):
         self._payload = value
+        self._mark_dirty()
 
     def load(self, bstr):
-        bstr.bytepos = self._header.start_pos + self._header.header_size
-        self._payload = bstr.read(self._header.content_size * 8).bytes
+        self._payload = read_at(bstr, self._header.start_pos +
+                                self._header.header_size,
+                                self._header.content_size)
 
     def parse_impl(self, bstr):
         bstr.bytepos = self._header.start_pos + self._header.box_size
@@ -199,6 +521,12 @@ class UnknownBox(AbstractBox, MixinDictRepr):
     def _get_content_bytes(self):
         return self._payload
 
+    def _get_content_size(self):
+        return len(self._payload)
+
+    def _write_content(self, writer):
+        writer.write(self._payload)
+
 
 class DataBox(AbstractBox, DataBoxFieldsList, MixinDictRepr):
     def __init__(self, header):
@@ -206,8 +534,7 @@ class DataBox(AbstractBox, DataBoxFieldsList, MixinDictRepr):
         DataBoxFieldsList.__init__(self)
 
     def load(self, bstr):
-        bstr.bytepos = self._header.start_pos + self._header.header_size
-        self.parse_fields(bstr, self._header)
+        self.load_fields_at(bstr, self._header)
 
     def parse_impl(self, bstr):
         bstr.bytepos = self._header.start_pos + self._header.box_size
@@ -215,6 +542,30 @@ class DataBox(AbstractBox, DataBoxFieldsList, MixinDictRepr):
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+    def iter_data(self, chunk_size=PAYLOAD_CHUNK_SIZE):
+        """
+        :param chunk_size: Maximum size of the chunks
+        :type chunk_size: int
+        :return: the data chunk by chunk, without reading it all at once
+        """
+        data = self.data
+        if data is None:
+            return
+        if isinstance(data, PayloadView):
+            yield from data.iter_chunks(chunk_size)
+            return
+        data = memoryview(data)
+        for pos in range(0, len(data), chunk_size):
+            yield data[pos:pos + chunk_size]
+
+    def _write_content(self, writer):
+        # Pass the data through without packing it
+        for chunk in self.iter_data():
+            writer.write(chunk)
+
 
 # Root boxes
 class FileTypeBox(AbstractBox, FileTypeBoxFieldsList, MixinDictRepr):
@@ -233,6 +584,9 @@ class FileTypeBox(AbstractBox, FileTypeBoxFieldsList, MixinDictRepr):
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class MediaDataBox(DataBox):
     type = b"mdat"
@@ -244,6 +598,14 @@ class MovieBox(ContainerBox, MixinDictRepr):
     type = b"moov"
 
 
+class MovieFragmentBox(ContainerBox, MixinDictRepr):
+    type = b"moof"
+
+
+class MovieFragmentRandomAccessBox(ContainerBox, MixinDictRepr):
+    type = b"mfra"
+
+
 class MetaBox(ContainerBox, MixinDictRepr):
     type = b"meta"
 
@@ -274,16 +636,51 @@ class MovieHeaderBox(AbstractFullBox, MovieHeaderBoxFieldsList, MixinDictRepr):
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class TrackBox(ContainerBox, MixinDictRepr):
     type = b"trak"
 
+    def __init__(self, header):
+        super().__init__(header)
+
+        self._sample_index = None
+
+    @property
+    def sample_index(self):
+        """ Index of the samples built from the sample table on first access.
+        It is reset when the track is loaded, its sub-boxes are parsed or one
+        of them is modified. Call mark_dirty() on a box edited in place """
+        if self._sample_index is None:
+            # TRAK.MDIA.MINF.STBL
+            stbl = self.boxes[-1].boxes[-1].boxes[-1]
+            self._sample_index = SampleIndex(stbl)
+        return self._sample_index
+
+    def load(self, bstr):
+        self._sample_index = None
+        super().load(bstr)
+
+    def _reset_caches(self):
+        self._sample_index = None
+        super()._reset_caches()
+
+    def parse_boxes(self, bstr, recursive=True, lazy=False, paths=None):
+        self._sample_index = None
+        super().parse_boxes(bstr, recursive, lazy, paths)
+
+
+class MovieExtendsBox(ContainerBox, MixinDictRepr):
+    type = b"mvex"
+
 
 # meta boxes
 class ItemReferenceBox(ContainerBox, MixinDictRepr):
     type = b"iref"
 
-    def parse_boxes_impl(self, bstr, recursive=True):
+    def parse_boxes_impl(self, bstr, recursive=True, lazy=False, paths=None):
         self._boxes = []
         end_pos = self._header.start_pos + self._header.box_size
 
@@ -297,7 +694,7 @@ class ItemReferenceBox(ContainerBox, MixinDictRepr):
             header = Parser.parse_header(bstr)
             self._boxes.append(Parser.parse_box(bstr, header,
                                                 item_reference_box_cls,
-                                                recursive))
+                                                recursive, lazy, paths))
 
     @classmethod
     def parse_box(cls, bstr, header):
@@ -323,12 +720,7 @@ class ItemLocationBox(AbstractFullBox, ItemLocationSubFieldsList, MixinDictRepr)
         ItemLocationSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -348,23 +740,23 @@ class TrackHeaderBox(AbstractFullBox, TrackHeaderBoxFieldsList, MixinDictRepr):
 
     @property
     def width(self):
-        return self._width.value[0]
+        return self._width[0]
 
     @width.setter
     def width(self, value):
-        self._set_field(self._width, value)
+        TrackHeaderBoxFieldsList.width.__set__(self, value)
 
     @property
     def height(self):
-        return self._height.value[0]
+        return self._height[0]
 
     @height.setter
     def height(self, value):
-        self._set_field(self._height, value)
+        TrackHeaderBoxFieldsList.height.__set__(self, value)
 
     @property
     def is_audio(self):
-        return self._volume.value == 1
+        return self._volume == 1
 
     def load(self, bstr):
         pass
@@ -375,6 +767,9 @@ class TrackHeaderBox(AbstractFullBox, TrackHeaderBoxFieldsList, MixinDictRepr):
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class MediaBox(ContainerBox, MixinDictRepr):
     type = b"mdia"
@@ -402,6 +797,9 @@ class SingleItemTypeReferenceBox(AbstractBox, SingleItemTypeReferenceBoxFieldsLi
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class SingleItemTypeReferenceBoxLarge(AbstractBox, SingleItemTypeReferenceBoxLargeFieldsList,
                                       MixinDictRepr):
@@ -420,6 +818,9 @@ class SingleItemTypeReferenceBoxLarge(AbstractBox, SingleItemTypeReferenceBoxLar
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 # iprp boxes
 class ItemPropertyContainerBox(ContainerBox, MixinDictRepr):
@@ -435,12 +836,7 @@ class ItemPropertyAssociationBox(AbstractFullBox, ItemPropertyAssociationSubFiel
         ItemPropertyAssociationSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -467,6 +863,9 @@ class MediaHeaderBox(AbstractFullBox, MediaHeaderBoxFieldsList, MixinDictRepr):
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class HandlerReferenceBox(AbstractFullBox, HandlerReferenceBoxFieldsList, MixinDictRepr):
     type = b"hdlr"
@@ -484,6 +883,9 @@ class HandlerReferenceBox(AbstractFullBox, HandlerReferenceBoxFieldsList, MixinD
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class MediaInformationBox(ContainerBox, MixinDictRepr):
     type = b"minf"
@@ -502,12 +904,7 @@ class EditListBox(AbstractFullBox, EditListSubFieldsList, MixinDictRepr):
         EditListSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -534,6 +931,9 @@ class VideoMediaHeaderBox(AbstractFullBox, VideoMediaHeaderBoxFieldsList, MixinD
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class NullMediaHeaderBox(AbstractFullBox, MixinDictRepr):
     type = b"nmhd"
@@ -575,41 +975,36 @@ class SampleDescriptionBox(ContainerBox, SampleDescriptionBoxFieldsList, MixinDi
 
     def append(self, box):
         super().append(box)
-        self._entry_count.value += 1
+        self._entry_count += 1
 
     def clear(self):
         super().clear()
-        self._entry_count.value = 0
+        self._entry_count = 0
 
     def pop(self):
         box = super().pop()
-        self._entry_count.value -= 1
+        self._entry_count -= 1
         return box
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
         self._boxes_start_pos = bstr.bytepos
 
-    def parse_boxes_impl(self, bstr, recursive=True):
+    def parse_boxes_impl(self, bstr, recursive=True, lazy=False, paths=None):
         self._boxes = []
-        box_iterator = Parser.parse(bstr, recursive=recursive)
-        for i in range(self._entry_count.value):
+        box_iterator = Parser.parse(bstr, recursive=recursive, lazy=lazy, paths=paths)
+        for i in range(self._entry_count):
             self._boxes.append(next(box_iterator))
 
-    def refresh_box_size(self):
-        self.refresh_boxes_size()
-        boxes_size = 0
-        for box in self._boxes:
-            boxes_size += box.header.box_size
-        fields_size = len(AbstractFieldsList.__bytes__(self))
-        padding_size = len(self.padding)
-        box_size = len(bytes(self._header)) + fields_size + boxes_size + padding_size
-        if self._header.box_size != box_size:
-            self._header.update_box_size(fields_size + boxes_size + padding_size)
+    def _get_fields_size(self):
+        return self._get_bytes_size()
+
+    def _write_fields(self, writer):
+        writer.write_fields(self)
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
     @classmethod
     def parse_box(cls, bstr, header):
@@ -628,12 +1023,7 @@ class TimeToSampleBox(AbstractFullBox, TimeToSampleSubFieldsList,
         TimeToSampleSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -642,6 +1032,13 @@ class TimeToSampleBox(AbstractFullBox, TimeToSampleSubFieldsList,
     def _get_content_bytes(self):
         return TimeToSampleSubFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+    def _write_content(self, writer):
+        writer.write_fields(self)
+        writer.write(self._get_entries_bytes())
+
 
 class CompositionOffsetBox(AbstractFullBox, CompositionOffsetSubFieldsList,
                            MixinDictRepr):
@@ -652,19 +1049,22 @@ class CompositionOffsetBox(AbstractFullBox, CompositionOffsetSubFieldsList,
         CompositionOffsetSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
         bstr.bytepos = self._header.start_pos + self._header.box_size
 
     def _get_content_bytes(self):
-        return CompositionOffsetSubFieldsList.__bytes__(self)
+        return b''.join([CompositionOffsetBoxFieldsList.__bytes__(self),
+                         self._get_entries_bytes(self._header)])
+
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+    def _write_content(self, writer):
+        writer.write_fields(self)
+        writer.write(self._get_entries_bytes(self._header))
 
 
 class SampleSizeBox(AbstractFullBox, SampleSizeSubFieldsList, MixinDictRepr):
@@ -675,12 +1075,7 @@ class SampleSizeBox(AbstractFullBox, SampleSizeSubFieldsList, MixinDictRepr):
         SampleSizeSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -689,6 +1084,13 @@ class SampleSizeBox(AbstractFullBox, SampleSizeSubFieldsList, MixinDictRepr):
     def _get_content_bytes(self):
         return SampleSizeSubFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+    def _write_content(self, writer):
+        writer.write_fields(self)
+        writer.write(self._get_entries_bytes())
+
 
 class SampleToChunkBox(AbstractFullBox, SampleToChunkSubFieldsList,
                        MixinDictRepr):
@@ -699,12 +1101,7 @@ class SampleToChunkBox(AbstractFullBox, SampleToChunkSubFieldsList,
         SampleToChunkSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -713,6 +1110,13 @@ class SampleToChunkBox(AbstractFullBox, SampleToChunkSubFieldsList,
     def _get_content_bytes(self):
         return SampleToChunkSubFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+    def _write_content(self, writer):
+        writer.write_fields(self)
+        writer.write(self._get_entries_bytes())
+
 
 class ChunkOffsetBox(AbstractFullBox, ChunkOffsetSubFieldsList, MixinDictRepr):
     type = b"stco"
@@ -722,12 +1126,7 @@ class ChunkOffsetBox(AbstractFullBox, ChunkOffsetSubFieldsList, MixinDictRepr):
         ChunkOffsetSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -736,6 +1135,13 @@ class ChunkOffsetBox(AbstractFullBox, ChunkOffsetSubFieldsList, MixinDictRepr):
     def _get_content_bytes(self):
         return ChunkOffsetSubFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+    def _write_content(self, writer):
+        writer.write_fields(self)
+        writer.write(self._get_entries_bytes())
+
 
 class ChunkOffset64Box(AbstractFullBox, ChunkOffset64SubFieldsList, MixinDictRepr):
     type = b"co64"
@@ -745,12 +1151,7 @@ class ChunkOffset64Box(AbstractFullBox, ChunkOffset64SubFieldsList, MixinDictRep
         ChunkOffset64SubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -759,6 +1160,13 @@ class ChunkOffset64Box(AbstractFullBox, ChunkOffset64SubFieldsList, MixinDictRep
     def _get_content_bytes(self):
         return ChunkOffset64SubFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+    def _write_content(self, writer):
+        writer.write_fields(self)
+        writer.write(self._get_entries_bytes())
+
 
 # dinf boxes
 class DataReferenceBox(ContainerBox, DataReferenceBoxFieldsList, MixinDictRepr):
@@ -770,41 +1178,36 @@ class DataReferenceBox(ContainerBox, DataReferenceBoxFieldsList, MixinDictRepr):
 
     def append(self, box):
         super().append(box)
-        self._entry_count.value += 1
+        self._entry_count += 1
 
     def clear(self):
         super().clear()
-        self._entry_count.value = 0
+        self._entry_count = 0
 
     def pop(self):
         box = super().pop()
-        self._entry_count.value -= 1
+        self._entry_count -= 1
         return box
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
         self._boxes_start_pos = bstr.bytepos
 
-    def parse_boxes_impl(self, bstr, recursive=True):
+    def parse_boxes_impl(self, bstr, recursive=True, lazy=False, paths=None):
         self._boxes = []
-        box_iterator = Parser.parse(bstr, recursive=recursive)
-        for i in range(self._entry_count.value):
+        box_iterator = Parser.parse(bstr, recursive=recursive, lazy=lazy, paths=paths)
+        for i in range(self._entry_count):
             self._boxes.append(next(box_iterator))
 
-    def refresh_box_size(self):
-        self.refresh_boxes_size()
-        boxes_size = 0
-        for box in self._boxes:
-            boxes_size += box.header.box_size
-        fields_size = len(AbstractFieldsList.__bytes__(self))
-        padding_size = len(self.padding)
-        box_size = len(bytes(self._header)) + fields_size + boxes_size + padding_size
-        if self._header.box_size != box_size:
-            self._header.update_box_size(fields_size + boxes_size + padding_size)
+    def _get_fields_size(self):
+        return self._get_bytes_size()
+
+    def _write_fields(self, writer):
+        writer.write_fields(self)
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
     @classmethod
     def parse_box(cls, bstr, header):
@@ -830,6 +1233,9 @@ class PrimaryItemBox(AbstractFullBox, PrimaryItemBoxFieldsList, MixinDictRepr):
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class ItemInformationBox(ContainerBox, ItemInformationBoxFieldsList, MixinDictRepr):
     type = b"iinf"
@@ -840,41 +1246,36 @@ class ItemInformationBox(ContainerBox, ItemInformationBoxFieldsList, MixinDictRe
 
     def append(self, box):
         super().append(box)
-        self._entry_count.value += 1
+        self._entry_count += 1
 
     def clear(self):
         super().clear()
-        self._entry_count.value = 0
+        self._entry_count = 0
 
     def pop(self):
         box = super().pop()
-        self._entry_count.value -= 1
+        self._entry_count -= 1
         return box
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
         self._boxes_start_pos = bstr.bytepos
 
-    def parse_boxes_impl(self, bstr, recursive=True):
+    def parse_boxes_impl(self, bstr, recursive=True, lazy=False, paths=None):
         self._boxes = []
-        box_iterator = Parser.parse(bstr, recursive=recursive)
-        for i in range(self._entry_count.value):
+        box_iterator = Parser.parse(bstr, recursive=recursive, lazy=lazy, paths=paths)
+        for i in range(self._entry_count):
             self._boxes.append(next(box_iterator))
 
-    def refresh_box_size(self):
-        self.refresh_boxes_size()
-        boxes_size = 0
-        for box in self._boxes:
-            boxes_size += box.header.box_size
-        fields_size = len(AbstractFieldsList.__bytes__(self))
-        padding_size = len(self.padding)
-        box_size = len(bytes(self._header)) + fields_size + boxes_size + padding_size
-        if self._header.box_size != box_size:
-            self._header.update_box_size(fields_size + boxes_size + padding_size)
+    def _get_fields_size(self):
+        return self._get_bytes_size()
+
+    def _write_fields(self, writer):
+        writer.write_fields(self)
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
     @classmethod
     def parse_box(cls, bstr, header):
@@ -896,20 +1297,15 @@ class SampleEntryBox(ContainerBox, SampleEntryBoxFieldsList, MixinDictRepr):
         self.parse_fields(bstr, self._header)
         self._boxes_start_pos = bstr.bytepos
 
-    def refresh_box_size(self):
-        self.refresh_boxes_size()
-        boxes_size = 0
-        for box in self._boxes:
-            boxes_size += box.header.box_size
-        fields_size = len(AbstractFieldsList.__bytes__(self))
-        padding_size = len(self.padding)
-        box_size = len(bytes(self._header)) + fields_size + boxes_size + padding_size
-        if self._header.box_size != box_size:
-            self._header.update_box_size(fields_size + boxes_size + padding_size)
+    def _get_fields_size(self):
+        return self._get_bytes_size()
+
+    def _write_fields(self, writer):
+        writer.write_fields(self)
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
 
 class VisualSampleEntryBox(SampleEntryBox, VisualSampleEntryBoxFieldsList):
@@ -925,7 +1321,7 @@ class VisualSampleEntryBox(SampleEntryBox, VisualSampleEntryBoxFieldsList):
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
 
 class AVC1SampleEntryBox(VisualSampleEntryBox):
@@ -957,7 +1353,7 @@ class SimpleTextSampleEntryBox(SampleEntryBox, SimpleTextSampleEntryBoxFieldsLis
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
 
 class MetaDataSampleEntry(SampleEntryBox):
@@ -977,7 +1373,7 @@ class TextMetaDataSampleEntryBox(MetaDataSampleEntry, TextMetaDataSampleEntryBox
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
 
 class SubtitleSampleEntryBox(SampleEntryBox):
@@ -997,7 +1393,7 @@ class TextSubtitleSampleEntryBox(MetaDataSampleEntry, TextSubtitleSampleEntryBox
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
 
 # dref boxes
@@ -1017,6 +1413,9 @@ class DataEntryUrlBox(AbstractFullBox, DataEntryUrlBoxFieldsList, MixinDictRepr)
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class DataEntryUrnBox(AbstractFullBox, DataEntryUrnBoxFieldsList, MixinDictRepr):
     type = b"urn "
@@ -1034,6 +1433,9 @@ class DataEntryUrnBox(AbstractFullBox, DataEntryUrnBoxFieldsList, MixinDictRepr)
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 # iinf boxes
 class ItemInfoEntryBox(ContainerBox, ItemInfoEntryBoxFieldsList, MixinDictRepr):
@@ -1047,26 +1449,21 @@ class ItemInfoEntryBox(ContainerBox, ItemInfoEntryBoxFieldsList, MixinDictRepr):
         self.parse_fields(bstr, self._header)
         self._boxes_start_pos = bstr.bytepos
 
-    def parse_boxes_impl(self, bstr, recursive=True):
+    def parse_boxes_impl(self, bstr, recursive=True, lazy=False, paths=None):
         self._boxes = []
-        if self._extension_type.value:
+        if self._extension_type:
             bstr.bytepos = self._boxes_start_pos
-            self._boxes.append(next(Parser.parse(bstr, recursive=recursive)))
+            self._boxes.append(next(Parser.parse(bstr, recursive=recursive, lazy=lazy, paths=paths)))
 
-    def refresh_box_size(self):
-        self.refresh_boxes_size()
-        boxes_size = 0
-        for box in self._boxes:
-            boxes_size += box.header.box_size
-        fields_size = len(AbstractFieldsList.__bytes__(self))
-        padding_size = len(self.padding)
-        box_size = len(bytes(self._header)) + fields_size + boxes_size + padding_size
-        if self._header.box_size != box_size:
-            self._header.update_box_size(fields_size + boxes_size + padding_size)
+    def _get_fields_size(self):
+        return self._get_bytes_size()
+
+    def _write_fields(self, writer):
+        writer.write_fields(self)
 
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self) + \
-               b''.join([bytes(box) for box in self._boxes])
+               b''.join([bytes(box) for box in self.boxes])
 
     @classmethod
     def parse_box(cls, bstr, header):
@@ -1093,6 +1490,9 @@ class PixelAspectRatioBox(AbstractBox, PixelAspectRatioBoxFieldsList):
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 class CleanApertureBox(AbstractBox, CleanApertureBoxFieldsList):
     type = b"clap"
@@ -1110,6 +1510,9 @@ class CleanApertureBox(AbstractBox, CleanApertureBoxFieldsList):
     def _get_content_bytes(self):
         return AbstractFieldsList.__bytes__(self)
 
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
 
 # hev1, hvc1 boxes
 class HEVCConfigurationBox(AbstractBox, HEVCConfigurationSubFieldsList,
@@ -1121,12 +1524,7 @@ class HEVCConfigurationBox(AbstractBox, HEVCConfigurationSubFieldsList,
         HEVCConfigurationSubFieldsList.__init__(self)
 
     def load(self, bstr):
-        self.load_sub_fields(bstr, self._header)
-
-        self._remaining_bytes = self._header.start_pos + self._header.box_size - \
-                                bstr.bytepos
-        if self._remaining_bytes != 0:
-            self._padding = bstr.read(self._remaining_bytes * 8).bytes
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
 
     def parse_impl(self, bstr):
         self.parse_fields(bstr, self._header)
@@ -1136,15 +1534,193 @@ class HEVCConfigurationBox(AbstractBox, HEVCConfigurationSubFieldsList,
         return HEVCConfigurationSubFieldsList.__bytes__(self)
 
 
+# mvex boxes
+class TrackExtendsBox(AbstractFullBox, TrackExtendsBoxFieldsList, MixinDictRepr):
+    type = b"trex"
+
+    def __init__(self, header):
+        super().__init__(header)
+        TrackExtendsBoxFieldsList.__init__(self)
+
+    def load(self, bstr):
+        pass
+
+    def parse_impl(self, bstr):
+        self.parse_fields(bstr, self._header)
+
+    def _get_content_bytes(self):
+        return AbstractFieldsList.__bytes__(self)
+
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+
+# moof boxes
+class MovieFragmentHeaderBox(AbstractFullBox, MovieFragmentHeaderBoxFieldsList,
+                             MixinDictRepr):
+    type = b"mfhd"
+
+    def __init__(self, header):
+        super().__init__(header)
+        MovieFragmentHeaderBoxFieldsList.__init__(self)
+
+    def load(self, bstr):
+        pass
+
+    def parse_impl(self, bstr):
+        self.parse_fields(bstr, self._header)
+
+    def _get_content_bytes(self):
+        return AbstractFieldsList.__bytes__(self)
+
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+
+class TrackFragmentBox(ContainerBox, MixinDictRepr):
+    type = b"traf"
+
+
+# traf boxes
+class TrackFragmentHeaderBox(AbstractFullBox, TrackFragmentHeaderBoxFieldsList,
+                             MixinDictRepr):
+    type = b"tfhd"
+
+    def __init__(self, header):
+        super().__init__(header)
+        TrackFragmentHeaderBoxFieldsList.__init__(self)
+
+    def load(self, bstr):
+        pass
+
+    def parse_impl(self, bstr):
+        self.parse_fields(bstr, self._header)
+
+    def _get_content_bytes(self):
+        return AbstractFieldsList.__bytes__(self)
+
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+
+class TrackFragmentBaseMediaDecodeTimeBox(
+      AbstractFullBox, TrackFragmentBaseMediaDecodeTimeBoxFieldsList,
+      MixinDictRepr):
+    type = b"tfdt"
+
+    def __init__(self, header):
+        super().__init__(header)
+        TrackFragmentBaseMediaDecodeTimeBoxFieldsList.__init__(self)
+
+    def load(self, bstr):
+        pass
+
+    def parse_impl(self, bstr):
+        self.parse_fields(bstr, self._header)
+
+    def _get_content_bytes(self):
+        return AbstractFieldsList.__bytes__(self)
+
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+
+class TrackRunBox(AbstractFullBox, TrackRunSubFieldsList, MixinDictRepr):
+    type = b"trun"
+
+    def __init__(self, header):
+        super().__init__(header)
+        TrackRunSubFieldsList.__init__(self)
+
+    def load(self, bstr):
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
+
+    def parse_impl(self, bstr):
+        self.parse_fields(bstr, self._header)
+        bstr.bytepos = self._header.start_pos + self._header.box_size
+
+    def _get_content_bytes(self):
+        return TrackRunSubFieldsList.__bytes__(self)
+
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+    def _write_content(self, writer):
+        writer.write_fields(self)
+        writer.write(self._get_entries_bytes())
+
+
+# mfra boxes
+class TrackFragmentRandomAccessBox(AbstractFullBox,
+                                   TrackFragmentRandomAccessSubFieldsList,
+                                   MixinDictRepr):
+    type = b"tfra"
+
+    def __init__(self, header):
+        super().__init__(header)
+        TrackFragmentRandomAccessSubFieldsList.__init__(self)
+
+    def load(self, bstr):
+        self._load_padding(bstr, self.load_sub_fields(bstr, self._header))
+
+    def parse_impl(self, bstr):
+        self.parse_fields(bstr, self._header)
+        bstr.bytepos = self._header.start_pos + self._header.box_size
+
+    def _get_content_bytes(self):
+        return TrackFragmentRandomAccessSubFieldsList.__bytes__(self)
+
+
+class MovieFragmentRandomAccessOffsetBox(
+      AbstractFullBox, MovieFragmentRandomAccessOffsetBoxFieldsList,
+      MixinDictRepr):
+    type = b"mfro"
+
+    def __init__(self, header):
+        super().__init__(header)
+        MovieFragmentRandomAccessOffsetBoxFieldsList.__init__(self)
+
+    def load(self, bstr):
+        pass
+
+    def parse_impl(self, bstr):
+        self.parse_fields(bstr, self._header)
+
+    def _get_content_bytes(self):
+        return AbstractFieldsList.__bytes__(self)
+
+    def _get_content_size(self):
+        return self._get_bytes_size()
+
+
 # Root boxes
 FTYP = FileTypeBox
 MDAT = MediaDataBox
 MOOV = MovieBox
+MOOF = MovieFragmentBox
+MFRA = MovieFragmentRandomAccessBox
 META = MetaBox
 
 # moov boxes
 MVHD = MovieHeaderBox
 TRAK = TrackBox
+MVEX = MovieExtendsBox
+
+# mvex boxes
+TREX = TrackExtendsBox
+
+# moof boxes
+MFHD = MovieFragmentHeaderBox
+TRAF = TrackFragmentBox
+
+# traf boxes
+TFHD = TrackFragmentHeaderBox
+TFDT = TrackFragmentBaseMediaDecodeTimeBox
+TRUN = TrackRunBox
+
+# mfra boxes
+TFRA = TrackFragmentRandomAccessBox
+MFRO = MovieFragmentRandomAccessOffsetBox
 
 # meta boxes
 IREF = ItemReferenceBox
@@ -1220,11 +1796,30 @@ Parser.register_default_box(UnknownBox)
 Parser.register_box(FTYP)
 Parser.register_box(MDAT)
 Parser.register_box(MOOV)
+Parser.register_box(MOOF)
+Parser.register_box(MFRA)
 Parser.register_box(META)
 
 # moov boxes
 Parser.register_box(MVHD)
 Parser.register_box(TRAK)
+Parser.register_box(MVEX)
+
+# mvex boxes
+Parser.register_box(TREX)
+
+# moof boxes
+Parser.register_box(MFHD)
+Parser.register_box(TRAF)
+
+# traf boxes
+Parser.register_box(TFHD)
+Parser.register_box(TFDT)
+Parser.register_box(TRUN)
+
+# mfra boxes
+Parser.register_box(TFRA)
+Parser.register_box(MFRO)
 
 # meta boxes
 Parser.register_box(IREF)
@@ -0,0 +1,664 @@
+""" Read and write the items of a Benzina dataset """
+
+import os
+from array import array
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from pybzparse import Parser, boxes as bx_def
+from pybzparse.headers import BoxHeader
+from pybzparse.sample_index import SampleIndex, get_trafs_bases
+from pybzparse.sources import MappedBitStream, read_at
+from pybzparse.utils import find_boxes, get_name, get_sample_table, \
+                            make_meta_trak, make_mfra, make_moof, make_mvex, \
+                            make_mvhd, make_text_trak, make_tfra, make_traf, \
+                            to_mp4_time
+
+INPUTS_TRAK_NAME = b"bzna_inputs\0"
+TARGETS_TRAK_NAME = b"bzna_targets\0"
+FNAMES_TRAK_NAME = b"bzna_fnames\0"
+# Number of items written in a fragment of a fragmented dataset
+FRAGMENT_SIZE = 1024
+
+# Duration of a sample in the timescale of the traks, see make_trak
+_SAMPLE_DELTA = 20
+# size + type + version + flags + mfra size
+_MFRO_SIZE = 16
+
+DatasetItem = namedtuple("DatasetItem", ["input", "target", "filename"])
+
+
+class DatasetReader:
+    """ Serves the items of a dataset built with a meta trak of inputs and
+    text traks of targets and filenames. The file is parsed once and the
+    samples locations of the traks are precomputed, including the samples of
+    the fragments of a fragmented dataset. Items are read at their offsets in
+    the memory-mapped file so a reader can be shared by threads """
+
+    def __init__(self, path, inputs_name=INPUTS_TRAK_NAME,
+                 targets_name=TARGETS_TRAK_NAME, fnames_name=FNAMES_TRAK_NAME):
+        """
+        :param path: Filename of the dataset
+        :type path: str
+        :param inputs_name: Name of the trak of the inputs
+        :param targets_name: Name of the trak of the targets
+        :param fnames_name: Name of the trak of the filenames
+        """
+        self._path = path
+        self._bstr = MappedBitStream(path)
+
+        # Only moov is needed, the samples are read when requested. The
+        # parsing stops at the moov so fragments following it aren't scanned
+        moov = next(find_boxes(Parser.parse(self._bstr, paths=[b"moov"]),
+                               b"moov"))
+        moov.load(self._bstr)
+
+        self._traks = {get_name(trak): trak
+                       for trak in find_boxes(moov.boxes, b"trak")}
+
+        if inputs_name not in self._traks:
+            raise ValueError("{} has no {} trak".format(path, inputs_name))
+
+        # (traf, base data offset) and trex of the fragmented traks by track
+        # id
+        trafs = {}
+        trexs = {}
+        mvex = next(find_boxes(moov.boxes, b"mvex"), None)
+        if mvex is not None:
+            trexs = {trex.track_id: trex
+                     for trex in find_boxes(mvex.boxes, b"trex")}
+            moofs, _ = _read_fragments(self._bstr, moov)
+            for moof in moofs:
+                # The implicit bases of the trafs of a moof depend on the
+                # trafs of all its tracks
+                for traf, base_pos in get_trafs_bases(
+                        moof.header.start_pos,
+                        list(find_boxes(moof.boxes, b"traf")), trexs):
+                    # TRAF.TFHD
+                    trafs.setdefault(traf.boxes[0].track_id, []) \
+                        .append((traf, base_pos))
+
+        self._inputs = self._get_sample_index(inputs_name, trafs, trexs)
+        self._targets = self._get_sample_index(targets_name, trafs, trexs)
+        self._fnames = self._get_sample_index(fnames_name, trafs, trexs)
+        self._len = len(self._inputs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if self.closed:
+            raise ValueError("I/O operation on closed dataset")
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._len))]
+
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("dataset index out of range")
+
+        target = self._read_sample(self._targets, index)
+        if target is not None:
+            # Targets are 8 bytes little-endian signed integers
+            target = int.from_bytes(target, byteorder="little", signed=True)
+        filename = self._read_sample(self._fnames, index)
+        if filename is not None:
+            filename = bytes(filename)
+
+        return DatasetItem(self._read_sample(self._inputs, index), target,
+                           filename)
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self[i]
+
+    @property
+    def closed(self):
+        return self._bstr is None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def traks(self):
+        return self._traks
+
+    def close(self):
+        """ Release the memory-mapped file. The items already read keep
+        their bytes """
+        if self.closed:
+            return
+        # The sample tables of the traks are views of the mapping
+        self._traks = {}
+        self._inputs = self._targets = self._fnames = None
+        self._bstr.close()
+        self._bstr = None
+
+    def _get_sample_index(self, name, trafs, trexs):
+        trak = self._traks.get(name)
+        if trak is None:
+            return None
+        # TRAK.TKHD
+        track_id = trak.boxes[0].track_id
+        if track_id not in trexs:
+            return trak.sample_index
+        return SampleIndex(get_sample_table(trak), trafs.get(track_id, ()),
+                           trexs[track_id])
+
+    def _read_sample(self, sample_index, index):
+        if sample_index is None or index >= len(sample_index):
+            return None
+        return read_at(self._bstr, sample_index.offsets[index],
+                       sample_index.sizes[index])
+
+
+class DatasetWriter:
+    """ Writes a dataset readable by DatasetReader. The samples are written
+    to the file as they are added and only their locations are kept in
+    memory. The moov is appended when the writer is closed """
+
+    def __init__(self, path, creation_time=None, modification_time=None,
+                 inputs_name=INPUTS_TRAK_NAME, targets_name=TARGETS_TRAK_NAME,
+                 fnames_name=FNAMES_TRAK_NAME):
+        """
+        :param path: Filename of the dataset
+        :type path: str
+        :param creation_time: Creation time in mp4 time. Defaults to now
+        :type creation_time: int
+        :param modification_time: Modification time in mp4 time. Defaults to
+                                  the creation time
+        :type modification_time: int
+        :param inputs_name: Name of the trak of the inputs
+        :param targets_name: Name of the trak of the targets
+        :param fnames_name: Name of the trak of the filenames
+        """
+        if creation_time is None:
+            creation_time = to_mp4_time(
+                datetime.now(timezone.utc).replace(tzinfo=None))
+        if modification_time is None:
+            modification_time = creation_time
+
+        self._creation_time = creation_time
+        self._modification_time = modification_time
+        self._names = (inputs_name, targets_name, fnames_name)
+        # (sizes, offsets) of the samples of each trak
+        self._samples = tuple((array("Q"), array("Q")) for _ in self._names)
+
+        self._file = open(path, "wb")
+
+        # FTYP
+        ftyp = _make_ftyp()
+        ftyp.refresh_box_size()
+        ftyp.write_to(self._file)
+
+        # FREE reserves the room of a 64 bits mdat size
+        free = bx_def.UnknownBox(BoxHeader())
+        free.header.type = b"free"
+        free.refresh_box_size()
+        free.write_to(self._file)
+
+        # MDAT with a size of 0 extends to the end of the file until the
+        # writer is closed
+        mdat_header = BoxHeader()
+        mdat_header.type = b"mdat"
+        mdat_header.box_size = 0
+        self._file.write(bytes(mdat_header))
+
+        self._mdat_data_pos = self._file.tell()
+        self._pos = self._mdat_data_pos
+
+    def __len__(self):
+        return len(self._samples[0][0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def add(self, input, target=None, filename=None):
+        """
+        Write an item of the dataset
+
+        :param input: The input bytes, usually an encoded image
+        :type input: bytes-like
+        :param target: The target, stored as 8 bytes little-endian signed
+                       integer. It must be provided for all or no items
+        :type target: int
+        :param filename: The filename of the input. It must be provided for
+                         all or no items
+        :type filename: bytes or str
+        :return: the index of the item
+        """
+        index = len(self)
+        samples = _get_samples(self._names,
+                               [len(sizes) for sizes, _ in self._samples],
+                               index, input, target, filename)
+
+        for (sizes, offsets), sample in zip(self._samples, samples):
+            if sample is None:
+                continue
+            sample = memoryview(sample)
+            sizes.append(sample.nbytes)
+            offsets.append(self._pos)
+            self._file.write(sample)
+            self._pos += sample.nbytes
+
+        return index
+
+    def close(self):
+        """ Patch the size of the mdat and append the moov """
+        if self.closed:
+            return
+
+        # MDAT
+        mdat_header = BoxHeader()
+        mdat_header.type = b"mdat"
+        mdat_header.update_box_size(self._pos - self._mdat_data_pos)
+        # A 64 bits size overwrites the free box
+        self._file.seek(self._mdat_data_pos - mdat_header.header_size)
+        self._file.write(bytes(mdat_header))
+        self._file.seek(self._pos)
+
+        # MOOV
+        # The traks of the targets and filenames are left out when empty
+        traks = [(name, sizes, offsets) for name, (sizes, offsets) in
+                 zip(self._names, self._samples)
+                 if sizes or name == self._names[0]]
+        moov = _make_moov(self._creation_time, self._modification_time,
+                          len(self), traks)
+        moov.refresh_box_size()
+        moov.write_to(self._file)
+        self._file.close()
+
+
+class FragmentedDatasetWriter:
+    """ Writes a fragmented dataset readable by DatasetReader. The moov only
+    declares the traks at the start of the file and the items are written in
+    fragments, a moof followed by the mdat of its items, so writing items
+    only costs their own size, even when appending to an existing dataset.
+    The inputs are written to the mdat as they are added after the room of
+    the moof of their fragment, only the targets and filenames are kept in
+    memory until the fragment is complete. The fragments are indexed in a
+    mfra appended when the writer is closed """
+
+    def __init__(self, path, creation_time=None, modification_time=None,
+                 inputs_name=INPUTS_TRAK_NAME, targets_name=TARGETS_TRAK_NAME,
+                 fnames_name=FNAMES_TRAK_NAME, fragment_size=FRAGMENT_SIZE,
+                 append=False):
+        """
+        :param path: Filename of the dataset
+        :type path: str
+        :param creation_time: Creation time in mp4 time. Defaults to now
+        :type creation_time: int
+        :param modification_time: Modification time in mp4 time. Defaults to
+                                  the creation time
+        :type modification_time: int
+        :param inputs_name: Name of the trak of the inputs
+        :param targets_name: Name of the trak of the targets
+        :param fnames_name: Name of the trak of the filenames
+        :param fragment_size: Number of items of a fragment
+        :type fragment_size: int
+        :param append: Append the items to the fragmented dataset at path if
+                       it exists. Its mfra is dropped and written again when
+                       the writer is closed
+        :type append: bool
+        :raises: ValueError if the dataset to append to isn't fragmented or
+                 doesn't have the traks
+        """
+        self._names = (inputs_name, targets_name, fnames_name)
+        self._fragment_size = fragment_size
+        self._track_ids = [i + 1 for i in range(len(self._names))]
+        # Sizes of the samples of the pending fragment of each trak
+        self._pending = tuple(array("Q") for _ in self._names)
+        # Samples of the pending fragment of the targets and filenames traks
+        # to write after the inputs
+        self._pending_samples = tuple([] for _ in self._names)
+        # Position of the pending fragment and of its data
+        self._fragment_pos = None
+        self._data_pos = None
+        # Number of samples written in the fragments of each trak
+        self._counts = [0] * len(self._names)
+        # (time, moof offset, traf number) of the fragments of each trak
+        self._fragments = tuple([] for _ in self._names)
+        self._sequence_number = 0
+
+        if append and os.path.exists(path):
+            self._file = self._resume(path)
+            return
+
+        if creation_time is None:
+            creation_time = to_mp4_time(
+                datetime.now(timezone.utc).replace(tzinfo=None))
+        if modification_time is None:
+            modification_time = creation_time
+
+        self._file = open(path, "wb")
+
+        # FTYP
+        ftyp = _make_ftyp()
+        ftyp.refresh_box_size()
+        ftyp.write_to(self._file)
+
+        # MOOV
+        moov = _make_moov(creation_time, modification_time, 0,
+                          [(name, [], []) for name in self._names])
+        moov.append(make_mvex(self._track_ids))
+        moov.refresh_box_size()
+        moov.write_to(self._file)
+
+    def __len__(self):
+        return self._counts[0] + len(self._pending[0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def add(self, input, target=None, filename=None):
+        """
+        Add an item to the pending fragment, which is written once it holds
+        fragment_size items
+
+        :param input: The input bytes, usually an encoded image
+        :type input: bytes-like
+        :param target: The target, stored as 8 bytes little-endian signed
+                       integer. It must be provided for all or no items
+        :type target: int
+        :param filename: The filename of the input. It must be provided for
+                         all or no items
+        :type filename: bytes or str
+        :return: the index of the item
+        """
+        index = len(self)
+        samples = _get_samples(self._names,
+                               [count + len(pending) for count, pending in
+                                zip(self._counts, self._pending)],
+                               index, input, target, filename)
+
+        if self._fragment_pos is None:
+            # Leave room for the moof and the mdat header of the fragment
+            self._fragment_pos = self._file.tell()
+            self._data_pos = self._fragment_pos + self._get_room_size(
+                [i for i, sample in enumerate(samples) if sample is not None])
+            self._file.seek(self._data_pos)
+
+        for i, sample in enumerate(samples):
+            if sample is None:
+                continue
+            sample = memoryview(sample)
+            self._pending[i].append(sample.nbytes)
+            if i == 0:
+                self._file.write(sample)
+            else:
+                # The sample is kept until its fragment is written
+                self._pending_samples[i].append(bytes(sample))
+
+        if len(self._pending[0]) >= self._fragment_size:
+            self.flush()
+
+        return index
+
+    def flush(self):
+        """ Write the pending items in a fragment """
+        if not self._pending[0]:
+            return
+
+        self._sequence_number += 1
+        traks = [(i, pending) for i, pending in enumerate(self._pending)
+                 if pending]
+
+        # The samples of the traks follow each other in the mdat
+        for i, _ in traks[1:]:
+            self._file.writelines(self._pending_samples[i])
+        end_pos = self._file.tell()
+
+        # MOOF
+        moof = make_moof(self._sequence_number,
+                         [make_traf(self._track_ids[i],
+                                    self._counts[i] * _SAMPLE_DELTA, pending)
+                          for i, pending in traks])
+        moof.refresh_box_size()
+
+        data_offset = self._data_pos - self._fragment_pos
+        for traf, (_, pending) in zip(moof.boxes[1:], traks):
+            # MOOF.TRAF.TRUN
+            traf.boxes[-1].data_offset = (data_offset,)
+            data_offset += sum(pending)
+
+        # MDAT
+        mdat_header = BoxHeader()
+        mdat_header.type = b"mdat"
+        mdat_header.update_box_size(end_pos - self._data_pos)
+
+        # FREE fills the room left by a fragment of less than fragment_size
+        # items
+        free_header = BoxHeader()
+        free_header.type = b"free"
+        free_header.box_size = self._data_pos - self._fragment_pos - \
+            moof.header.box_size - mdat_header.header_size
+
+        self._file.seek(self._fragment_pos)
+        moof.write_to(self._file)
+        self._file.write(bytes(free_header))
+        self._file.write(bytes(free_header.box_size - free_header.header_size))
+        self._file.write(bytes(mdat_header))
+        self._file.seek(end_pos)
+
+        for traf_number, (i, pending) in enumerate(traks, 1):
+            self._fragments[i].append((self._counts[i] * _SAMPLE_DELTA,
+                                       self._fragment_pos, traf_number))
+            self._counts[i] += len(pending)
+            del pending[:]
+            del self._pending_samples[i][:]
+        self._fragment_pos = None
+        self._data_pos = None
+
+    def close(self):
+        """ Write the pending items and append the mfra """
+        if self.closed:
+            return
+
+        self.flush()
+
+        # MFRA
+        tfras = []
+        for track_id, fragments in zip(self._track_ids, self._fragments):
+            if not fragments:
+                continue
+            tfra = make_tfra(track_id)
+            for time, moof_offset, traf_number in fragments:
+                entry = tfra.append_and_return()
+                entry.time = (time,)
+                entry.moof_offset = (moof_offset,)
+                entry.traf_number = (traf_number,)
+                entry.trun_number = (1,)
+                entry.sample_number = (1,)
+            tfras.append(tfra)
+
+        mfra = make_mfra(tfras)
+        mfra.write_to(self._file)
+        self._file.close()
+
+    def _resume(self, path):
+        bstr = MappedBitStream(path)
+        try:
+            end_pos = self._read_dataset(bstr, path)
+        finally:
+            # The file is truncated once it isn't mapped anymore
+            bstr.close()
+
+        file = open(path, "r+b")
+        # The mfra is written again when the writer is closed
+        file.truncate(end_pos)
+        file.seek(end_pos)
+        return file
+
+    def _get_room_size(self, traks):
+        # The moof of fragment_size items, a mdat header with a 64 bits size
+        # and at least the header of a free box
+        moof = make_moof(0, [make_traf(self._track_ids[i], 0,
+                                       [0] * self._fragment_size)
+                             for i in traks])
+        moof.refresh_box_size()
+        return moof.header.box_size + 16 + 8
+
+    def _read_dataset(self, bstr, path):
+        moov = next(find_boxes(Parser.parse(bstr, paths=[b"moov"]), b"moov"),
+                    None)
+        if moov is not None:
+            moov.load(bstr)
+        if moov is None or next(find_boxes(moov.boxes, b"mvex"), None) is None:
+            raise ValueError("{} is not a fragmented dataset".format(path))
+
+        traks = {get_name(trak): trak
+                 for trak in find_boxes(moov.boxes, b"trak")}
+        for name in self._names:
+            if name not in traks:
+                raise ValueError("{} has no {} trak".format(path, name))
+        # TRAK.TKHD
+        self._track_ids = [traks[name].boxes[0].track_id
+                           for name in self._names]
+
+        # Only the counts of the samples are needed, the truns aren't loaded
+        moofs, end_pos = _read_fragments(bstr, moov, load=False)
+        for moof in moofs:
+            # MOOF.MFHD
+            self._sequence_number = moof.boxes[0].sequence_number
+            for traf_number, traf in \
+                    enumerate(find_boxes(moof.boxes, b"traf"), 1):
+                i = self._track_ids.index(traf.boxes[0].track_id)
+                tfdt = next(find_boxes(traf.boxes, b"tfdt"))
+                self._fragments[i].append((tfdt.base_media_decode_time,
+                                           moof.header.start_pos,
+                                           traf_number))
+                self._counts[i] += sum(trun.sample_count for trun in
+                                       find_boxes(traf.boxes, b"trun"))
+
+        return end_pos
+
+
+def _get_samples(names, counts, index, input, target, filename):
+    if target is not None:
+        target = int(target).to_bytes(8, byteorder="little", signed=True)
+    if isinstance(filename, str):
+        filename = filename.encode()
+
+    for count, name, sample in zip(counts[1:], names[1:], (target, filename)):
+        if (sample is None) != (count == 0) and index:
+            raise ValueError("{} must be given for all or no items"
+                             .format(name))
+
+    return input, target, filename
+
+
+def _make_ftyp():
+    ftyp = bx_def.FTYP(BoxHeader())
+    ftyp.header.type = b"ftyp"
+    ftyp.major_brand = 1769172845           # b"isom"
+    ftyp.minor_version = 0
+    ftyp.compatible_brands = [1652190817,   # b"bzna"
+                              1769172845]   # b"isom"
+    return ftyp
+
+
+def _make_moov(creation_time, modification_time, samples_count, traks):
+    """
+    :param traks: (name, samples sizes, samples offsets) of the traks. The
+                  first one is the meta trak of the inputs
+    """
+    moov = bx_def.MOOV(BoxHeader())
+    moov.header.type = b"moov"
+
+    mvhd = make_mvhd(creation_time, modification_time, samples_count)
+    moov.append(mvhd)
+
+    for i, (name, sizes, offsets) in enumerate(traks):
+        make = make_meta_trak if i == 0 else make_text_trak
+
+        # MOOV.TRAK
+        trak = make(creation_time, modification_time, name, sizes, offsets)
+
+        # MOOV.TRAK.TKHD
+        tkhd = trak.boxes[0]
+        tkhd.header.flags = b"\x00\x00\x00"
+        tkhd.track_id = len(moov.boxes)
+        tkhd.width = [0, 0]
+        tkhd.height = [0, 0]
+
+        moov.append(trak)
+
+    # == total number of tracks
+    mvhd.next_track_id = len(moov.boxes)
+
+    return moov
+
+
+def _find_mfra(bstr):
+    # The mfro closing the file holds the size of the mfra
+    file_size = bstr.len // 8
+    if file_size < _MFRO_SIZE:
+        return None
+    mfro = read_at(bstr, file_size - _MFRO_SIZE, _MFRO_SIZE)
+    header = Parser.parse_header_buffer(mfro)
+    if header.type != b"mfro" or header.box_size != _MFRO_SIZE:
+        return None
+
+    mfra_pos = file_size - int.from_bytes(mfro[-4:], "big")
+    if mfra_pos < 0:
+        return None
+    bstr.bytepos = mfra_pos
+    mfra = next(Parser.parse(bstr))
+    if mfra.header.type != b"mfra":
+        return None
+    mfra.load(bstr)
+    return mfra
+
+
+def _read_fragments(bstr, moov, load=True):
+    """
+    Parse the moofs of a fragmented file. They are located from the mfra at
+    the end of the file, otherwise the boxes following the moov are scanned
+
+    :param bstr: The memory-mapped file
+    :param moov: The moov of the file
+    :param load: Load the boxes of the moofs
+    :return: (moofs in the order of the file, position of the mfra or of the
+             end of the file)
+    """
+    mfra = _find_mfra(bstr)
+    if mfra is not None:
+        moof_offsets = sorted({entry.moof_offset
+                               for tfra in find_boxes(mfra.boxes, b"tfra")
+                               for entry in tfra.entries})
+        moofs = []
+        for moof_offset in moof_offsets:
+            bstr.bytepos = moof_offset
+            moofs.append(next(Parser.parse(bstr)))
+        end_pos = mfra.header.start_pos
+    else:
+        bstr.bytepos = moov.header.start_pos + moov.header.box_size
+        moofs = list(find_boxes(Parser.parse(bstr, paths=[b"moof"]), b"moof"))
+        end_pos = bstr.len // 8
+
+    if load:
+        for moof in moofs:
+            moof.load(bstr)
+
+    return moofs, end_pos
@@ -0,0 +1,170 @@
+""" Move the moov of an MP4 file before its media data """
+
+import os
+from array import array
+
+from pybzparse import Parser, boxes as bx_def
+from pybzparse.headers import FullBoxHeader
+from pybzparse.sources import MappedBitStream
+from pybzparse.utils import MAX_UINT_32, find_boxes
+from pybzparse.writers import copy_range, write_all
+
+# Only the boxes holding offsets in the file are decoded
+_OFFSETS_PATHS = [b"moov/trak/mdia/minf/stbl/stco",
+                  b"moov/trak/mdia/minf/stbl/co64",
+                  b"moov/meta/iloc",
+                  b"meta/iloc"]
+_STBL_PATH = (b"trak", b"mdia", b"minf", b"stbl")
+
+
+def relocate_moov(src, dst):
+    """
+    Write a copy of an MP4 file with its moov before its first mdat so it
+    can be read progressively. The chunk offsets and the file offsets of the
+    item locations are shifted accordingly and chunk offsets tables are
+    upgraded to 64 bits if needed. The other boxes are copied as they are
+    without being decoded
+
+    :param src: Filename of the MP4 file
+    :type src: str
+    :param dst: Filename of the relocated MP4 file
+    :type dst: str
+    :raises: ValueError if the file has no moov
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise ValueError("Can't relocate the moov of {} in place".format(src))
+
+    bstr = MappedBitStream(src)
+    try:
+        _relocate_moov(bstr, src, dst)
+    finally:
+        bstr.close()
+
+
+def _relocate_moov(bstr, src, dst):
+    boxes = [box for box in Parser.parse(bstr, paths=_OFFSETS_PATHS)]
+
+    moov = next(find_boxes(boxes, (b"moov",)), None)
+    if moov is None:
+        raise ValueError("{} has no moov".format(src))
+    mdat = next(find_boxes(boxes, (b"mdat",)), None)
+    # Nothing to move if the moov is already before the media data
+    insert_pos = mdat.header.start_pos \
+        if mdat is not None and mdat.header.start_pos < moov.header.start_pos \
+        else moov.header.start_pos
+
+    for box in boxes:
+        if box is moov or box.header.type == b"meta":
+            box.load(bstr)
+
+    moov_pos = moov.header.start_pos
+    moov_size = moov.header.box_size
+
+    def shift(offset):
+        if offset < insert_pos:
+            return offset
+        if offset < moov_pos:
+            return offset + moov.header.box_size
+        return offset + moov.header.box_size - moov_size
+
+    stbls = list(_find_nested_boxes(moov.boxes, _STBL_PATH))
+
+    # Upgrading a table to 64 bits grows the moov which could push other
+    # offsets over 32 bits
+    upgraded = True
+    while upgraded:
+        upgraded = False
+        for stbl in stbls:
+            for i, stco in enumerate(stbl.boxes):
+                offsets = stco.columns["chunk_offset"] \
+                    if stco.header.type == b"stco" else None
+                if offsets and shift(max(offsets)) > MAX_UINT_32:
+                    stbl.boxes[i] = _make_co64(stco)
+                    stbl.mark_dirty()
+                    upgraded = True
+        moov.refresh_box_size()
+
+    for stbl in stbls:
+        for co in find_boxes(stbl.boxes, (b"stco", b"co64")):
+            offsets = co.columns["chunk_offset"]
+            offsets[:] = array(offsets.typecode, map(shift, offsets))
+            co.mark_dirty()
+
+    for meta in _find_metas(boxes, moov):
+        for iloc in find_boxes(meta.boxes, (b"iloc",)):
+            _shift_item_locations(iloc, shift)
+
+    relocated = [box for box in boxes
+                 if box.header.start_pos < insert_pos and box is not moov] + \
+        [moov] + \
+        [box for box in boxes
+         if box.header.start_pos >= insert_pos and box is not moov]
+
+    dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with open(src, "rb") as src_file:
+            for box in relocated:
+                if box is moov or box.header.type == b"meta":
+                    buffer = bytearray(box.header.box_size)
+                    box.write_to(buffer)
+                    write_all(dst_fd, buffer)
+                else:
+                    copy_range(src_file.fileno(), dst_fd,
+                               box.header.start_pos, box.header.box_size)
+    finally:
+        os.close(dst_fd)
+
+
+def _find_nested_boxes(boxes, box_types):
+    for box in find_boxes(boxes, (box_types[0],)):
+        if len(box_types) == 1:
+            yield box
+        else:
+            yield from _find_nested_boxes(box.boxes, box_types[1:])
+
+
+def _find_metas(boxes, moov):
+    yield from find_boxes(boxes, (b"meta",))
+    yield from find_boxes(moov.boxes, (b"meta",))
+
+
+def _make_co64(stco):
+    co64 = bx_def.CO64(FullBoxHeader())
+    co64.header.type = b"co64"
+    co64.header.version = (stco.header.version,)
+    co64.header.flags = (stco.header.flags,)
+    co64.extend(chunk_offset=stco.columns["chunk_offset"])
+    return co64
+
+
+def _shift_item_locations(iloc, shift):
+    for item in iloc.items:
+        # Only the items in this file located with file offsets
+        if item.construction_method or item.data_reference_index:
+            continue
+        # The data of an extent is at the base offset plus its own offset
+        base_offset = item.base_offset or 0
+        offsets = [base_offset + (extent.extent_offset or 0)
+                   for extent in item.extents]
+        shifts = {shift(offset) - offset for offset in offsets}
+        # A base offset of 0 only marks the extents offsets as absolute
+        if base_offset and len(shifts) == 1:
+            item.base_offset = _check_offset(base_offset + shifts.pop(),
+                                             iloc.base_offset_size)
+            continue
+        for extent, offset in zip(item.extents, offsets):
+            if shift(offset) == offset:
+                continue
+            if extent.extent_offset is None:
+                raise ValueError("Extent of item {} at {} can't be moved "
+                                 "without an offset"
+                                 .format(item.item_id, offset))
+            extent.extent_offset = _check_offset(shift(offset) - base_offset,
+                                                 iloc.offset_size)
+
+
+def _check_offset(offset, size):
+    if offset >= 1 << (size * 8):
+        raise ValueError("Offset {} doesn't fit in {} bytes"
+                         .format(offset, size))
+    return offset
@@ -1,2485 +1,1380 @@
+import struct
+from abc import ABCMeta
+from collections import namedtuple
+from functools import lru_cache
+
 import bitstring as bs
 
+from pybzparse.sources import PayloadView, get_buffer, read_at, \
+                              read_bytes
+
+# Precompiled box header layouts
+_BOX_HEADER = struct.Struct(">I4s")
+_BOX_EXT_SIZE = struct.Struct(">Q")
+_FULL_BOX_HEADER = struct.Struct(">B3s")
+_USER_TYPE_SIZE = 16
+
+
+# struct formats of the whole bytes integers
+_STRUCT_INT_FORMATS = {8: "B", 16: "H", 32: "I", 64: "Q"}
+
+
+@lru_cache(maxsize=1024)
+def _get_struct_codec(types):
+    """
+    Compile a layout of bitstring types into a struct
+
+    :param types: bitstring types of the values
+    :type types: tuple of str
+    :return: (struct.Struct, [(index, length)] of the bytes values) or None
+             when a type doesn't have a struct equivalent
+    """
+    formats = [">"]
+    bytes_lengths = []
+    for i, value_type in enumerate(types):
+        name, _, size = value_type.partition(":")
+        if not size.isdigit():
+            return None
+        size = int(size)
+        if name in ("uintbe", "uint") and size in _STRUCT_INT_FORMATS:
+            formats.append(_STRUCT_INT_FORMATS[size])
+        elif name in ("intbe", "int") and size in _STRUCT_INT_FORMATS:
+            formats.append(_STRUCT_INT_FORMATS[size].lower())
+        elif name == "bytes" or (name == "bits" and size % 8 == 0):
+            length = size if name == "bytes" else size // 8
+            formats.append("{}s".format(length))
+            bytes_lengths.append((i, length))
+        else:
+            return None
+    return struct.Struct("".join(formats)), bytes_lengths
+
+
+@lru_cache(maxsize=1024)
+def _get_type_bits_size(value_type):
+    """
+    :param value_type: bitstring type of a value
+    :type value_type: str
+    :return: the size in bits of the value or None when the type doesn't
+             have a fixed size
+    """
+    name, _, size = value_type.partition(":")
+    if not size.isdigit():
+        return None
+    return int(size) * 8 if name == "bytes" else int(size)
+
+
+def _get_values_struct(types, values):
+    """
+    :param types: bitstring types of the values
+    :type types: tuple of str
+    :param values: The values, the bytes values are converted in place
+    :type values: list
+    :return: the struct packing the values or None if they can't be packed
+             by struct
+    """
+    codec = _get_struct_codec(types)
+    if codec is None:
+        return None
+    packer, bytes_lengths = codec
+    for i, length in bytes_lengths:
+        value = values[i]
+        if not isinstance(value, bytes):
+            if isinstance(value, (bytearray, memoryview, PayloadView)):
+                value = values[i] = bytes(value)
+            elif hasattr(value, "bytes"):
+                value = values[i] = value.bytes
+            else:
+                return None
+        # struct would pad or truncate the value
+        if len(value) != length:
+            return None
+    return packer
+
+
+# Kinds of the values of the fields
+_SCALAR = 0
+_LIST = 1
+# Bytes which take the length of their value
+_BYTES = 2
+
+# Count of a list field which goes on until the end of the box
+TO_BOX_END = -1
+
+
+SchemaField = namedtuple("SchemaField",
+                         ["name", "type", "short_type", "flag", "count",
+                          "default", "public", "short_versions", "versions",
+                          "optional"],
+                         defaults=(None, None, None, None, True, None, None,
+                                   False))
+SchemaField.__doc__ = """
+Declaration of a field of a fields list
+
+:param name: name of the field descriptor, the value is stored in _<name>
+:param type: bitstring type of the field. "string" is a bytes value ending
+             with a null byte, "bytes" without a length is sized by count
+             and an integer type without a size is sized by the instances
+             with _set_type, the field being skipped while its size is 0
+:param short_type: type of the field when the version of the box is one of
+                   short_versions
+:param flag: mask of the box flags which needs to be set for the field to
+             be present
+:param count: number of values of a list field, name of the field holding
+              it or TO_BOX_END. For bytes, this is the length of the value
+:param default: initial value of the field
+:param public: False for the reserved fields which don't have a descriptor
+:param short_versions: versions of the box using short_type, all the
+                       versions but 1 if None
+:param versions: versions of the box in which the field is present, all the
+                 versions if None
+:param optional: whether the field is only present when the box has bytes
+                 left
+"""
+
+FieldValue = namedtuple("FieldValue", ["name", "type", "value"])
+
 
 class Field:
-    def __init__(self, index=None, value=None, value_type=None, size=None,
-                 is_list=False, is_string=False):
+    """
+    Descriptor of a public field of a fields list. The value is kept in the
+    _<name> slot of the instances and its type in their _types
+    """
+
+    __slots__ = ("name", "index", "_slot", "_is_sized", "_resizes")
+
+    def __init__(self, name, index, slot, is_sized=False, resizes=False):
+        self.name = name
         self.index = index
-        self.value = value
-        self._value_type = value_type
-        self._value_size = size
-        self._is_list = is_list
-        self._is_string = is_string
+        self._slot = slot
+        # The size of lists and of bytes depends on their length
+        self._is_sized = is_sized
+        # The value gives the size of other values, like a count of entries
+        self._resizes = resizes
 
     def __repr__(self, *args, **kwargs):
-        return "{type}:{value}".format(type=self.type, value=self.value)
-
-    @property
-    def value_size(self):
-        return 0 if self._value_size is None else self._value_size
+        return "{class_name}({name!r})".format(
+            class_name=self.__class__.__name__, name=self.name)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return self._slot.__get__(instance, owner)
+
+    def __set__(self, instance, value):
+        value_type = None
+        if isinstance(value, tuple):
+            value, value_type = value if len(value) == 2 else (value[0], None)
+        current = self._slot.__get__(instance)
+        dirty = self._resizes or (current is None) != (value is None) or \
+            (self._is_sized and value is not None and
+             len(value) != len(current))
+        if value_type is not None and \
+                value_type != instance._types[self.index]:
+            instance._set_type(self.name, value_type)
+            dirty = True
+        self._slot.__set__(instance, value)
+        if dirty:
+            instance._mark_dirty()
+        else:
+            instance._mark_modified()
+
+    def resizing(self):
+        """ :return: a copy of the descriptor which marks the size of the
+                     fields list dirty on every change """
+        return Field(self.name, self.index, self._slot, self._is_sized,
+                     resizes=True)
+
+
+@lru_cache(maxsize=1024)
+def _replace_types(types, changes):
+    """
+    The types of the instances are shared between the ones with the same
+    layout
+
+    :param types: types of the fields
+    :type types: tuple of str
+    :param changes: (index, type) of the fields to change
+    :type changes: tuple
+    :return: the shared tuple of the types
+    """
+    types = list(types)
+    for index, value_type in changes:
+        types[index] = value_type
+    return tuple(types)
+
+
+def _read_string(bstr):
+    return bstr.readto(b'\0', bytealigned=True).bytes
+
+
+def _read_list(bstr, value_type, until_pos):
+    values = []
+    while bstr.bitpos < until_pos:
+        values.append(bstr.read(value_type))
+    return values
+
+
+def _get_field_kind(field):
+    if field.type == "string" or field.type == "bytes":
+        return _BYTES
+    if field.count is not None:
+        return _LIST
+    return _SCALAR
+
+
+def _is_instance_sized(field):
+    """ Integers without a size are sized by the instances """
+    return field.type.partition(":")[2] == "" and \
+        _get_field_kind(field) is not _BYTES
+
+
+def _get_short_condition(field):
+    if field.short_versions is None:
+        return "header.version != 1"
+    return "header.version in {!r}".format(tuple(field.short_versions))
+
+
+def _is_struct_field(field):
+    """ Fixed integers and bytes are read with struct, the other fields go
+    through bitstring """
+    if field.flag is not None or field.versions is not None or \
+            field.optional or isinstance(field.count, str) or \
+            field.count == TO_BOX_END or _get_field_kind(field) is _BYTES:
+        return False
+    for value_type in (field.type, field.short_type or field.type):
+        if value_type.startswith("bits") or \
+                _get_struct_codec((value_type,)) is None:
+            return False
+    return True
+
+
+def _get_field_bits_size(field):
+    """
+    :return: the size in bits of a field, modulo 8 for the fields which
+             don't have a fixed size, or None if it isn't known
+    """
+    kind = _get_field_kind(field)
+    if kind is _BYTES:
+        return 0
+    if _is_instance_sized(field):
+        # Big-endian integers are made of whole bytes
+        return 0 if field.type.endswith("be") else None
+    bits_size = _get_type_bits_size(field.type)
+    if field.short_type is not None and \
+            _get_type_bits_size(field.short_type) != bits_size:
+        return None
+    if isinstance(field.count, str) or field.count == TO_BOX_END:
+        return None if bits_size % 8 else 0
+    return bits_size * (field.count or 1)
+
+
+def _compile_schema_parser(layout):
+    """
+    Generate the parse_fields method of a layout. Consecutive struct fields
+    are unpacked from a single read
+
+    :param layout: fields of the fields list
+    :type layout: tuple of SchemaField
+    :return: the parse_fields function
+    """
+    namespace = {"read_bytes": read_bytes, "read_string": _read_string,
+                 "read_list": _read_list, "replace_types": _replace_types,
+                 "get_type_bits_size": _get_type_bits_size}
+    lines = ["def parse_fields(self, bstr, header):"]
+    if any(field.short_type is not None or _is_instance_sized(field)
+           for field in layout):
+        lines.append("    types = self._types")
+    if any(field.flag is not None for field in layout):
+        lines.append("    flags = int.from_bytes(header.flags, 'big')")
+    if any(field.optional or field.count == TO_BOX_END for field in layout):
+        lines.append("    end = header.start_pos + header.box_size")
+
+    short_types = {}
+    for i, field in enumerate(layout):
+        if field.short_type is not None:
+            short_types.setdefault(_get_short_condition(field), []) \
+                .append((i, field.short_type))
+    for i, (condition, changes) in enumerate(short_types.items()):
+        namespace["_short{}".format(i)] = tuple(changes)
+        lines.append("    if {}:".format(condition))
+        lines.append("        types = replace_types(types, _short{})"
+                     .format(i))
+    if short_types:
+        lines.append("    self._types = types")
+
+    # Bits offset in the current byte, None once it isn't known anymore
+    state = {"offset": 0, "runs": 0}
+    run = []
+
+    def flush_run():
+        if not run:
+            return
+        name = "_run{}".format(state["runs"])
+        state["runs"] += 1
+        types = tuple(value_type for field in run
+                      for value_type in [field.type] * (field.count or 1))
+        short_types = tuple(
+            value_type for field in run
+            for value_type in [field.short_type or field.type] *
+            (field.count or 1))
+        namespace[name] = _get_struct_codec(types)[0]
+        if short_types != types:
+            condition = next(_get_short_condition(field) for field in run
+                             if field.short_type is not None)
+            namespace[name + "_short"] = _get_struct_codec(short_types)[0]
+            lines.append("    run = {0}_short if {1} else {0}"
+                         .format(name, condition))
+        else:
+            lines.append("    run = {}".format(name))
+        if state["offset"] == 0:
+            lines.append("    values = run.unpack(read_bytes(bstr, run.size))")
+        else:
+            lines.append("    values = run.unpack(bstr.read(run.size * 8)"
+                         ".bytes)")
+        index = 0
+        for field in run:
+            if field.count is None:
+                value = "values[{}]".format(index)
+                index += 1
+            else:
+                value = "list(values[{}:{}])".format(index,
+                                                     index + field.count)
+                index += field.count
+            lines.append("    self._{} = {}".format(field.name, value))
+        run.clear()
+
+    for i, field in enumerate(layout):
+        if _is_struct_field(field):
+            # The fields of a run share the condition of their short types
+            if field.short_type is not None and any(
+                    _get_short_condition(other) !=
+                    _get_short_condition(field)
+                    for other in run if other.short_type is not None):
+                flush_run()
+            run.append(field)
+            continue
+        flush_run()
+
+        conditions = []
+        if field.flag is not None:
+            conditions.append("flags & {:#x}".format(field.flag))
+        if field.versions is not None:
+            conditions.append("header.version in {!r}"
+                              .format(tuple(field.versions)))
+        if field.optional:
+            conditions.append("bstr.bytepos < end")
+        if _is_instance_sized(field):
+            conditions.append("get_type_bits_size(types[{}])".format(i))
+        indent = "    "
+        if conditions:
+            lines.append("    if {}:".format(" and ".join(conditions)))
+            indent += "    "
+
+        value_type = "types[{}]".format(i) \
+            if field.short_type is not None or _is_instance_sized(field) \
+            else repr(field.type)
+        if field.type == "string":
+            value = "read_string(bstr)"
+        elif field.type == "bytes":
+            length = field.count if isinstance(field.count, int) \
+                else "self._{}".format(field.count)
+            value = "bstr.read({} * 8).bytes".format(length)
+        elif field.count == TO_BOX_END:
+            value = "read_list(bstr, {}, end * 8)".format(value_type)
+        elif field.count is not None:
+            count = field.count if isinstance(field.count, int) \
+                else "self._{}".format(field.count)
+            value = "[bstr.read({}) for _ in range({})]".format(value_type,
+                                                               count)
+        else:
+            value = "bstr.read({})".format(value_type)
+        lines.append("{}self._{} = {}".format(indent, field.name, value))
 
-    @property
-    def type(self):
-        return self._value_type if self._value_size is None else \
-            "{}:{}".format(self._value_type, self._value_size)
+        bits_size = _get_field_bits_size(field)
+        if bits_size is None or state["offset"] is None or \
+                (conditions and bits_size % 8):
+            state["offset"] = None
+        else:
+            state["offset"] = (state["offset"] + bits_size) % 8
+    flush_run()
+    if len(lines) == 1:
+        lines.append("    pass")
+
+    exec("\n".join(lines), namespace)
+    parse_fields = namespace["parse_fields"]
+    parse_fields.generated = True
+    return parse_fields
+
+
+def _compile_schema_init(layout, default_types):
+    """
+    Generate the method setting the initial value of every field of a layout
+
+    :param layout: fields of the fields list
+    :type layout: tuple of SchemaField
+    :param default_types: types of the fields shared by the instances
+    :type default_types: tuple of str
+    :return: the _init_fields function
+    """
+    namespace = {"_types": default_types}
+    lines = ["def _init_fields(self):",
+             "    self._types = _types"]
+    for i, field in enumerate(layout):
+        if field.default is None:
+            value = "None"
+        else:
+            namespace["_default{}".format(i)] = field.default
+            # Lists are modified in place, give each instance its own
+            value = "list(_default{})" if isinstance(field.default, list) \
+                else "_default{}"
+            value = value.format(i)
+        lines.append("    self._{} = {}".format(field.name, value))
+    exec("\n".join(lines), namespace)
+    return namespace["_init_fields"]
+
+
+def _compile_schema_getter(layout):
+    """ Generate the method returning the values of the fields of a layout
+    in a tuple """
+    namespace = {}
+    lines = ["def _get_fields_values(self):",
+             "    return ({})".format("".join("self._{}, ".format(field.name)
+                                              for field in layout))]
+    exec("\n".join(lines), namespace)
+    return namespace["_get_fields_values"]
+
+
+@lru_cache(maxsize=1024)
+def _get_types_bits_sizes(types):
+    return tuple(_get_type_bits_size(value_type) for value_type in types)
+
+
+def _compile_schema_serializer(layout):
+    """
+    Generate the method returning the types and the values to pack for the
+    fields of a layout which are set
+
+    :param layout: fields of the fields list
+    :type layout: tuple of SchemaField
+    :return: the _get_types_values function
+    """
+    lines = ["def _get_types_values(self):",
+             "    types = self._types",
+             "    values_types = []",
+             "    values = []"]
+    for i, field in enumerate(layout):
+        kind = _get_field_kind(field)
+        lines.append("    value = self._{}".format(field.name))
+        lines.append("    if value is not None:")
+        if kind is _LIST:
+            lines.append("        values_types.extend([types[{}]] * len(value))"
+                         .format(i))
+            lines.append("        values.extend(value)")
+        elif kind is _BYTES:
+            # Give variable length bytes a fixed layout
+            lines.append("        values_types.append('bytes:%d' % len(value))")
+            lines.append("        values.append(value)")
+        else:
+            lines.append("        values_types.append(types[{}])".format(i))
+            lines.append("        values.append(value)")
+    lines.append("    return tuple(values_types), values")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["_get_types_values"]
+
+
+def _compile_schema_sizer(layout):
+    """
+    Generate the method computing the size of the serialized fields of a
+    layout from their types
+
+    :param layout: fields of the fields list
+    :type layout: tuple of SchemaField
+    :return: the _get_bytes_size function
+    """
+    namespace = {"get_types_bits_sizes": _get_types_bits_sizes}
+    lines = ["def _get_bytes_size(self):",
+             "    sizes = get_types_bits_sizes(self._types)",
+             "    bits_size = 0"]
+    for i, field in enumerate(layout):
+        kind = _get_field_kind(field)
+        lines.append("    value = self._{}".format(field.name))
+        lines.append("    if value is not None:")
+        if kind is _LIST:
+            lines.append("        bits_size += sizes[{}] * len(value)"
+                         .format(i))
+        elif kind is _BYTES:
+            lines.append("        bits_size += len(value) * 8")
+        else:
+            lines.append("        bits_size += sizes[{}]".format(i))
+    lines.append("    return bits_size // 8")
+    exec("\n".join(lines), namespace)
+    return namespace["_get_bytes_size"]
+
+
+class _FieldsListMeta(ABCMeta):
+    """
+    Creates the slots of the fields declared by the _schema of a fields list
+    class, on top of the fields of its base class. The descriptors and the
+    methods initializing, parsing, serializing and sizing the fields are
+    generated once when the class is created, unless the class defines them
+    itself
+    """
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        schema = namespace.get("_schema")
+        slots = tuple(namespace.get("__slots__", ()))
+        if schema is not None:
+            slots = tuple("_" + field.name for field in schema) + slots
+        # Boxes and headers get a __dict__ from their other bases
+        namespace["__slots__"] = slots
+        cls = super().__new__(mcs, name, bases, namespace, **kwargs)
+
+        if schema is not None:
+            mcs._compile_schema(cls, schema)
+        for field_name in getattr(cls, "_resizing_fields", ()):
+            field = getattr(cls, field_name, None)
+            if isinstance(field, Field) and not field._resizes:
+                setattr(cls, field_name, field.resizing())
+        return cls
+
+    @staticmethod
+    def _compile_schema(cls, schema):
+        layout = getattr(super(cls, cls), "_fields_layout", ()) + \
+            tuple(schema)
+        cls._fields_layout = layout
+        cls._fields_indices = {field.name: i for i, field in enumerate(layout)}
+        kinds = tuple(_get_field_kind(field) for field in layout)
+        cls._default_types = tuple("bytes" if field.type == "string"
+                                   else field.type for field in layout)
+
+        count_names = {field.count for field in layout
+                       if isinstance(field.count, str)}
+        for i, field in enumerate(layout[len(layout) - len(schema):],
+                                  len(layout) - len(schema)):
+            if field.public and field.name not in cls.__dict__:
+                setattr(cls, field.name,
+                        Field(field.name, i, cls.__dict__["_" + field.name],
+                              is_sized=kinds[i] is not _SCALAR,
+                              resizes=field.name in count_names))
+
+        cls._init_fields = _compile_schema_init(layout, cls._default_types)
+        cls._get_fields_values = _compile_schema_getter(layout)
+        if "_get_types_values" not in cls.__dict__:
+            cls._get_types_values = _compile_schema_serializer(layout)
+        if "_get_bytes_size" not in cls.__dict__:
+            cls._get_bytes_size = _compile_schema_sizer(layout)
+        parse_fields = getattr(cls, "parse_fields", None)
+        if "parse_fields" not in cls.__dict__ and \
+                (parse_fields is None or
+                 getattr(parse_fields, "generated", False)):
+            cls.parse_fields = _compile_schema_parser(layout)
+
+
+class AbstractFieldsList(metaclass=_FieldsListMeta):
+    """
+    Fields list declared by a _schema of SchemaField. The values of the
+    fields are kept in slots and read or set through descriptors named after
+    the fields. The fields of a subclass follow the ones of its base class
+    """
+
+    __slots__ = ("_types",)
+
+    _schema = ()
+    # Names of the fields which give the size of values outside of the
+    # fields, like a count of entries
+    _resizing_fields = ()
+
+    def __init__(self):
+        self._init_fields()
+
+    def __getstate__(self):
+        state = dict(getattr(self, "__dict__", {}))
+        state["_types"] = self._types
+        for field, value in zip(self._fields_layout,
+                                self._get_fields_values()):
+            # Memory-mapped and unread values can't be pickled, copy them
+            if isinstance(value, (memoryview, PayloadView)):
+                value = bytes(value)
+            state["_" + field.name] = value
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        # Share the types again
+        self._types = _replace_types(self._types, ())
 
-    @type.setter
-    def type(self, value):
-        split_iter = iter(value.split(':'))
-        self._value_type = next(split_iter, None)
-        self._value_size = next(split_iter, None)
+    def __bytes__(self):
+        types, values = self._get_types_values()
+        packer = _get_values_struct(types, values)
+        if packer is not None:
+            try:
+                return packer.pack(*values)
+            except struct.error:
+                # Let bitstring handle or report the values
+                pass
 
-    @property
-    def is_list(self):
-        return self._is_list
+        return bs.pack(','.join(types), *values).bytes
 
-    @property
-    def is_string(self):
-        return self._is_string
+    def pack_into(self, buffer, offset=0):
+        """
+        Pack the fields directly in a writable buffer
+
+        :param buffer: writable bytes-like object
+        :type buffer: bytearray, memoryview, mmap.mmap
+        :param offset: position of the fields in the buffer
+        :return: the position following the fields in the buffer
+        """
+        types, values = self._get_types_values()
+        packer = _get_values_struct(types, values)
+        if packer is not None:
+            try:
+                packer.pack_into(buffer, offset, *values)
+                return offset + packer.size
+            except struct.error:
+                pass
 
+        data = bs.pack(','.join(types), *values).bytes
+        buffer[offset:offset + len(data)] = data
+        return offset + len(data)
 
-class AbstractFieldsList:
-    def __init__(self, length):
-        self._fields = [None] * length
-        self._end_index = 0
+    def __len__(self):
+        return sum(value is not None for value in self._get_fields_values())
 
-    def __bytes__(self):
-        values = []
-        types = []
-        for field in self._fields[:self._end_index]:
-            if field is None:
-                continue
-            if field.is_list:
-                values.extend(field.value)
-                types.extend([field.type] * len(field.value))
-            else:
-                values.append(field.value)
-                types.append(field.type)
-        return bs.pack(','.join(types), *values).bytes
+    def _mark_dirty(self):
+        """ Called when a field is modified in a way that could change the
+        size of the fields """
+        pass
 
-    def __len__(self):
-        # TODO: this could be optimized if needed
-        return len([field for field in self._fields[:self._end_index]
-                    if field is not None])
-
-    def _set_field(self, field, value, value_type=None):
-        if value is not None:
-            if value_type is None and isinstance(value, tuple):
-                value, value_type = value if len(value) == 2 else (*value, None)
-            if field.index is None:
-                self._register_field(field)
-            else:
-                self._end_index = max(self._end_index, field.index + 1)
-            if field.value is None:
-                self._fields[field.index] = field
-            field.value = value
-        else:
-            self._drop_field(field)
-        if value_type is not None:
-            field.type = value_type
-
-    def _read_field(self, bstr, field, value_type=None, until_pos=None):
-        if value_type is None:
-            value_type = field.type
-        if field.is_string:
-            value = bstr.readto(b'\0', bytealigned=True).bytes
-        elif field.is_list:
-            value = []
-            while bstr.bitpos < until_pos:
-                value.append(bstr.read(value_type))
-        else:
-            value = bstr.read(value_type)
-        self._set_field(field, value, value_type)
+    def _mark_modified(self):
+        """ Called when a field is set """
+        pass
 
-    def _register_field(self, field):
-        field.index = self._end_index
-        self._end_index += 1
-        return field
+    def _set_type(self, name, value_type):
+        """
+        Change the type of a field of the instance
 
-    def _drop_field(self, field):
-        field.value = None
-        self._fields[field.index] = None
+        :param name: name of the field
+        :param value_type: bitstring type of the field
+        """
+        self._types = _replace_types(
+            self._types, ((self._fields_indices[name], value_type),))
 
     @property
     def fields(self):
-        # TODO: this could be optimized if needed
-        return [field for field in self._fields[:self._end_index] if
-                field is not None]
+        return [FieldValue(field.name, value_type, value)
+                for field, value_type, value in zip(self._fields_layout,
+                                                    self._types,
+                                                    self._get_fields_values())
+                if value is not None]
 
 
-class BoxHeaderFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 4)
-
-        self._box_size = self._register_field(Field(value_type="uintbe", size=32))
-        self._box_type = self._register_field(Field(value_type="bytes", size=4))
-        self._box_ext_size = self._register_field(Field(value_type="uintbe", size=64))
-        self._user_type = self._register_field(Field(value_type="bytes", size=16))
+# The fields lists used to only be declared with a schema when they derived
+# from it
+AbstractSchemaFieldsList = AbstractFieldsList
 
-    @property
-    def box_size(self):
-        return self._box_size.value
 
-    @box_size.setter
-    def box_size(self, value):
-        self._set_field(self._box_size, value)
+class AbstractEntryFieldsList(AbstractFieldsList):
+    """
+    Fields list of an entry of a box. The changes to its fields are
+    forwarded to the box or the entry owning it
+    """
 
-    @property
-    def box_type(self):
-        return self._box_type.value
+    __slots__ = ("_owner",)
 
-    @box_type.setter
-    def box_type(self, value):
-        self._set_field(self._box_type, value)
+    def __init__(self):
+        super().__init__()
+        self._owner = None
 
-    @property
-    def box_ext_size(self):
-        return self._box_ext_size.value
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_owner"] = self._owner
+        return state
 
-    @box_ext_size.setter
-    def box_ext_size(self, value):
-        self._set_field(self._box_ext_size, value)
+    def _mark_dirty(self):
+        if self._owner is not None:
+            self._owner._mark_dirty()
 
-    @property
-    def user_type(self):
-        return self._user_type.value
+    def _mark_modified(self):
+        if self._owner is not None:
+            self._owner._mark_modified()
 
-    @user_type.setter
-    def user_type(self, value):
-        self._set_field(self._user_type, value)
 
-    def parse_fields(self, bstr):
-        self._read_field(bstr, self._box_size)
-        self._read_field(bstr, self._box_type)
+class BoxHeaderFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("box_size", "uintbe:32"),
+        SchemaField("box_type", "bytes:4"),
+        SchemaField("box_ext_size", "uintbe:64"),
+        SchemaField("user_type", "bytes:16"))
 
-        # if size == 1, then this is an extended size type.
-        if self._box_size.value == 1:
-            self._read_field(bstr, self._box_ext_size)
+    # size + type + extended size + user type
+    max_header_size = _BOX_HEADER.size + _BOX_EXT_SIZE.size + _USER_TYPE_SIZE
 
-        if self._box_type.value == b'uuid':
-            self._read_field(bstr, self._user_type)
+    def parse_fields(self, bstr):
+        buffer = get_buffer(bstr)
+        if buffer is not None:
+            bstr.bytepos = self.parse_fields_buffer(buffer, bstr.bytepos)
+            return
+
+        # Peek all the bytes the header could span at once and let struct
+        # decode them instead of reading each field through bitstring
+        peek_size = min(self.max_header_size, (bstr.len - bstr.pos) // 8)
+        buffer = bstr.peek(peek_size * 8).bytes
+        bstr.bytepos += self.parse_fields_buffer(buffer)
+
+    def parse_fields_buffer(self, buffer, offset=0):
+        """
+        Parse the header fields from a bytes-like buffer
+
+        :param buffer: bytes-like object holding the header
+        :param offset: position of the header in the buffer
+        :return: the position following the header in the buffer
+        """
+        try:
+            box_size, box_type = _BOX_HEADER.unpack_from(buffer, offset)
+            offset += _BOX_HEADER.size
+            self._box_size = box_size
+            self._box_type = box_type
+
+            # if size == 1, then this is an extended size type.
+            if box_size == 1:
+                self._box_ext_size, = _BOX_EXT_SIZE.unpack_from(buffer,
+                                                               offset)
+                offset += _BOX_EXT_SIZE.size
+
+            if box_type == b'uuid':
+                user_type = bytes(buffer[offset:offset + _USER_TYPE_SIZE])
+                if len(user_type) != _USER_TYPE_SIZE:
+                    raise struct.error("buffer too small for user type")
+                offset += _USER_TYPE_SIZE
+                self._user_type = user_type
+        except struct.error as error:
+            raise bs.ReadError("Not enough bytes to read box header: {}"
+                               .format(error))
+
+        return offset
 
 
 class FullBoxHeaderFieldsList(BoxHeaderFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._version = self._register_field(Field(value_type="uintbe", size=8))
-        self._flags = self._register_field(Field(value_type="bits", size=24))
-
-    @property
-    def version(self):
-        return self._version.value
-
-    @version.setter
-    def version(self, value):
-        self._set_field(self._version, value)
+    _schema = (
+        SchemaField("version", "uintbe:8"),
+        SchemaField("flags", "bits:24"))
 
     @property
     def flags(self):
-        return self._flags.value
+        return self._flags
 
     @flags.setter
     def flags(self, value):
+        if isinstance(value, tuple):
+            value = value[0]
         if isinstance(value, bs.BitStream):
             value = value.bytes
-        self._set_field(self._flags, value)
+        self._flags = value
+        self._mark_modified()
 
-    def parse_fields(self, bstr):
-        super().parse_fields(bstr)
+    max_header_size = BoxHeaderFieldsList.max_header_size + \
+                      _FULL_BOX_HEADER.size
 
-        self._read_field(bstr, self._version)
-        self._read_field(bstr, self._flags)
-        self._flags.value = self._flags.value.bytes
+    def parse_fields_buffer(self, buffer, offset=0):
+        offset = super().parse_fields_buffer(buffer, offset)
+        return self.parse_full_box_fields_buffer(buffer, offset)
 
+    def parse_full_box_fields_buffer(self, buffer, offset=0):
+        """
+        Parse only the version and flags from a bytes-like buffer
 
-class DataBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
+        :param buffer: bytes-like object holding the version and flags
+        :param offset: position of the version in the buffer
+        :return: the position following the flags in the buffer
+        """
+        try:
+            self._version, self._flags = \
+                _FULL_BOX_HEADER.unpack_from(buffer, offset)
+        except struct.error as error:
+            raise bs.ReadError("Not enough bytes to read full box header: {}"
+                               .format(error))
 
-        self._data = self._register_field(Field(value_type="bytes"))
+        return offset + _FULL_BOX_HEADER.size
 
-    @property
-    def data(self):
-        return self._data.value
 
-    @data.setter
-    def data(self, value):
-        self._set_field(self._data, value)
+class DataBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("data", "bytes"),)
 
     def parse_fields(self, bstr, header):
         data_length = header.box_size - header.header_size
-        if data_length:
-            self._read_field(bstr, self._data, value_type="bytes:{}".format(data_length))
-            # _read_field() setted the expected length of the field.
-            # Remove the expected length
-            self._data.type = "bytes"
+        self._data = read_bytes(bstr, data_length) if data_length else b''
+
+    def load_fields_at(self, source, header):
+        """
+        Reference the data without using or moving the position of the
+        source. The data is a slice of the mapping of a memory-mapped source,
+        otherwise a view which is only read when accessed
+
+        :param source: The bitstring or reader holding the box
+        :param header: The header of the box
+        """
+        data_length = header.box_size - header.header_size
+        data_pos = header.start_pos + header.header_size
+        # The data doesn't change, it isn't set as a modification
+        if not data_length:
+            self._data = b''
+        elif get_buffer(source) is not None:
+            self._data = read_at(source, data_pos, data_length)
         else:
-            self._data.value = b''
+            self._data = PayloadView(source, data_pos, data_length)
 
 
 # Root boxes
 class FileTypeBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 3)
-
-        self._major_brand = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._minor_version = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._compatible_brands = \
-            self._register_field(Field(value_type="uintbe", size=32, is_list=True))
-
-    @property
-    def major_brand(self):
-        return self._major_brand.value
-
-    @major_brand.setter
-    def major_brand(self, value):
-        self._set_field(self._major_brand, value)
-
-    @property
-    def minor_version(self):
-        return self._minor_version.value
-
-    @minor_version.setter
-    def minor_version(self, value):
-        self._set_field(self._minor_version, value)
-
-    @property
-    def compatible_brands(self):
-        return self._compatible_brands.value
-
-    @compatible_brands.setter
-    def compatible_brands(self, value):
-        self._set_field(self._compatible_brands, value)
-
-    def parse_fields(self, bstr, header):
-        self._read_field(bstr, self._major_brand)
-        self._read_field(bstr, self._minor_version)
-        self._read_field(bstr, self._compatible_brands,
-                         until_pos=(header.start_pos + header.box_size) * 8)
+    _schema = (
+        SchemaField("major_brand", "uintbe:32"),
+        SchemaField("minor_version", "uintbe:32"),
+        SchemaField("compatible_brands", "uintbe:32", count=TO_BOX_END))
 
 
 # moov boxes
 class MovieHeaderBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 11)
-
-        self._creation_time = \
-            self._register_field(Field(value_type="uintbe", size=64))
-        self._modification_time = \
-            self._register_field(Field(value_type="uintbe", size=64))
-        self._timescale = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._duration = \
-            self._register_field(Field(value_type="uintbe", size=64))
-
+    _schema = (
+        SchemaField("creation_time", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("modification_time", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("timescale", "uintbe:32"),
+        SchemaField("duration", "uintbe:64", short_type="uintbe:32"),
         # TODO: create a 16.16 fixed representation
-        self._rate = \
-            self._register_field(Field(value_type="uintbe", size=16, is_list=True))
-        self._rate_length = 16 * 2
+        SchemaField("rate", "uintbe:16", count=2),
         # TODO: create a 8.8 fixed representation
-        self._volume = \
-            self._register_field(Field(value_type="uintbe", size=8, is_list=True))
-        self._volume_length = 8 * 2
-
-        self._reserved0 = \
-            self._register_field(Field(value_type="bits", size=16))
-        self._reserved1 = \
-            self._register_field(Field(value_type="bits", size=32, is_list=True))
-        self._reserved1_length = 32 * 2
-
-        self._matrix = \
-            self._register_field(Field(value_type="uintbe", size=32, is_list=True))
-        self._matrix_length = 32 * 9
-        self._pre_defined = \
-            self._register_field(Field(value_type="bits", size=32, is_list=True))
-        self._pre_defined_length = 32 * 6
-
-        self._next_track_id = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._reserved0, b'\0' * 2)
-        self._set_field(self._reserved1, [b'\0' * 4] * 2)
-
-    @property
-    def creation_time(self):
-        return self._creation_time.value
-
-    @creation_time.setter
-    def creation_time(self, value):
-        self._set_field(self._creation_time, value)
-
-    @property
-    def modification_time(self):
-        return self._modification_time.value
-
-    @modification_time.setter
-    def modification_time(self, value):
-        self._set_field(self._modification_time, value)
-
-    @property
-    def timescale(self):
-        return self._timescale.value
-
-    @timescale.setter
-    def timescale(self, value):
-        self._set_field(self._timescale, value)
-
-    @property
-    def duration(self):
-        return self._duration.value
-
-    @duration.setter
-    def duration(self, value):
-        self._set_field(self._duration, value)
-
-    @property
-    def rate(self):
-        return self._rate.value
-
-    @rate.setter
-    def rate(self, value):
-        self._set_field(self._rate, value)
-
-    @property
-    def volume(self):
-        return self._volume.value
-
-    @volume.setter
-    def volume(self, value):
-        self._set_field(self._volume, value)
-
-    @property
-    def matrix(self):
-        return self._matrix.value
-
-    @matrix.setter
-    def matrix(self, value):
-        self._set_field(self._matrix, value)
-
-    @property
-    def pre_defined(self):
-        return self._pre_defined.value
-
-    @pre_defined.setter
-    def pre_defined(self, value):
-        self._set_field(self._pre_defined, value)
-
-    @property
-    def next_track_id(self):
-        return self._next_track_id.value
-
-    @next_track_id.setter
-    def next_track_id(self, value):
-        self._set_field(self._next_track_id, value)
-
-    def parse_fields(self, bstr, header):
-        if header.version != 1:
-            self._creation_time.type = "uintbe:32"
-            self._modification_time.type = "uintbe:32"
-            self._timescale.type = "uintbe:32"
-            self._duration.type = "uintbe:32"
-
-        self._read_field(bstr, self._creation_time)
-        self._read_field(bstr, self._modification_time)
-        self._read_field(bstr, self._timescale)
-        self._read_field(bstr, self._duration)
-
-        self._read_field(bstr, self._rate,
-                         until_pos=bstr.bitpos + self._rate_length)
-        self._read_field(bstr, self._volume,
-                         until_pos=bstr.bitpos + self._volume_length)
-
-        self._read_field(bstr, self._reserved0)
-        self._read_field(bstr, self._reserved1,
-                         until_pos=bstr.bitpos + self._reserved1_length)
-
-        self._read_field(bstr, self._matrix,
-                         until_pos=bstr.bitpos + self._matrix_length)
-        self._read_field(bstr, self._pre_defined,
-                         until_pos=bstr.bitpos + self._pre_defined_length)
-
-        self._read_field(bstr, self._next_track_id)
+        SchemaField("volume", "uintbe:8", count=2),
+        SchemaField("reserved0", "bits:16", default=b'\0' * 2, public=False),
+        SchemaField("reserved1", "bits:32", count=2, default=[b'\0' * 4] * 2,
+                    public=False),
+        SchemaField("matrix", "uintbe:32", count=9),
+        SchemaField("pre_defined", "bits:32", count=6),
+        SchemaField("next_track_id", "uintbe:32"))
 
 
 # meta boxes
 class ItemLocationBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 6)
-
-        self._offset_size = \
-            self._register_field(Field(value_type="uint", size=4))
-        self._length_size = \
-            self._register_field(Field(value_type="uint", size=4))
-        self._base_offset_size = \
-            self._register_field(Field(value_type="uint", size=4))
-        self._index_size = \
-            self._register_field(Field(value_type="uint", size=4))
-        self._reserved0 = \
-            self._register_field(Field(value_type="uint", size=4))
-
-        self._item_count = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def offset_size(self):
-        return self._offset_size.value
-
-    @offset_size.setter
-    def offset_size(self, value):
-        self._set_field(self._offset_size, value)
-
-    @property
-    def length_size(self):
-        return self._length_size.value
-
-    @length_size.setter
-    def length_size(self, value):
-        self._set_field(self._length_size, value)
-
-    @property
-    def base_offset_size(self):
-        return self._base_offset_size.value
-
-    @base_offset_size.setter
-    def base_offset_size(self, value):
-        self._set_field(self._base_offset_size, value)
-
-    @property
-    def index_size(self):
-        return self._index_size.value
-
-    @index_size.setter
-    def index_size(self, value):
-        self._set_field(self._index_size, value)
-
-    @property
-    def item_count(self):
-        return self._item_count.value
-
-    @item_count.setter
-    def item_count(self, value):
-        self._set_field(self._item_count, value)
-
-    def parse_fields(self, bstr, header):
-        if header.version < 2:
-            self._item_count.type = "uintbe:16"
-
-        self._read_field(bstr, self._offset_size)
-        self._read_field(bstr, self._length_size)
-        self._read_field(bstr, self._base_offset_size)
-
-        if header.version == 1 or header.version == 2:
-            self._read_field(bstr, self._index_size)
-        else:
-            self._read_field(bstr, self._reserved0)
-
-        self._read_field(bstr, self._item_count)
+    _schema = (
+        SchemaField("offset_size", "uint:4"),
+        SchemaField("length_size", "uint:4"),
+        SchemaField("base_offset_size", "uint:4"),
+        SchemaField("index_size", "uint:4", versions=(1, 2)),
+        SchemaField("reserved0", "uint:4", versions=(0,), public=False),
+        SchemaField("item_count", "uintbe:32", short_type="uintbe:16",
+                    short_versions=(0, 1)))
+
+
+class ItemLocationBoxItemFieldsList(AbstractEntryFieldsList):
+    # base_offset is sized by the base_offset_size of the box
+    _schema = (
+        SchemaField("item_id", "uintbe:32", short_type="uintbe:16",
+                    short_versions=(0, 1)),
+        SchemaField("reserved0", "uint:12", versions=(1, 2), public=False),
+        SchemaField("construction_method", "uint:4", versions=(1, 2)),
+        SchemaField("data_reference_index", "uintbe:16"),
+        SchemaField("base_offset", "uintbe"),
+        SchemaField("extent_count", "uintbe:16"))
 
-
-class ItemLocationBoxItemFieldsList(AbstractFieldsList):
     def __init__(self, base_offset_size):
         # TODO: do mention that ItemLocationBoxItemFieldsList does not make
         #  use of super()
-        AbstractFieldsList.__init__(self, 6)
-
-        self._item_id = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._reserved0 = \
-            self._register_field(Field(value_type="uint", size=12))
-        self._construction_method = \
-            self._register_field(Field(value_type="uint", size=4))
-        self._data_reference_index = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._base_offset = \
-            self._register_field(Field(value_type="uintbe", size=base_offset_size * 8))
-        self._extent_count = \
-            self._register_field(Field(value_type="uintbe", size=16))
-
-    @property
-    def item_id(self):
-        return self._item_id.value
-
-    @item_id.setter
-    def item_id(self, value):
-        self._set_field(self._item_id, value)
-
-    @property
-    def construction_method(self):
-        return self._construction_method.value
-
-    @construction_method.setter
-    def construction_method(self, value):
-        self._set_field(self._construction_method, value)
-
-    @property
-    def data_reference_index(self):
-        return self._data_reference_index.value
-
-    @data_reference_index.setter
-    def data_reference_index(self, value):
-        self._set_field(self._data_reference_index, value)
-
-    @property
-    def base_offset(self):
-        return self._base_offset.value
-
-    @base_offset.setter
-    def base_offset(self, value):
-        self._set_field(self._base_offset, value)
-
-    @property
-    def extent_count(self):
-        return self._extent_count.value
-
-    @extent_count.setter
-    def extent_count(self, value):
-        self._set_field(self._extent_count, value)
+        AbstractEntryFieldsList.__init__(self)
+        self._set_type("base_offset", "uintbe:{}".format(base_offset_size * 8))
 
-    def parse_fields(self, bstr, header):
-        if header.version < 2:
-            self._item_id.type = "uintbe:16"
-
-        self._read_field(bstr, self._item_id)
-
-        if header.version == 1 or header.version == 2:
-            self._read_field(bstr, self._reserved0)
-            self._read_field(bstr, self._construction_method)
-
-        self._read_field(bstr, self._data_reference_index)
-        if self._base_offset.value_size > 0:
-            self._read_field(bstr, self._base_offset)
 
-        self._read_field(bstr, self._extent_count)
+class ItemLocationBoxItemExtentFieldsList(AbstractEntryFieldsList):
+    # The fields are sized by the sizes of the box
+    _schema = (
+        SchemaField("extent_index", "uintbe", versions=(1, 2)),
+        SchemaField("extent_offset", "uintbe"),
+        SchemaField("extent_length", "uintbe"))
 
-
-class ItemLocationBoxItemExtentFieldsList(AbstractFieldsList):
     def __init__(self, index_size, offset_size, length_size):
         # TODO: do mention that ItemLocationBoxItemExtentFieldsList does not
         #  make use of super()
-        AbstractFieldsList.__init__(self, 3)
-
-        self._extent_index = \
-            self._register_field(Field(value_type="uintbe", size=index_size * 8))
-        self._extent_offset = \
-            self._register_field(Field(value_type="uintbe", size=offset_size * 8))
-        self._extent_length = \
-            self._register_field(Field(value_type="uintbe", size=length_size * 8))
-
-    @property
-    def extent_index(self):
-        return self._extent_index.value
+        AbstractEntryFieldsList.__init__(self)
+        self._types = _replace_types(self._types,
+                                     ((0, "uintbe:{}".format(index_size * 8)),
+                                      (1, "uintbe:{}".format(offset_size * 8)),
+                                      (2, "uintbe:{}".format(length_size * 8))))
 
-    @extent_index.setter
-    def extent_index(self, value):
-        self._set_field(self._extent_index, value)
 
-    @property
-    def extent_offset(self):
-        return self._extent_offset.value
+# trak boxes
+class TrackHeaderBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("creation_time", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("modification_time", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("track_id", "uintbe:32"),
+        SchemaField("reserved0", "bits:32", short_type="uintbe:32",
+                    default=b'\0' * 4, public=False),
+        SchemaField("duration", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("reserved1", "bits:32", count=2, default=[b'\0' * 4] * 2,
+                    public=False),
+        SchemaField("layer", "uintbe:16"),
+        SchemaField("alternate_group", "uintbe:16"),
+        # TODO: create a 8.8 fixed representation
+        SchemaField("volume", "uintbe:8", count=2),
+        SchemaField("reserved2", "bits:16", default=b'\0' * 2, public=False),
+        SchemaField("matrix", "uintbe:32", count=9),
+        # TODO: create a 16.16 fixed representation
+        SchemaField("width", "uintbe:16", count=2),
+        SchemaField("height", "uintbe:16", count=2))
 
-    @extent_offset.setter
-    def extent_offset(self, value):
-        self._set_field(self._extent_offset, value)
 
-    @property
-    def extent_length(self):
-        return self._extent_length.value
+# iref boxes
+class SingleItemTypeReferenceBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("from_item_id", "uintbe:16"),
+        SchemaField("reference_count", "uintbe:16"),
+        SchemaField("to_item_ids", "uintbe:16", count="reference_count"))
 
-    @extent_length.setter
-    def extent_length(self, value):
-        self._set_field(self._extent_length, value)
 
-    def parse_fields(self, bstr, header):
-        if (header.version == 1 or header.version == 2) and \
-           self._extent_index.value_size > 0:
-            self._read_field(bstr, self._extent_index)
+class SingleItemTypeReferenceBoxLargeFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("from_item_id", "uintbe:32"),
+        SchemaField("reference_count", "uintbe:16"),
+        SchemaField("to_item_ids", "uintbe:32", count="reference_count"))
 
-        if self._extent_offset.value_size > 0:
-            self._read_field(bstr, self._extent_offset)
-        if self._extent_length.value_size > 0:
-            self._read_field(bstr, self._extent_length)
 
+# iprp boxes
+class ItemPropertyAssociationBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32"),)
 
-# trak boxes
-class TrackHeaderBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 13)
-
-        self._creation_time = \
-            self._register_field(Field(value_type="uintbe", size=64))
-        self._modification_time = \
-            self._register_field(Field(value_type="uintbe", size=64))
-        self._track_id = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._reserved0 = \
-            self._register_field(Field(value_type="bits", size=32))
-        self._duration = \
-            self._register_field(Field(value_type="uintbe", size=64))
-
-        self._reserved1 = \
-            self._register_field(Field(value_type="bits", size=32, is_list=True))
-        self._reserved1_length = 32 * 2
-
-        self._layer = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._alternate_group = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        # TODO: create a 8.8 fixed representation
-        self._volume = \
-            self._register_field(Field(value_type="uintbe", size=8, is_list=True))
-        self._volume_length = 8 * 2
 
-        self._reserved2 = \
-            self._register_field(Field(value_type="bits", size=16))
+class ItemPropertyAssociationBoxEntryFieldsList(AbstractEntryFieldsList):
+    _schema = (
+        SchemaField("item_id", "uintbe:32", short_type="uintbe:16",
+                    short_versions=(0,)),
+        SchemaField("association_count", "uintbe:8"))
 
-        self._matrix = \
-            self._register_field(Field(value_type="uintbe", size=32, is_list=True))
-        self._matrix_length = 32 * 9
 
-        # TODO: create a 16.16 fixed representation
-        self._width = \
-            self._register_field(Field(value_type="uintbe", size=16, is_list=True))
-        self._width_length = 16 * 2
-        self._height = \
-            self._register_field(Field(value_type="uintbe", size=16, is_list=True))
-        self._height_length = 16 * 2
-
-        # initialize with empty value
-        self._set_field(self._reserved0, b'\0' * 4)
-        self._set_field(self._reserved1, [b'\0' * 4] * 2)
-        self._set_field(self._reserved2, b'\0' * 2)
+class ItemPropertyAssociationBoxEntryAssociationsFieldsList(AbstractEntryFieldsList):
+    # TODO: validate that this parsing is correct
+    _schema = (
+        SchemaField("essential", "bits:1"),
+        SchemaField("property_index_8b", "uint:8", flag=0x1, public=False),
+        SchemaField("property_index_7b", "uint:7", public=False))
 
     @property
-    def creation_time(self):
-        return self._creation_time.value
+    def essential(self):
+        return self._essential.bool
 
-    @creation_time.setter
-    def creation_time(self, value):
-        self._set_field(self._creation_time, value)
+    @essential.setter
+    def essential(self, value):
+        if isinstance(value, tuple):
+            value = value[0]
+        self._essential = value
+        self._mark_modified()
 
     @property
-    def modification_time(self):
-        return self._modification_time.value
+    def property_index(self):
+        if self._property_index_8b is None:
+            return self._property_index_7b
+        return self._property_index_8b + (self._property_index_7b << 8)
 
-    @modification_time.setter
-    def modification_time(self, value):
-        self._set_field(self._modification_time, value)
+    @property_index.setter
+    def property_index(self, value):
+        value, value_type = value
+        # TODO: validate that this writing is correct
+        self._property_index_8b = value & 255
+        self._property_index_7b = (value & 127 << 8) >> 8
+        self._mark_modified()
 
-    @property
-    def track_id(self):
-        return self._track_id.value
 
-    @track_id.setter
-    def track_id(self, value):
-        self._set_field(self._track_id, value)
+# mdia boxes
+class MediaHeaderBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("creation_time", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("modification_time", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("timescale", "uintbe:32"),
+        SchemaField("duration", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("pad0", "bits:1", default=0x1, public=False),
+        # TODO: check if uintbe can be used here
+        SchemaField("language", "uint:5", count=3),
+        SchemaField("pre_defined", "uintbe:16"))
 
-    @property
-    def duration(self):
-        return self._duration.value
 
-    @duration.setter
-    def duration(self, value):
-        self._set_field(self._duration, value)
+class HandlerReferenceBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("pre_defined", "uintbe:32"),
+        SchemaField("handler_type", "bytes:4"),
+        SchemaField("reserved0", "bits:32", count=3, default=[b'\0' * 4] * 3,
+                    public=False),
+        SchemaField("name", "string"))
 
-    @property
-    def layer(self):
-        return self._layer.value
 
-    @layer.setter
-    def layer(self, value):
-        self._set_field(self._layer, value)
+# edts boxes
+class EditListBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32", default=0),)
 
-    @property
-    def alternate_group(self):
-        return self._alternate_group.value
 
-    @alternate_group.setter
-    def alternate_group(self, value):
-        self._set_field(self._alternate_group, value)
+class EditListBoxEntryFieldsList(AbstractEntryFieldsList):
+    _schema = (
+        SchemaField("segment_duration", "uintbe:64", short_type="uintbe:32",
+                    short_versions=(0,)),
+        SchemaField("media_time", "uintbe:64", short_type="uintbe:32",
+                    short_versions=(0,)),
+        SchemaField("media_rate_integer", "uintbe:16"),
+        SchemaField("media_rate_fraction", "uintbe:16"))
 
-    @property
-    def volume(self):
-        return self._volume.value
 
-    @volume.setter
-    def volume(self, value):
-        self._set_field(self._volume, value)
+# minf boxes
+class VideoMediaHeaderBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("graphicsmode", "uintbe:16"),
+        SchemaField("opcolor", "uintbe:16", count=3))
 
-    @property
-    def matrix(self):
-        return self._matrix.value
 
-    @matrix.setter
-    def matrix(self, value):
-        self._set_field(self._matrix, value)
+# stbl boxes
+class SampleDescriptionBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32", default=0),)
 
-    @property
-    def width(self):
-        return self._width.value
 
-    @width.setter
-    def width(self, value):
-        self._set_field(self._width, value)
+class TimeToSampleBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32", default=0),)
 
-    @property
-    def height(self):
-        return self._height.value
 
-    @height.setter
-    def height(self, value):
-        self._set_field(self._height, value)
+class CompositionOffsetBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32", default=0),)
 
-    def parse_fields(self, bstr, header):
-        if header.version != 1:
-            self._creation_time.type = "uintbe:32"
-            self._modification_time.type = "uintbe:32"
-            self._track_id.type = "uintbe:32"
-            self._reserved0.type = "uintbe:32"
-            self._duration.type = "uintbe:32"
 
-        self._read_field(bstr, self._creation_time)
-        self._read_field(bstr, self._modification_time)
-        self._read_field(bstr, self._track_id)
-        self._read_field(bstr, self._reserved0)
-        self._read_field(bstr, self._duration)
+class SampleSizeBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("sample_size", "uintbe:32"),
+        SchemaField("sample_count", "uintbe:32", default=0))
 
-        self._read_field(bstr, self._reserved1,
-                         until_pos=bstr.bitpos + self._reserved1_length)
 
-        self._read_field(bstr, self._layer)
-        self._read_field(bstr, self._alternate_group)
-        self._read_field(bstr, self._volume,
-                         until_pos=bstr.bitpos + self._volume_length)
+class SampleSizeBoxSampleFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_size", "uintbe:32"),)
 
-        self._read_field(bstr, self._reserved2)
 
-        self._read_field(bstr, self._matrix,
-                         until_pos=bstr.bitpos + self._matrix_length)
+class SampleToChunkBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32", default=0),)
 
-        self._read_field(bstr, self._width,
-                         until_pos=bstr.bitpos + self._width_length)
-        self._read_field(bstr, self._height,
-                         until_pos=bstr.bitpos + self._height_length)
 
+class ChunkOffsetBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32", default=0),)
 
-# iref boxes
-class SingleItemTypeReferenceBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 3)
 
-        self._from_item_id = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._reference_count = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._to_item_ids = \
-            self._register_field(Field(value_type="uintbe", size=16, is_list=True))
+# dinf boxes
+class DataReferenceBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32", default=0),)
 
-    @property
-    def from_item_id(self):
-        return self._from_item_id.value
 
-    @from_item_id.setter
-    def from_item_id(self, value):
-        self._set_field(self._from_item_id, value)
+class PrimaryItemBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("item_id", "uintbe:32", short_type="uintbe:16",
+                    short_versions=(0,)),)
 
-    @property
-    def reference_count(self):
-        return self._reference_count.value
 
-    @reference_count.setter
-    def reference_count(self, value):
-        self._set_field(self._reference_count, value)
+class ItemInformationBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("entry_count", "uintbe:32", short_type="uintbe:16",
+                    short_versions=(0,)),)
 
-    @property
-    def to_item_ids(self):
-        return self._to_item_ids.value
 
-    @to_item_ids.setter
-    def to_item_ids(self, value):
-        self._set_field(self._to_item_ids, value)
+# stsd boxes
+class SampleEntryBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("reserved0", "bits:8", count=6, default=[b'\0'] * 6,
+                    public=False),
+        SchemaField("data_reference_index", "uintbe:16"))
 
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._from_item_id)
-        self._read_field(bstr, self._reference_count)
-        self._read_field(bstr, self._to_item_ids,
-                         until_pos=bstr.bitpos + self._reference_count.value * 16)
 
+class VisualSampleEntryBoxFieldsList(SampleEntryBoxFieldsList):
+    # reserved0 is in parent
+    _schema = (
+        SchemaField("pre_defined0", "bits:16", default=b'\0' * 2,
+                    public=False),
+        SchemaField("reserved1", "bits:16", default=b'\0' * 2, public=False),
+        SchemaField("pre_defined1", "bits:32", count=3,
+                    default=[b'\0' * 4] * 3, public=False),
+        SchemaField("width", "uintbe:16"),
+        SchemaField("height", "uintbe:16"),
+        # TODO: create a 16.16 fixed representation
+        SchemaField("horizresolution", "uintbe:16", count=2),
+        # TODO: create a 16.16 fixed representation
+        SchemaField("vertresolution", "uintbe:16", count=2),
+        SchemaField("reserved2", "bits:32", default=b'\0' * 4, public=False),
+        SchemaField("frame_count", "uintbe:16"),
+        SchemaField("compressorname", "bytes:32"),
+        SchemaField("depth", "uintbe:16"),
+        SchemaField("pre_defined2", "bits:16",
+                    default=(-1).to_bytes(2, 'big', signed=True),
+                    public=False))
 
-class SingleItemTypeReferenceBoxLargeFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 3)
 
-        self._from_item_id = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._reference_count = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._to_item_ids = \
-            self._register_field(Field(value_type="uintbe", size=32, is_list=True))
+class PlainTextSampleEntry(SampleEntryBoxFieldsList):
+    pass
 
-    @property
-    def from_item_id(self):
-        return self._from_item_id.value
 
-    @from_item_id.setter
-    def from_item_id(self, value):
-        self._set_field(self._from_item_id, value)
+class SimpleTextSampleEntryBoxFieldsList(PlainTextSampleEntry):
+    _schema = (
+        SchemaField("content_encoding", "string"),
+        SchemaField("mime_format", "string"))
 
-    @property
-    def reference_count(self):
-        return self._reference_count.value
 
-    @reference_count.setter
-    def reference_count(self, value):
-        self._set_field(self._reference_count, value)
+class MetaDataSampleEntryBoxFieldsList(SampleEntryBoxFieldsList):
+    pass
 
-    @property
-    def to_item_ids(self):
-        return self._to_item_ids.value
 
-    @to_item_ids.setter
-    def to_item_ids(self, value):
-        self._set_field(self._to_item_ids, value)
+class TextMetaDataSampleEntryBoxFieldsList(MetaDataSampleEntryBoxFieldsList):
+    _schema = (
+        SchemaField("content_encoding", "string"),
+        SchemaField("mime_format", "string"))
 
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._from_item_id)
-        self._read_field(bstr, self._reference_count)
-        self._read_field(bstr, self._to_item_ids,
-                         until_pos=bstr.bitpos + self._reference_count.value * 32)
 
+class SubtitleSampleEntryBoxFieldsList(SampleEntryBoxFieldsList):
+    pass
 
-# iprp boxes
-class ItemPropertyAssociationBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
 
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
+class TextSubtitleSampleEntryBoxFieldsList(SubtitleSampleEntryBoxFieldsList):
+    _schema = (
+        SchemaField("content_encoding", "string"),
+        SchemaField("mime_format", "string"))
 
-    @property
-    def entry_count(self):
-        return self._entry_count.value
 
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
+# dref boxes
+class DataEntryUrlBoxFieldsList(AbstractFieldsList):
+    # It seams that location can be empty (0 bytes) based on the result in
+    # the test file photo.heic
+    _schema = (
+        SchemaField("location", "string", optional=True),)
 
-    def parse_fields(self, bstr, header):
-        self._read_field(bstr, self._entry_count)
 
+class DataEntryUrnBoxFieldsList(AbstractFieldsList):
+    # If this acts like the URL_ box, it seams that location can be empty
+    # (0 bytes) based on the result in the test file photo.heic
+    _schema = (
+        SchemaField("name", "string"),
+        SchemaField("location", "string", optional=True))
 
-class ItemPropertyAssociationBoxEntryFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
 
-        self._item_id = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._association_count = \
-            self._register_field(Field(value_type="uintbe", size=8))
+# iinf boxes
+class ItemInfoEntryBoxFieldsList(AbstractFieldsList):
+    # The fields following item_name depend on the item_type value, they
+    # are parsed by hand
+    _schema = (
+        SchemaField("item_id", "uintbe:32"),
+        SchemaField("item_protection_index", "uintbe:16"),
+        SchemaField("item_type", "uintbe:32"),
+        SchemaField("item_name", "string"),
+        SchemaField("item_uri_type", "string"),
+        SchemaField("content_type", "string"),
+        SchemaField("content_encoding", "string"),
+        SchemaField("extension_type", "uintbe:32"))
 
-    @property
-    def item_id(self):
-        return self._item_id.value
+    def parse_fields(self, bstr, header):
+        if header.version == 2:
+            self._set_type("item_id", "uintbe:16")
+        item_id_type = self._types[0]
 
-    @item_id.setter
-    def item_id(self, value):
-        self._set_field(self._item_id, value)
+        end = header.start_pos + header.box_size
 
-    @property
-    def association_count(self):
-        return self._association_count.value
+        if header.version == 0 or header.version == 1:
+            self._item_id = bstr.read(item_id_type)
+            self._item_protection_index = bstr.read("uintbe:16")
+            self._item_name = _read_string(bstr)
 
-    @association_count.setter
-    def association_count(self, value):
-        self._set_field(self._association_count, value)
+            self._content_type = _read_string(bstr)
+            if bstr.bytepos < end:
+                self._content_encoding = _read_string(bstr)
 
-    def parse_fields(self, bstr, header):
-        if header.version < 1:
-            self._item_id.type = "uintbe:16"
+        if header.version == 1:
+            if bstr.bytepos < end:
+                self._extension_type = bstr.read("uintbe:32")
 
-        self._read_field(bstr, self._item_id)
-        self._read_field(bstr, self._association_count)
+        elif header.version == 2 or header.version == 3:
+            self._item_id = bstr.read(item_id_type)
+            self._item_protection_index = bstr.read("uintbe:16")
+            self._item_type = bstr.read("uintbe:32")
 
+            self._item_name = _read_string(bstr)
+            if self._item_type == 1835625829:     # b"mime"
+                self._content_type = _read_string(bstr)
+                if bstr.bytepos < end:
+                    self._content_encoding = _read_string(bstr)
+            elif self._item_type == 1970432288:   # b"uri "
+                self._item_uri_type = _read_string(bstr)
+            elif self._item_type == 1752589105:   # b"hvc1"
+                # TODO: find documentation regarding type hvc1
+                pass
+            elif self._item_type == 1735551332:   # b"grid"
+                # TODO: find documentation regarding type grid
+                pass
+            elif self._item_type == 1165519206:   # b"Exif"
+                # TODO: find documentation regarding type Exif
+                pass
 
-class ItemPropertyAssociationBoxEntryAssociationsFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 3)
 
-        self._essential = \
-            self._register_field(Field(value_type="bits", size=1))
-        self._property_index_8b = \
-            self._register_field(Field(value_type="uint", size=8))
-        self._property_index_7b = \
-            self._register_field(Field(value_type="uint", size=7))
-        self._property_index_cache = None
+# avc1, hev1, hvc1 boxes
+class PixelAspectRatioBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("h_spacing", "uintbe:32"),
+        SchemaField("v_spacing", "uintbe:32"))
 
-    @property
-    def essential(self):
-        return self._essential.value.bool
 
-    @essential.setter
-    def essential(self, value):
-        self._set_field(self._essential, value)
-
-    @property
-    def property_index(self):
-        return self._property_index_cache
-
-    @property_index.setter
-    def property_index(self, value):
-        value, value_type = value
-        # TODO: validate that this writing is correct
-        self._set_field(self._property_index_8b, value & 255)
-        self._set_field(self._property_index_7b, (value & 127 << 8) >> 8)
-        self._property_index_cache = value
-
-    def parse_fields(self, bstr, header):
-        self._read_field(bstr, self._essential)
-        if int.from_bytes(header.flags, "big") & 1:
-            # TODO: validate that this parsing is correct
-            self._read_field(bstr, self._property_index_8b)
-            self._read_field(bstr, self._property_index_7b)
-            self._property_index_cache = self._property_index_8b.value + \
-                self._property_index_7b.value << 8
-        else:
-            self._read_field(bstr, self._property_index_7b)
-            self._property_index_cache = self._property_index_7b.value
-
-
-# mdia boxes
-class MediaHeaderBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 7)
-
-        self._creation_time = \
-            self._register_field(Field(value_type="uintbe", size=64))
-        self._modification_time = \
-            self._register_field(Field(value_type="uintbe", size=64))
-        self._timescale = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._duration = \
-            self._register_field(Field(value_type="uintbe", size=64))
-
-        self._pad0 = \
-            self._register_field(Field(value_type="bits", size=1))
-
-        # TODO: check if uintbe can be used here
-        self._language = \
-            self._register_field(Field(value_type="uint", size=5, is_list=True))
-        self._language_length = 5 * 3
-        self._pre_defined = \
-            self._register_field(Field(value_type="uintbe", size=16))
-
-        # initialize with empty value
-        self._set_field(self._pad0, 0x1)
-
-    @property
-    def creation_time(self):
-        return self._creation_time.value
-
-    @creation_time.setter
-    def creation_time(self, value):
-        self._set_field(self._creation_time, value)
-
-    @property
-    def modification_time(self):
-        return self._modification_time.value
-
-    @modification_time.setter
-    def modification_time(self, value):
-        self._set_field(self._modification_time, value)
-
-    @property
-    def timescale(self):
-        return self._timescale.value
-
-    @timescale.setter
-    def timescale(self, value):
-        self._set_field(self._timescale, value)
-
-    @property
-    def duration(self):
-        return self._duration.value
-
-    @duration.setter
-    def duration(self, value):
-        self._set_field(self._duration, value)
-
-    @property
-    def language(self):
-        return self._language.value
-
-    @language.setter
-    def language(self, value):
-        self._set_field(self._language, value)
-
-    @property
-    def pre_defined(self):
-        return self._pre_defined.value
-
-    @pre_defined.setter
-    def pre_defined(self, value):
-        self._set_field(self._pre_defined, value)
-
-    def parse_fields(self, bstr, header):
-        if header.version != 1:
-            self._creation_time.type = "uintbe:32"
-            self._modification_time.type = "uintbe:32"
-            self._timescale.type = "uintbe:32"
-            self._duration.type = "uintbe:32"
-
-        self._read_field(bstr, self._creation_time)
-        self._read_field(bstr, self._modification_time)
-        self._read_field(bstr, self._timescale)
-        self._read_field(bstr, self._duration)
-
-        self._read_field(bstr, self._pad0)
-
-        self._read_field(bstr, self._language,
-                         until_pos=bstr.bitpos + self._language_length)
-        self._read_field(bstr, self._pre_defined)
-
-
-class HandlerReferenceBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 4)
-
-        self._pre_defined = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._handler_type = \
-            self._register_field(Field(value_type="bytes", size=4))
-
-        self._reserved0 = \
-            self._register_field(Field(value_type="bits", size=32, is_list=True))
-        self._reserved0_length = 32 * 3
-
-        self._name = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-
-        # initialize with empty value
-        self._set_field(self._reserved0, [b'\0' * 4] * 3)
-
-    @property
-    def pre_defined(self):
-        return self._pre_defined.value
-
-    @pre_defined.setter
-    def pre_defined(self, value):
-        self._set_field(self._pre_defined, value)
-
-    @property
-    def handler_type(self):
-        return self._handler_type.value
-
-    @handler_type.setter
-    def handler_type(self, value):
-        self._set_field(self._handler_type, value)
-
-    @property
-    def name(self):
-        return self._name.value
-
-    @name.setter
-    def name(self, value):
-        self._set_field(self._name, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-
-        self._read_field(bstr, self._pre_defined)
-        self._read_field(bstr, self._handler_type)
-
-        self._read_field(bstr, self._reserved0,
-                         until_pos=bstr.bitpos + self._reserved0_length)
-
-        self._read_field(bstr, self._name)
-
-
-# edts boxes
-class EditListBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._entry_count, 0)
-
-    @property
-    def entry_count(self):
-        return self._entry_count.value
-
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._entry_count)
-
-
-class EditListBoxEntryFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 4)
-
-        self._segment_duration = \
-            self._register_field(Field(value_type="uintbe", size=64))
-        self._media_time = \
-            self._register_field(Field(value_type="uintbe", size=64))
-        self._media_rate_integer = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._media_rate_fraction = \
-            self._register_field(Field(value_type="uintbe", size=16))
-
-    @property
-    def segment_duration(self):
-        return self._segment_duration.value
-
-    @segment_duration.setter
-    def segment_duration(self, value):
-        self._set_field(self._segment_duration, value)
-
-    @property
-    def media_time(self):
-        return self._media_time.value
-
-    @media_time.setter
-    def media_time(self, value):
-        self._set_field(self._media_time, value)
-
-    @property
-    def media_rate_integer(self):
-        return self._media_rate_integer.value
-
-    @media_rate_integer.setter
-    def media_rate_integer(self, value):
-        self._set_field(self._media_rate_integer, value)
-
-    @property
-    def media_rate_fraction(self):
-        return self._media_rate_fraction.value
-
-    @media_rate_fraction.setter
-    def media_rate_fraction(self, value):
-        self._set_field(self._media_rate_fraction, value)
-
-    def parse_fields(self, bstr, header):
-        if header.version == 0:
-            self._segment_duration.type = "uintbe:32"
-            self._media_time.type = "uintbe:32"
-
-        self._read_field(bstr, self._segment_duration)
-        self._read_field(bstr, self._media_time)
-        self._read_field(bstr, self._media_rate_integer)
-        self._read_field(bstr, self._media_rate_fraction)
-
-
-# minf boxes
-class VideoMediaHeaderBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._graphicsmode = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._opcolor = \
-            self._register_field(Field(value_type="uintbe", size=16, is_list=True))
-        self._opcolor_length = 16 * 3
-
-    @property
-    def graphicsmode(self):
-        return self._graphicsmode.value
-
-    @graphicsmode.setter
-    def graphicsmode(self, value):
-        self._set_field(self._graphicsmode, value)
-
-    @property
-    def opcolor(self):
-        return self._opcolor.value
-
-    @opcolor.setter
-    def opcolor(self, value):
-        self._set_field(self._opcolor, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._graphicsmode)
-        self._read_field(bstr, self._opcolor,
-                         until_pos=bstr.bitpos + self._opcolor_length)
-
-
-# stbl boxes
-class SampleDescriptionBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._entry_count, 0)
-
-    @property
-    def entry_count(self):
-        return self._entry_count.value
-
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._entry_count)
-
-
-class TimeToSampleBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._entry_count, 0)
-
-    @property
-    def entry_count(self):
-        return self._entry_count.value
-
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._entry_count)
-
-
-class TimeToSampleBoxEntryFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._sample_count = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._sample_delta = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def sample_count(self):
-        return self._sample_count.value
-
-    @sample_count.setter
-    def sample_count(self, value):
-        self._set_field(self._sample_count, value)
-
-    @property
-    def sample_delta(self):
-        return self._sample_delta.value
-
-    @sample_delta.setter
-    def sample_delta(self, value):
-        self._set_field(self._sample_delta, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._sample_count)
-        self._read_field(bstr, self._sample_delta)
-
-
-class CompositionOffsetBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._entry_count, 0)
-
-    @property
-    def entry_count(self):
-        return self._entry_count.value
-
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._entry_count)
-
-
-class CompositionOffsetBoxEntryFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._sample_count = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._sample_offset = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def sample_count(self):
-        return self._sample_count.value
-
-    @sample_count.setter
-    def sample_count(self, value):
-        self._set_field(self._sample_count, value)
-
-    @property
-    def sample_offset(self):
-        return self._sample_offset.value
-
-    @sample_offset.setter
-    def sample_offset(self, value):
-        self._set_field(self._sample_offset, value)
-
-    def parse_fields(self, bstr, header):
-        if header.version == 1:
-            self._sample_offset.type = "intbe:32"
-
-        self._read_field(bstr, self._sample_count)
-        self._read_field(bstr, self._sample_offset)
-
-
-class SampleSizeBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._sample_size = self._register_field(Field(value_type="uintbe", size=32))
-        self._sample_count = self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._sample_count, 0)
-
-    @property
-    def sample_size(self):
-        return self._sample_size.value
-
-    @sample_size.setter
-    def sample_size(self, value):
-        self._set_field(self._sample_size, value)
-
-    @property
-    def sample_count(self):
-        return self._sample_count.value
-
-    @sample_count.setter
-    def sample_count(self, value):
-        self._set_field(self._sample_count, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._sample_size)
-        self._read_field(bstr, self._sample_count)
-
-
-class SampleSizeBoxSampleFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_size = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def entry_size(self):
-        return self._entry_size.value
-
-    @entry_size.setter
-    def entry_size(self, value):
-        self._set_field(self._entry_size, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._entry_size)
-
-
-class SampleToChunkBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._entry_count, 0)
-
-    @property
-    def entry_count(self):
-        return self._entry_count.value
-
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._entry_count)
-
-
-class SampleToChunkBoxEntryFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 3)
-
-        self._first_chunk = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._samples_per_chunk = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._sample_description_index = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def first_chunk(self):
-        return self._first_chunk.value
-
-    @first_chunk.setter
-    def first_chunk(self, value):
-        self._set_field(self._first_chunk, value)
-
-    @property
-    def samples_per_chunk(self):
-        return self._samples_per_chunk.value
-
-    @samples_per_chunk.setter
-    def samples_per_chunk(self, value):
-        self._set_field(self._samples_per_chunk, value)
-
-    @property
-    def sample_description_index(self):
-        return self._sample_description_index.value
-
-    @sample_description_index.setter
-    def sample_description_index(self, value):
-        self._set_field(self._sample_description_index, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._first_chunk)
-        self._read_field(bstr, self._samples_per_chunk)
-        self._read_field(bstr, self._sample_description_index)
-
-
-class ChunkOffsetBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._entry_count, 0)
-
-    @property
-    def entry_count(self):
-        return self._entry_count.value
-
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._entry_count)
-
-
-class ChunkOffsetBoxEntryFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._chunk_offset = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def chunk_offset(self):
-        return self._chunk_offset.value
-
-    @chunk_offset.setter
-    def chunk_offset(self, value):
-        self._set_field(self._chunk_offset, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._chunk_offset)
-
-
-class ChunkOffset64BoxEntryFieldsList(ChunkOffsetBoxEntryFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length)
-        self._chunk_offset.type = "uintbe:64"
-
-
-# dinf boxes
-class DataReferenceBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
-
-        # initialize with empty value
-        self._set_field(self._entry_count, 0)
-
-    @property
-    def entry_count(self):
-        return self._entry_count.value
-
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._entry_count)
-
-
-class PrimaryItemBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._item_id = self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def item_id(self):
-        return self._item_id.value
-
-    @item_id.setter
-    def item_id(self, value):
-        self._set_field(self._item_id, value)
-
-    def parse_fields(self, bstr, header):
-        if header.version == 0:
-            self._item_id.type = "uintbe:16"
-
-        self._read_field(bstr, self._item_id)
-
-
-class ItemInformationBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._entry_count = self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def entry_count(self):
-        return self._entry_count.value
-
-    @entry_count.setter
-    def entry_count(self, value):
-        self._set_field(self._entry_count, value)
-
-    def parse_fields(self, bstr, header):
-        if header.version == 0:
-            self._entry_count.type = "uintbe:16"
-
-        self._read_field(bstr, self._entry_count)
-
-
-# stsd boxes
-class SampleEntryBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._reserved0 = \
-            self._register_field(Field(value_type="bits", size=8, is_list=True))
-        self._reserved0_length = 8 * 6
-        self._data_reference_index = \
-            self._register_field(Field(value_type="uintbe", size=16))
-
-        # initialize with empty value
-        self._set_field(self._reserved0, [b'\0'] * 6)
-
-    @property
-    def data_reference_index(self):
-        return self._data_reference_index.value
-
-    @data_reference_index.setter
-    def data_reference_index(self, value):
-        self._set_field(self._data_reference_index, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._reserved0,
-                         until_pos=bstr.bitpos + self._reserved0_length)
-        self._read_field(bstr, self._data_reference_index)
-
-
-class VisualSampleEntryBoxFieldsList(SampleEntryBoxFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 12)
-
-        self._pre_defined0 = \
-            self._register_field(Field(value_type="bits", size=16))
-        # _reserved0 is in parent
-        self._reserved1 = \
-            self._register_field(Field(value_type="bits", size=16))
-        self._pre_defined1 = \
-            self._register_field(Field(value_type="bits", size=32, is_list=True))
-        self._pre_defined1_length = 32 * 3
-
-        self._width = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._height = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        # TODO: create a 16.16 fixed representation
-        self._horizresolution = \
-            self._register_field(Field(value_type="uintbe", size=16, is_list=True))
-        self._horizresolution_length = 16 * 2
-        # TODO: create a 16.16 fixed representation
-        self._vertresolution = \
-            self._register_field(Field(value_type="uintbe", size=16, is_list=True))
-        self._vertresolution_length = 16 * 2
-
-        self._reserved2 = \
-            self._register_field(Field(value_type="bits", size=32))
-
-        self._frame_count = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._compressorname = \
-            self._register_field(Field(value_type="bytes", size=32))
-        self._depth = \
-            self._register_field(Field(value_type="uintbe", size=16))
-
-        self._pre_defined2 = \
-            self._register_field(Field(value_type="bits", size=16))
-
-        # initialize with empty value
-        self._set_field(self._pre_defined0, b'\0' * 2)
-        self._set_field(self._reserved1, b'\0' * 2)
-        self._set_field(self._pre_defined1, [b'\0' * 4] * 3)
-        self._set_field(self._reserved2, b'\0' * 4)
-        self._set_field(self._pre_defined2, (-1).to_bytes(2, 'big', signed=True))
-
-    @property
-    def width(self):
-        return self._width.value
-
-    @width.setter
-    def width(self, value):
-        self._set_field(self._width, value)
-
-    @property
-    def height(self):
-        return self._height.value
-
-    @height.setter
-    def height(self, value):
-        self._set_field(self._height, value)
-
-    @property
-    def horizresolution(self):
-        return self._horizresolution.value
-
-    @horizresolution.setter
-    def horizresolution(self, value):
-        self._set_field(self._horizresolution, value)
-
-    @property
-    def vertresolution(self):
-        return self._vertresolution.value
-
-    @vertresolution.setter
-    def vertresolution(self, value):
-        self._set_field(self._vertresolution, value)
-
-    @property
-    def frame_count(self):
-        return self._frame_count.value
-
-    @frame_count.setter
-    def frame_count(self, value):
-        self._set_field(self._frame_count, value)
-
-    @property
-    def compressorname(self):
-        return self._compressorname.value
-
-    @compressorname.setter
-    def compressorname(self, value):
-        self._set_field(self._compressorname, value)
-
-    @property
-    def depth(self):
-        return self._depth.value
-
-    @depth.setter
-    def depth(self, value):
-        self._set_field(self._depth, value)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        del header
-
-        self._read_field(bstr, self._pre_defined0)
-        self._read_field(bstr, self._reserved1)
-        self._read_field(bstr, self._pre_defined1,
-                         until_pos=bstr.bitpos + self._pre_defined1_length)
-
-        self._read_field(bstr, self._width)
-        self._read_field(bstr, self._height)
-        self._read_field(bstr, self._horizresolution,
-                         until_pos=bstr.bitpos + self._horizresolution_length)
-        self._read_field(bstr, self._vertresolution,
-                         until_pos=bstr.bitpos + self._vertresolution_length)
-
-        self._read_field(bstr, self._reserved2)
-
-        self._read_field(bstr, self._frame_count)
-        self._read_field(bstr, self._compressorname)
-        self._read_field(bstr, self._depth)
-
-        self._read_field(bstr, self._pre_defined2)
-
-
-class PlainTextSampleEntry(SampleEntryBoxFieldsList):
-    pass
-
-
-class SimpleTextSampleEntryBoxFieldsList(PlainTextSampleEntry):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._content_encoding = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-        self._mime_format = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-
-    @property
-    def content_encoding(self):
-        return self._content_encoding.value
-
-    @content_encoding.setter
-    def content_encoding(self, value):
-        self._set_field(self._content_encoding, value)
-
-    @property
-    def mime_format(self):
-        return self._mime_format.value
-
-    @mime_format.setter
-    def mime_format(self, value):
-        self._set_field(self._mime_format, value)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        del header
-
-        self._read_field(bstr, self._content_encoding)
-        self._read_field(bstr, self._mime_format)
-
-
-class MetaDataSampleEntryBoxFieldsList(SampleEntryBoxFieldsList):
-    pass
-
-
-class TextMetaDataSampleEntryBoxFieldsList(MetaDataSampleEntryBoxFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._content_encoding = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-        self._mime_format = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-
-    @property
-    def content_encoding(self):
-        return self._content_encoding.value
-
-    @content_encoding.setter
-    def content_encoding(self, value):
-        self._set_field(self._content_encoding, value)
-
-    @property
-    def mime_format(self):
-        return self._mime_format.value
-
-    @mime_format.setter
-    def mime_format(self, value):
-        self._set_field(self._mime_format, value)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        del header
-
-        self._read_field(bstr, self._content_encoding)
-        self._read_field(bstr, self._mime_format)
-
-
-class SubtitleSampleEntryBoxFieldsList(SampleEntryBoxFieldsList):
-    pass
-
-
-class TextSubtitleSampleEntryBoxFieldsList(SubtitleSampleEntryBoxFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._content_encoding = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-        self._mime_format = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-
-    @property
-    def content_encoding(self):
-        return self._content_encoding.value
-
-    @content_encoding.setter
-    def content_encoding(self, value):
-        self._set_field(self._content_encoding, value)
-
-    @property
-    def mime_format(self):
-        return self._mime_format.value
-
-    @mime_format.setter
-    def mime_format(self, value):
-        self._set_field(self._mime_format, value)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        del header
-
-        self._read_field(bstr, self._content_encoding)
-        self._read_field(bstr, self._mime_format)
-
-
-# dref boxes
-class DataEntryUrlBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 1)
-
-        self._location = self._register_field(Field(value_type="bytes", is_string=True))
-
-    @property
-    def location(self):
-        return self._location.value
-
-    @location.setter
-    def location(self, value):
-        self._set_field(self._location, value)
-
-    def parse_fields(self, bstr, header):
-        # It seams that location can be empty (0 bytes) based on the result in
-        # the test file photo.heic
-        if bstr.bytepos < header.start_pos + header.box_size:
-            self._read_field(bstr, self._location)
-
-
-class DataEntryUrnBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._name = self._register_field(Field(value_type="bytes", is_string=True))
-        self._location = self._register_field(Field(value_type="bytes", is_string=True))
-
-    @property
-    def location(self):
-        return self._location.value
-
-    @location.setter
-    def location(self, value):
-        self._set_field(self._location, value)
-
-    @property
-    def name(self):
-        return self._name.value
-
-    @name.setter
-    def name(self, value):
-        self._set_field(self._name, value)
-
-    def parse_fields(self, bstr, header):
-        end = header.start_pos + header.box_size
-        self._read_field(bstr, self._name)
-        # If this acts like the URL_ box, it seams that location can be empty
-        # (0 bytes) based on the result in the test file photo.heic
-        if bstr.bytepos < end:
-            self._read_field(bstr, self._location)
-
-
-# iinf boxes
-class ItemInfoEntryBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 8)
-
-        self._item_id = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._item_protection_index = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._item_type = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._item_name = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-        self._item_uri_type = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-        self._content_type = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-        self._content_encoding = \
-            self._register_field(Field(value_type="bytes", is_string=True))
-
-        self._extension_type = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def item_id(self):
-        return self._item_id.value
-
-    @item_id.setter
-    def item_id(self, value):
-        self._set_field(self._item_id, value)
-
-    @property
-    def item_protection_index(self):
-        return self._item_protection_index.value
-
-    @item_protection_index.setter
-    def item_protection_index(self, value):
-        self._set_field(self._item_protection_index, value)
-
-    @property
-    def item_type(self):
-        return self._item_type.value
-
-    @item_type.setter
-    def item_type(self, value):
-        self._set_field(self._item_type, value)
-
-    @property
-    def item_name(self):
-        return self._item_name.value
-
-    @item_name.setter
-    def item_name(self, value):
-        self._set_field(self._item_name, value)
-
-    @property
-    def item_uri_type(self):
-        return self._item_uri_type.value
-
-    @item_uri_type.setter
-    def item_uri_type(self, value):
-        self._set_field(self._item_uri_type, value)
-
-    @property
-    def content_type(self):
-        return self._content_type.value
-
-    @content_type.setter
-    def content_type(self, value):
-        self._set_field(self._content_type, value)
-
-    @property
-    def content_encoding(self):
-        return self._content_encoding.value
-
-    @content_encoding.setter
-    def content_encoding(self, value):
-        self._set_field(self._content_encoding, value)
-
-    @property
-    def extension_type(self):
-        return self._extension_type.value
-
-    @extension_type.setter
-    def extension_type(self, value):
-        self._set_field(self._extension_type, value)
-
-    def parse_fields(self, bstr, header):
-        if header.version == 2:
-            self._item_id.type = "uintbe:16"
-
-        end = header.start_pos + header.box_size
-
-        if header.version == 0 or header.version == 1:
-            self._read_field(bstr, self._item_id)
-            self._read_field(bstr, self._item_protection_index)
-            self._read_field(bstr, self._item_name)
-
-            self._read_field(bstr, self._content_type)
-            if bstr.bytepos < end:
-                self._read_field(bstr, self._content_encoding)
-
-        if header.version == 1:
-            if bstr.bytepos < end:
-                self._read_field(bstr, self._extension_type)
-
-        elif header.version == 2 or header.version == 3:
-            self._read_field(bstr, self._item_id)
-            self._read_field(bstr, self._item_protection_index)
-            self._read_field(bstr, self._item_type)
-
-            self._read_field(bstr, self._item_name)
-            if self._item_type.value == 1835625829:     # b"mime"
-                self._read_field(bstr, self._content_type)
-                if bstr.bytepos < end:
-                    self._read_field(bstr, self._content_encoding)
-            elif self._item_type.value == 1970432288:   # b"uri "
-                self._read_field(bstr, self._item_uri_type)
-            elif self._item_type.value == 1752589105:   # b"hvc1"
-                # TODO: find documentation regarding type hvc1
-                pass
-            elif self._item_type.value == 1735551332:   # b"grid"
-                # TODO: find documentation regarding type grid
-                pass
-            elif self._item_type.value == 1165519206:   # b"Exif"
-                # TODO: find documentation regarding type Exif
-                pass
-
-
-# avc1, hev1, hvc1 boxes
-class PixelAspectRatioBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 8)
-
-        self._h_spacing = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._v_spacing = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def h_spacing(self):
-        return self._h_spacing.value
-
-    @h_spacing.setter
-    def h_spacing(self, value):
-        self._set_field(self._h_spacing, value)
-
-    @property
-    def v_spacing(self):
-        return self._v_spacing.value
-
-    @v_spacing.setter
-    def v_spacing(self, value):
-        self._set_field(self._v_spacing, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._h_spacing)
-        self._read_field(bstr, self._v_spacing)
-
-
-class CleanApertureBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 8)
-
-        self._clean_aperture_width_n = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._clean_aperture_width_d = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-        self._clean_aperture_height_n = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._clean_aperture_height_d = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-        self._horiz_off_n = \
-            self._register_field(Field(value_type="intbe", size=32))
-        self._horiz_off_d = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-        self._vert_off_n = \
-            self._register_field(Field(value_type="intbe", size=32))
-        self._vert_off_d = \
-            self._register_field(Field(value_type="uintbe", size=32))
-
-    @property
-    def clean_aperture_width_n(self):
-        return self._clean_aperture_width_n.value
-
-    @clean_aperture_width_n.setter
-    def clean_aperture_width_n(self, value):
-        self._set_field(self._clean_aperture_width_n, value)
-
-    @property
-    def clean_aperture_width_d(self):
-        return self._clean_aperture_width_d.value
-
-    @clean_aperture_width_d.setter
-    def clean_aperture_width_d(self, value):
-        self._set_field(self._clean_aperture_width_d, value)
-
-    @property
-    def clean_aperture_height_n(self):
-        return self._clean_aperture_height_n.value
-
-    @clean_aperture_height_n.setter
-    def clean_aperture_height_n(self, value):
-        self._set_field(self._clean_aperture_height_n, value)
-
-    @property
-    def clean_aperture_height_d(self):
-        return self._clean_aperture_height_d.value
-
-    @clean_aperture_height_d.setter
-    def clean_aperture_height_d(self, value):
-        self._set_field(self._clean_aperture_height_d, value)
-
-    @property
-    def horiz_off_n(self):
-        return self._horiz_off_n.value
-
-    @horiz_off_n.setter
-    def horiz_off_n(self, value):
-        self._set_field(self._horiz_off_n, value)
-
-    @property
-    def horiz_off_d(self):
-        return self._horiz_off_d.value
-
-    @horiz_off_d.setter
-    def horiz_off_d(self, value):
-        self._set_field(self._horiz_off_d, value)
-
-    @property
-    def vert_off_n(self):
-        return self._vert_off_n.value
-
-    @vert_off_n.setter
-    def vert_off_n(self, value):
-        self._set_field(self._vert_off_n, value)
-
-    @property
-    def vert_off_d(self):
-        return self._vert_off_d.value
-
-    @vert_off_d.setter
-    def vert_off_d(self, value):
-        self._set_field(self._vert_off_d, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._clean_aperture_width_n)
-        self._read_field(bstr, self._clean_aperture_width_d)
-        self._read_field(bstr, self._clean_aperture_height_n)
-        self._read_field(bstr, self._clean_aperture_height_d)
-        self._read_field(bstr, self._horiz_off_n)
-        self._read_field(bstr, self._horiz_off_d)
-        self._read_field(bstr, self._vert_off_n)
-        self._read_field(bstr, self._vert_off_d)
+class CleanApertureBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("clean_aperture_width_n", "uintbe:32"),
+        SchemaField("clean_aperture_width_d", "uintbe:32"),
+        SchemaField("clean_aperture_height_n", "uintbe:32"),
+        SchemaField("clean_aperture_height_d", "uintbe:32"),
+        SchemaField("horiz_off_n", "intbe:32"),
+        SchemaField("horiz_off_d", "uintbe:32"),
+        SchemaField("vert_off_n", "intbe:32"),
+        SchemaField("vert_off_d", "uintbe:32"))
 
 
 # hev1, hvc1 boxes
 class HEVCConfigurationBoxFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 23)
-
-        self._configuration_version = \
-            self._register_field(Field(value_type="uintbe", size=8))
-
-        self._general_profile_space = \
-            self._register_field(Field(value_type="uint", size=2))
-        self._general_tier_flag = \
-            self._register_field(Field(value_type="uint", size=1))
-        self._general_profile_idc = \
-            self._register_field(Field(value_type="uint", size=5))
-        self._general_profile_compatibility_flags = \
-            self._register_field(Field(value_type="uintbe", size=32))
-        self._general_constraint_indicator_flags = \
-            self._register_field(Field(value_type="uintbe", size=48))
-        self._general_level_idc = \
-            self._register_field(Field(value_type="uintbe", size=8))
-
-        self._reserved0 = \
-            self._register_field(Field(value_type="bits", size=4))
-
-        self._min_spatial_segmentation_idc = \
-            self._register_field(Field(value_type="uint", size=12))
-
-        self._reserved1 = \
-            self._register_field(Field(value_type="bits", size=6))
-
-        self._parallelism_type = \
-            self._register_field(Field(value_type="uint", size=2))
-
-        self._reserved2 = \
-            self._register_field(Field(value_type="bits", size=6))
-
-        self._chroma_format = \
-            self._register_field(Field(value_type="uint", size=2))
-
-        self._reserved3 = \
-            self._register_field(Field(value_type="bits", size=5))
-
-        self._bit_depth_luma_minus_8 = \
-            self._register_field(Field(value_type="uint", size=3))
-
-        self._reserved4 = \
-            self._register_field(Field(value_type="bits", size=5))
-
-        self._bit_depth_chroma_minus_8 = \
-            self._register_field(Field(value_type="uint", size=3))
-
-        self._avg_frame_rate = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._constant_frame_rate = \
-            self._register_field(Field(value_type="uint", size=2))
-        self._num_temporal_layers = \
-            self._register_field(Field(value_type="uint", size=3))
-        self._temporal_id_nested = \
-            self._register_field(Field(value_type="uint", size=1))
-        self._length_size_minus_one = \
-            self._register_field(Field(value_type="uint", size=2))
-
-        self._num_of_arrays = \
-            self._register_field(Field(value_type="uint", size=8))
-
-        # initialize with empty value
-        self._set_field(self._reserved0, '0b1111')
-        self._set_field(self._reserved1, '0b111111')
-        self._set_field(self._reserved2, '0b111111')
-        self._set_field(self._reserved3, '0b11111')
-        self._set_field(self._reserved4, '0b11111')
-        self._set_field(self._num_of_arrays, 0)
-
-    @property
-    def configuration_version(self):
-        return self._configuration_version.value
-
-    @configuration_version.setter
-    def configuration_version(self, value):
-        self._set_field(self._configuration_version, value)
-
-    @property
-    def general_profile_space(self):
-        return self._general_profile_space.value
-
-    @general_profile_space.setter
-    def general_profile_space(self, value):
-        self._set_field(self._general_profile_space, value)
-
-    @property
-    def general_tier_flag(self):
-        return self._general_tier_flag.value
-
-    @general_tier_flag.setter
-    def general_tier_flag(self, value):
-        self._set_field(self._general_tier_flag, value)
-
-    @property
-    def general_profile_idc(self):
-        return self._general_profile_idc.value
-
-    @general_profile_idc.setter
-    def general_profile_idc(self, value):
-        self._set_field(self._general_profile_idc, value)
-
-    @property
-    def general_profile_compatibility_flags(self):
-        return self._general_profile_compatibility_flags.value
-
-    @general_profile_compatibility_flags.setter
-    def general_profile_compatibility_flags(self, value):
-        self._set_field(self._general_profile_compatibility_flags, value)
-
-    @property
-    def general_constraint_indicator_flags(self):
-        return self._general_constraint_indicator_flags.value
-
-    @general_constraint_indicator_flags.setter
-    def general_constraint_indicator_flags(self, value):
-        self._set_field(self._general_constraint_indicator_flags, value)
-
-    @property
-    def general_level_idc(self):
-        return self._general_level_idc.value
-
-    @general_level_idc.setter
-    def general_level_idc(self, value):
-        self._set_field(self._general_level_idc, value)
-
-    @property
-    def min_spatial_segmentation_idc(self):
-        return self._min_spatial_segmentation_idc.value
-
-    @min_spatial_segmentation_idc.setter
-    def min_spatial_segmentation_idc(self, value):
-        self._set_field(self._min_spatial_segmentation_idc, value)
-
-    @property
-    def parallelism_type(self):
-        return self._parallelism_type.value
-
-    @parallelism_type.setter
-    def parallelism_type(self, value):
-        self._set_field(self._parallelism_type, value)
-
-    @property
-    def chroma_format(self):
-        return self._chroma_format.value
-
-    @chroma_format.setter
-    def chroma_format(self, value):
-        self._set_field(self._chroma_format, value)
-
-    @property
-    def bit_depth_luma_minus_8(self):
-        return self._bit_depth_luma_minus_8.value
-
-    @bit_depth_luma_minus_8.setter
-    def bit_depth_luma_minus_8(self, value):
-        self._set_field(self._bit_depth_luma_minus_8, value)
-
-    @property
-    def bit_depth_chroma_minus_8(self):
-        return self._bit_depth_chroma_minus_8.value
-
-    @bit_depth_chroma_minus_8.setter
-    def bit_depth_chroma_minus_8(self, value):
-        self._set_field(self._bit_depth_chroma_minus_8, value)
-
-    @property
-    def avg_frame_rate(self):
-        return self._avg_frame_rate.value
-
-    @avg_frame_rate.setter
-    def avg_frame_rate(self, value):
-        self._set_field(self._avg_frame_rate, value)
-
-    @property
-    def constant_frame_rate(self):
-        return self._constant_frame_rate.value
-
-    @constant_frame_rate.setter
-    def constant_frame_rate(self, value):
-        self._set_field(self._constant_frame_rate, value)
-
-    @property
-    def num_temporal_layers(self):
-        return self._num_temporal_layers.value
-
-    @num_temporal_layers.setter
-    def num_temporal_layers(self, value):
-        self._set_field(self._num_temporal_layers, value)
-
-    @property
-    def temporal_id_nested(self):
-        return self._temporal_id_nested.value
-
-    @temporal_id_nested.setter
-    def temporal_id_nested(self, value):
-        self._set_field(self._temporal_id_nested, value)
-
-    @property
-    def length_size_minus_one(self):
-        return self._length_size_minus_one.value
-
-    @length_size_minus_one.setter
-    def length_size_minus_one(self, value):
-        self._set_field(self._length_size_minus_one, value)
-
-    @property
-    def num_of_arrays(self):
-        return self._num_of_arrays.value
-
-    @num_of_arrays.setter
-    def num_of_arrays(self, value):
-        self._set_field(self._num_of_arrays, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._configuration_version)
-
-        self._read_field(bstr, self._general_profile_space)
-        self._read_field(bstr, self._general_tier_flag)
-        self._read_field(bstr, self._general_profile_idc)
-        self._read_field(bstr, self._general_profile_compatibility_flags)
-        self._read_field(bstr, self._general_constraint_indicator_flags)
-        self._read_field(bstr, self._general_level_idc)
-
-        self._read_field(bstr, self._reserved0)
-        self._read_field(bstr, self._min_spatial_segmentation_idc)
-        self._read_field(bstr, self._reserved1)
-        self._read_field(bstr, self._parallelism_type)
-        self._read_field(bstr, self._reserved2)
-        self._read_field(bstr, self._chroma_format)
-        self._read_field(bstr, self._reserved3)
-        self._read_field(bstr, self._bit_depth_luma_minus_8)
-        self._read_field(bstr, self._reserved4)
-
-        self._read_field(bstr, self._bit_depth_chroma_minus_8)
-        self._read_field(bstr, self._avg_frame_rate)
-        self._read_field(bstr, self._constant_frame_rate)
-        self._read_field(bstr, self._num_temporal_layers)
-        self._read_field(bstr, self._temporal_id_nested)
-        self._read_field(bstr, self._length_size_minus_one)
-
-        self._read_field(bstr, self._num_of_arrays)
-
-
-class HEVCConfigurationBoxArrayFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 4)
-
-        self._array_completeness = \
-            self._register_field(Field(value_type="uint", size=1))
-
-        self._reserved0 = \
-            self._register_field(Field(value_type="bits", size=1))
-
-        self._nal_unit_type = \
-            self._register_field(Field(value_type="uint", size=6))
-        self._num_nalus = \
-            self._register_field(Field(value_type="uintbe", size=16))
-
-        # initialize with empty value
-        self._set_field(self._reserved0, '0b0')
-        self._set_field(self._num_nalus, 0)
-
-    @property
-    def array_completeness(self):
-        return self._array_completeness.value
-
-    @array_completeness.setter
-    def array_completeness(self, value):
-        self._set_field(self._array_completeness, value)
-
-    @property
-    def nal_unit_type(self):
-        return self._nal_unit_type.value
-
-    @nal_unit_type.setter
-    def nal_unit_type(self, value):
-        self._set_field(self._nal_unit_type, value)
-
-    @property
-    def num_nalus(self):
-        return self._num_nalus.value
-
-    @num_nalus.setter
-    def num_nalus(self, value):
-        self._set_field(self._num_nalus, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._array_completeness)
-        self._read_field(bstr, self._reserved0)
-        self._read_field(bstr, self._nal_unit_type)
-        self._read_field(bstr, self._num_nalus)
-
-
-class HEVCConfigurationBoxNaluFieldsList(AbstractFieldsList):
-    def __init__(self, length=0):
-        super().__init__(length + 2)
-
-        self._nal_unit_length = \
-            self._register_field(Field(value_type="uintbe", size=16))
-        self._nal_unit = \
-            self._register_field(Field(value_type="bytes", size=1))
-
-    @property
-    def nal_unit_length(self):
-        return self._nal_unit_length.value
-
-    @nal_unit_length.setter
-    def nal_unit_length(self, value):
-        self._set_field(self._nal_unit_length, value)
-
-    @property
-    def nal_unit(self):
-        return self._nal_unit.value
-
-    @nal_unit.setter
-    def nal_unit(self, value):
-        self._set_field(self._nal_unit, value)
-
-    def parse_fields(self, bstr, header):
-        del header
-        self._read_field(bstr, self._nal_unit_length)
-        self._nal_unit.type = "bytes:{}".format(self._nal_unit_length.value)
-        self._read_field(bstr, self._nal_unit)
+    _schema = (
+        SchemaField("configuration_version", "uintbe:8"),
+        SchemaField("general_profile_space", "uint:2"),
+        SchemaField("general_tier_flag", "uint:1"),
+        SchemaField("general_profile_idc", "uint:5"),
+        SchemaField("general_profile_compatibility_flags", "uintbe:32"),
+        SchemaField("general_constraint_indicator_flags", "uintbe:48"),
+        SchemaField("general_level_idc", "uintbe:8"),
+        SchemaField("reserved0", "bits:4", default='0b1111', public=False),
+        SchemaField("min_spatial_segmentation_idc", "uint:12"),
+        SchemaField("reserved1", "bits:6", default='0b111111', public=False),
+        SchemaField("parallelism_type", "uint:2"),
+        SchemaField("reserved2", "bits:6", default='0b111111', public=False),
+        SchemaField("chroma_format", "uint:2"),
+        SchemaField("reserved3", "bits:5", default='0b11111', public=False),
+        SchemaField("bit_depth_luma_minus_8", "uint:3"),
+        SchemaField("reserved4", "bits:5", default='0b11111', public=False),
+        SchemaField("bit_depth_chroma_minus_8", "uint:3"),
+        SchemaField("avg_frame_rate", "uintbe:16"),
+        SchemaField("constant_frame_rate", "uint:2"),
+        SchemaField("num_temporal_layers", "uint:3"),
+        SchemaField("temporal_id_nested", "uint:1"),
+        SchemaField("length_size_minus_one", "uint:2"),
+        SchemaField("num_of_arrays", "uint:8", default=0))
+
+
+class HEVCConfigurationBoxArrayFieldsList(AbstractEntryFieldsList):
+    _schema = (
+        SchemaField("array_completeness", "uint:1"),
+        SchemaField("reserved0", "bits:1", default='0b0', public=False),
+        SchemaField("nal_unit_type", "uint:6"),
+        SchemaField("num_nalus", "uintbe:16", default=0))
+
+
+class HEVCConfigurationBoxNaluFieldsList(AbstractEntryFieldsList):
+    _schema = (
+        SchemaField("nal_unit_length", "uintbe:16"),
+        SchemaField("nal_unit", "bytes", count="nal_unit_length"))
+
+
+# mvex boxes
+class TrackExtendsBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("track_id", "uintbe:32"),
+        SchemaField("default_sample_description_index", "uintbe:32"),
+        SchemaField("default_sample_duration", "uintbe:32"),
+        SchemaField("default_sample_size", "uintbe:32"),
+        SchemaField("default_sample_flags", "uintbe:32"))
+
+
+# moof boxes
+class MovieFragmentHeaderBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("sequence_number", "uintbe:32"),)
+
+
+# traf boxes
+class TrackFragmentHeaderBoxFieldsList(AbstractFieldsList):
+    # tf_flags of the optional fields
+    BASE_DATA_OFFSET_PRESENT = 0x000001
+    SAMPLE_DESCRIPTION_INDEX_PRESENT = 0x000002
+    DEFAULT_SAMPLE_DURATION_PRESENT = 0x000008
+    DEFAULT_SAMPLE_SIZE_PRESENT = 0x000010
+    DEFAULT_SAMPLE_FLAGS_PRESENT = 0x000020
+    DURATION_IS_EMPTY = 0x010000
+    DEFAULT_BASE_IS_MOOF = 0x020000
+
+    # Optional fields are only set when their flag is
+    _schema = (
+        SchemaField("track_id", "uintbe:32"),
+        SchemaField("base_data_offset", "uintbe:64",
+                    flag=BASE_DATA_OFFSET_PRESENT),
+        SchemaField("sample_description_index", "uintbe:32",
+                    flag=SAMPLE_DESCRIPTION_INDEX_PRESENT),
+        SchemaField("default_sample_duration", "uintbe:32",
+                    flag=DEFAULT_SAMPLE_DURATION_PRESENT),
+        SchemaField("default_sample_size", "uintbe:32",
+                    flag=DEFAULT_SAMPLE_SIZE_PRESENT),
+        SchemaField("default_sample_flags", "uintbe:32",
+                    flag=DEFAULT_SAMPLE_FLAGS_PRESENT))
+
+
+class TrackFragmentBaseMediaDecodeTimeBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("base_media_decode_time", "uintbe:64",
+                    short_type="uintbe:32"),)
+
+
+
+
+class TrackRunBoxFieldsList(AbstractFieldsList):
+    # tr_flags of the optional fields and of the columns of the samples
+    DATA_OFFSET_PRESENT = 0x000001
+    FIRST_SAMPLE_FLAGS_PRESENT = 0x000004
+    SAMPLE_DURATION_PRESENT = 0x000100
+    SAMPLE_SIZE_PRESENT = 0x000200
+    SAMPLE_FLAGS_PRESENT = 0x000400
+    SAMPLE_COMPOSITION_TIME_OFFSETS_PRESENT = 0x000800
+
+    # Optional fields are only set when their flag is
+    _schema = (
+        SchemaField("sample_count", "uintbe:32", default=0),
+        SchemaField("data_offset", "intbe:32", flag=DATA_OFFSET_PRESENT),
+        SchemaField("first_sample_flags", "uintbe:32",
+                    flag=FIRST_SAMPLE_FLAGS_PRESENT))
+
+
+# mfra boxes
+class TrackFragmentRandomAccessBoxFieldsList(AbstractFieldsList):
+    # Sizes in bytes minus 1 of the numbers of the entries
+    _schema = (
+        SchemaField("track_id", "uintbe:32"),
+        SchemaField("reserved0", "uint:26", default=0, public=False),
+        SchemaField("length_size_of_traf_num", "uint:2"),
+        SchemaField("length_size_of_trun_num", "uint:2"),
+        SchemaField("length_size_of_sample_num", "uint:2"),
+        SchemaField("number_of_entry", "uintbe:32", default=0))
+
+
+class TrackFragmentRandomAccessBoxEntryFieldsList(AbstractEntryFieldsList):
+    # The numbers are sized by the length sizes of the box
+    _schema = (
+        SchemaField("time", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("moof_offset", "uintbe:64", short_type="uintbe:32"),
+        SchemaField("traf_number", "uintbe"),
+        SchemaField("trun_number", "uintbe"),
+        SchemaField("sample_number", "uintbe"))
+
+    def __init__(self, traf_num_size, trun_num_size, sample_num_size):
+        super().__init__()
+        self._types = _replace_types(
+            self._types, ((2, "uintbe:{}".format(traf_num_size * 8)),
+                          (3, "uintbe:{}".format(trun_num_size * 8)),
+                          (4, "uintbe:{}".format(sample_num_size * 8))))
+
+
+class MovieFragmentRandomAccessOffsetBoxFieldsList(AbstractFieldsList):
+    _schema = (
+        SchemaField("mfra_size", "uintbe:32"),)
@@ -3,6 +3,7 @@ from ctypes import c_uint32
 
 from pybzparse import Parser
 from pybzparse.fields_lists import BoxHeaderFieldsList, FullBoxHeaderFieldsList
+from pybzparse.sources import get_buffer
 
 
 MAX_UINT_32 = c_uint32(-1).value
@@ -54,6 +55,10 @@ class AbstractBoxHeader(metaclass=ABCMeta):
     def parse(self, bstr):
         raise NotImplemented()
 
+    @abstractmethod
+    def parse_buffer(self, buffer, offset=0):
+        raise NotImplemented()
+
     @abstractmethod
     def update_box_size(self, content_size):
         raise NotImplemented()
@@ -75,11 +80,11 @@ class BoxHeader(AbstractBoxHeader, BoxHeaderFieldsList):
     @type.setter
     def type(self, value):
         if value[:4] == b'uuid':
-            self._set_field(self._box_type, value[:4])
-            self._set_field(self._user_type, value[4:])
+            self._box_type = value[:4]
+            self._user_type = value[4:]
         else:
-            self._set_field(self._box_type, value)
-            self._drop_field(self._user_type)
+            self._box_type = value
+            self._user_type = None
         self._refresh_cache(len(bytes(self)))
 
     @property
@@ -89,11 +94,11 @@ class BoxHeader(AbstractBoxHeader, BoxHeaderFieldsList):
     @box_size.setter
     def box_size(self, value):
         if value > MAX_UINT_32:
-            self._set_field(self._box_size, 1)
-            self._set_field(self._box_ext_size, value)
+            self._box_size = 1
+            self._box_ext_size = value
         else:
-            self._set_field(self._box_size, value)
-            self._drop_field(self._box_ext_size)
+            self._box_size = value
+            self._box_ext_size = None
         self._refresh_cache(len(bytes(self)))
 
     @property
@@ -102,8 +107,8 @@ class BoxHeader(AbstractBoxHeader, BoxHeaderFieldsList):
 
     @box_ext_size.setter
     def box_ext_size(self, value):
-        self._set_field(self._box_size, 1)
-        self._set_field(self._box_ext_size, value)
+        self._box_size = 1
+        self._box_ext_size = value
         self._refresh_cache(len(bytes(self)))
 
     def parse(self, bstr):
@@ -111,22 +116,27 @@ class BoxHeader(AbstractBoxHeader, BoxHeaderFieldsList):
         self.parse_fields(bstr)
         self._refresh_cache(bstr.bytepos - self._start_pos)
 
+    def parse_buffer(self, buffer, offset=0):
+        self._start_pos = offset
+        self._refresh_cache(self.parse_fields_buffer(buffer, offset) - offset)
+
     def update_box_size(self, content_size):
         header_size = len(bytes(self))
         # Add the size of the box_size field
-        if self._box_size.value is None:
+        if self._box_size is None:
             header_size += 4
         # Add the size of the box_ext_size field
-        if self._box_ext_size.value is None and \
+        if self._box_ext_size is None and \
            header_size + content_size > MAX_UINT_32:
             header_size += 8
 
         box_size = header_size + content_size
 
-        if self._box_ext_size.value is not None or box_size > MAX_UINT_32:
-            self._set_field(self._box_ext_size, box_size)
+        if self._box_ext_size is not None or box_size > MAX_UINT_32:
+            self._box_size = 1
+            self._box_ext_size = box_size
         else:
-            self._set_field(self._box_size, box_size)
+            self._box_size = box_size
 
         self._refresh_cache(header_size)
 
@@ -134,12 +144,12 @@ class BoxHeader(AbstractBoxHeader, BoxHeaderFieldsList):
         self._refresh_cache(len(bytes(self)))
 
     def _refresh_cache(self, header_size):
-        self._type_cache = (self._box_type.value + self._user_type.value
-                            if self._user_type.value is not None
-                            else self._box_type.value)
-        self._box_size_cache = (self._box_ext_size.value
-                                if self._box_ext_size.value is not None
-                                else self._box_size.value)
+        self._type_cache = (self._box_type + self._user_type
+                            if self._user_type is not None
+                            else self._box_type)
+        self._box_size_cache = (self._box_ext_size
+                                if self._box_ext_size is not None
+                                else self._box_size)
         self._header_size_cache = header_size
         self._content_size_cache = (self._box_size_cache - header_size
                                     if self._box_size_cache is not None
@@ -147,13 +157,31 @@ class BoxHeader(AbstractBoxHeader, BoxHeaderFieldsList):
 
 
 class FullBoxHeader(BoxHeader, FullBoxHeaderFieldsList):
-    def __init__(self):
-        super().__init__()
-        FullBoxHeaderFieldsList.__init__(self)
-
     def extend_header(self, bstr, header):
-        bstr.bytepos = header.start_pos
-        self.parse(bstr)
+        """
+        Upgrade an already parsed box header by only reading the version and
+        flags which follow it, the stream is never moved backwards
+
+        :param bstr: The bitstring holding the box
+        :param header: The parsed box header
+        """
+        self._start_pos = header.start_pos
+        for name in ("_box_size", "_box_type", "_box_ext_size", "_user_type"):
+            value = getattr(header, name)
+            if value is not None:
+                setattr(self, name, value)
+
+        pos = header.start_pos + header.header_size
+        buffer = get_buffer(bstr)
+        if buffer is not None:
+            bstr.bytepos = self.parse_full_box_fields_buffer(buffer, pos)
+        else:
+            # Only peek the 4 bytes of the version and flags
+            bstr.bytepos = pos
+            bstr.bytepos += self.parse_full_box_fields_buffer(
+                bstr.peek(32).bytes)
+
+        self._refresh_cache(bstr.bytepos - self._start_pos)
 
 
 # Register header
@@ -0,0 +1,318 @@
+""" Sidecar box index (.bzidx) to reopen a file without parsing its boxes """
+
+import os
+import struct
+import sys
+from array import array
+
+from pybzparse import Parser
+from pybzparse.boxes import ContainerBox
+from pybzparse.sample_index import SampleIndex
+from pybzparse.sources import MappedBitStream
+
+INDEX_EXTENSION = ".bzidx"
+INDEX_MAGIC = b"BZIX"
+INDEX_VERSION = 1
+
+# magic, version, indexed file size, indexed file mtime, boxes count
+_INDEX_HEADER = struct.Struct("<4sHQQI")
+# parent index, start_pos, header_size, box_size, type length
+_BOX_ENTRY = struct.Struct("<iQIQB")
+# box index, attribute name length, attribute kind
+_ATTR_ENTRY = struct.Struct("<IBB")
+_UINT32 = struct.Struct("<I")
+_UINT64 = struct.Struct("<Q")
+_INT64 = struct.Struct("<q")
+
+_KIND_INT = 0
+_KIND_BYTES = 1
+_KIND_ARRAY = 2
+
+# box type: (scalar fields, columns with their typecode)
+_INDEXED_FIELDS = {
+    b"hdlr": (("handler_type", "name"), ()),
+    b"stsz": (("sample_size", "sample_count"), (("entry_size", "I"),)),
+    b"stco": ((), (("chunk_offset", "Q"),)),
+    b"co64": ((), (("chunk_offset", "Q"),)),
+    b"stsc": ((), (("first_chunk", "I"),
+                   ("samples_per_chunk", "I"),
+                   ("sample_description_index", "I"))),
+    b"stts": ((), (("sample_count", "I"),
+                   ("sample_delta", "I"))),
+    b"ctts": ((), (("sample_count", "I"),
+                   ("sample_offset", "q"))),
+}
+
+
+class StaleIndexError(ValueError):
+    pass
+
+
+class IndexedBoxHeader:
+    def __init__(self, box_type, start_pos, header_size, box_size):
+        self._type = box_type
+        self._start_pos = start_pos
+        self._header_size = header_size
+        self._box_size = box_size
+
+    def __repr__(self, *args, **kwargs):
+        return "{class_name} : {content!r} ".format(class_name=self.__class__.__name__,
+                                                    content=self.__dict__)
+
+    @property
+    def type(self):
+        return self._type
+
+    @property
+    def start_pos(self):
+        return self._start_pos
+
+    @property
+    def header_size(self):
+        return self._header_size
+
+    @property
+    def box_size(self):
+        return self._box_size
+
+    @property
+    def content_size(self):
+        return self._box_size - self._header_size
+
+
+class IndexedBox:
+    """ Read-only view of a box restored from an index. Indexed scalar fields
+    are exposed as attributes and sample tables as columns of arrays """
+
+    def __init__(self, header):
+        self._header = header
+        self._boxes = []
+        self._fields = {}
+        self._columns = {}
+        self._sample_index = None
+
+    def __repr__(self, *args, **kwargs):
+        return "{class_name} : {content!r} ".format(class_name=self.__class__.__name__,
+                                                    content=self.__dict__.keys())
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["_fields"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @property
+    def header(self):
+        return self._header
+
+    @property
+    def boxes(self):
+        return self._boxes
+
+    @property
+    def fields(self):
+        return self._fields
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def sample_index(self):
+        """ Index of the samples of an indexed trak """
+        if self._sample_index is None:
+            # TRAK.MDIA.MINF.STBL
+            stbl = self._boxes[-1].boxes[-1].boxes[-1]
+            self._sample_index = SampleIndex(stbl)
+        return self._sample_index
+
+
+def get_index_filename(filename):
+    return filename + INDEX_EXTENSION
+
+
+def write_index(filename, boxes=None, index_filename=None):
+    """
+    Write the sidecar index of an mp4 file
+
+    :param filename: Filename of the indexed mp4 file
+    :type filename: str
+    :param boxes: Parsed and loaded boxes of the file. The file is parsed if
+                  the boxes are not provided
+    :type boxes: list
+    :param index_filename: Filename of the index. Defaults to filename.bzidx
+    :type index_filename: str
+    :return: the index filename
+    """
+    if index_filename is None:
+        index_filename = get_index_filename(filename)
+
+    bstr = None
+    if boxes is None:
+        bstr = MappedBitStream(filename)
+
+    try:
+        if bstr is not None:
+            boxes = [box for box in Parser.parse(bstr)]
+            for box in boxes:
+                box.load(bstr)
+
+        entries = []
+        attributes = []
+        _flatten_boxes(boxes, -1, entries, attributes)
+    finally:
+        if bstr is not None:
+            bstr.close()
+
+    stat = os.stat(filename)
+
+    with open(index_filename, "wb") as index_file:
+        index_file.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION,
+                                            stat.st_size, stat.st_mtime_ns,
+                                            len(entries)))
+        for parent, box in entries:
+            box_type = box.header.type
+            index_file.write(_BOX_ENTRY.pack(parent, box.header.start_pos,
+                                             box.header.header_size,
+                                             box.header.box_size,
+                                             len(box_type)))
+            index_file.write(box_type)
+
+        index_file.write(_UINT32.pack(len(attributes)))
+        for box_index, name, value in attributes:
+            _write_attribute(index_file, box_index, name, value)
+
+    return index_filename
+
+
+def read_index(filename, index_filename=None):
+    """
+    Restore the boxes tree of an mp4 file from its sidecar index without
+    reading the file
+
+    :param filename: Filename of the indexed mp4 file
+    :type filename: str
+    :param index_filename: Filename of the index. Defaults to filename.bzidx
+    :type index_filename: str
+    :return: list of IndexedBox
+    :raises: StaleIndexError if the index does not match the file
+    """
+    if index_filename is None:
+        index_filename = get_index_filename(filename)
+
+    with open(index_filename, "rb") as index_file:
+        buffer = index_file.read()
+
+    magic, version, file_size, mtime_ns, boxes_count = \
+        _INDEX_HEADER.unpack_from(buffer)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        raise StaleIndexError("{} is not a version {} index"
+                              .format(index_filename, INDEX_VERSION))
+
+    stat = os.stat(filename)
+    if stat.st_size != file_size or stat.st_mtime_ns != mtime_ns:
+        raise StaleIndexError("{} does not match {}"
+                              .format(index_filename, filename))
+
+    offset = _INDEX_HEADER.size
+    boxes = []
+    roots = []
+    for _ in range(boxes_count):
+        parent, start_pos, header_size, box_size, type_length = \
+            _BOX_ENTRY.unpack_from(buffer, offset)
+        offset += _BOX_ENTRY.size
+        box_type = buffer[offset:offset + type_length]
+        offset += type_length
+
+        box = IndexedBox(IndexedBoxHeader(box_type, start_pos, header_size,
+                                          box_size))
+        if parent < 0:
+            roots.append(box)
+        else:
+            boxes[parent].boxes.append(box)
+        boxes.append(box)
+
+    attributes_count, = _UINT32.unpack_from(buffer, offset)
+    offset += _UINT32.size
+    for _ in range(attributes_count):
+        offset = _read_attribute(buffer, offset, boxes)
+
+    return roots
+
+
+def _flatten_boxes(boxes, parent, entries, attributes):
+    for box in boxes:
+        box_index = len(entries)
+        entries.append((parent, box))
+
+        fields, columns = _INDEXED_FIELDS.get(box.header.type, ((), ()))
+        for name in fields:
+            attributes.append((box_index, name, getattr(box, name)))
+        for name, typecode in columns:
+            attributes.append((box_index, name,
+                               array(typecode, box.columns[name])))
+
+        if isinstance(box, (ContainerBox, IndexedBox)):
+            _flatten_boxes(box.boxes, box_index, entries, attributes)
+
+
+def _write_attribute(index_file, box_index, name, value):
+    name = name.encode()
+    if isinstance(value, int):
+        index_file.write(_ATTR_ENTRY.pack(box_index, len(name), _KIND_INT))
+        index_file.write(name)
+        index_file.write(_INT64.pack(value))
+    elif isinstance(value, array):
+        index_file.write(_ATTR_ENTRY.pack(box_index, len(name), _KIND_ARRAY))
+        index_file.write(name)
+        # Arrays are stored little-endian
+        if sys.byteorder == "big":
+            value = array(value.typecode, value)
+            value.byteswap()
+        index_file.write(value.typecode.encode())
+        index_file.write(_UINT64.pack(len(value)))
+        index_file.write(value.tobytes())
+    else:
+        value = bytes(value)
+        index_file.write(_ATTR_ENTRY.pack(box_index, len(name), _KIND_BYTES))
+        index_file.write(name)
+        index_file.write(_UINT64.pack(len(value)))
+        index_file.write(value)
+
+
+def _read_attribute(buffer, offset, boxes):
+    box_index, name_length, kind = _ATTR_ENTRY.unpack_from(buffer, offset)
+    offset += _ATTR_ENTRY.size
+    name = buffer[offset:offset + name_length].decode()
+    offset += name_length
+
+    if kind == _KIND_INT:
+        value, = _INT64.unpack_from(buffer, offset)
+        offset += _INT64.size
+    elif kind == _KIND_ARRAY:
+        value = array(buffer[offset:offset + 1].decode())
+        offset += 1
+        length, = _UINT64.unpack_from(buffer, offset)
+        offset += _UINT64.size
+        end = offset + length * value.itemsize
+        value.frombytes(buffer[offset:end])
+        if sys.byteorder == "big":
+            value.byteswap()
+        offset = end
+    else:
+        length, = _UINT64.unpack_from(buffer, offset)
+        offset += _UINT64.size
+        value = buffer[offset:offset + length]
+        offset += length
+
+    box = boxes[box_index]
+    if kind == _KIND_ARRAY:
+        box.columns[name] = value
+    else:
+        box.fields[name] = value
+
+    return offset
+
+
+# Register index reader
+Parser.register_index_reader(read_index)
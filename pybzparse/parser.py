@@ -1,22 +1,35 @@
 """ Benzina MP4 Parser based on https://github.com/use-sparingly/pymp4parse """
 
 import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import bitstring as bs
 
+from pybzparse.sources import MappedBitStream
+from pybzparse.writers import get_writer
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.WARN)
 
+# Size to skip of a box running to the end of the stream
+_SKIP_TO_END = float("inf")
+
+ParseResult = namedtuple("ParseResult", ["path", "boxes", "error"])
+
 
 class Parser(object):
     _box_header = None
     _container_box = None
     _default_box = None
     _box_lookup = {}
+    _box_cls_lookup = {}
+    _index_reader = None
 
     @classmethod
     def register_box(cls, box_cls):
         cls._box_lookup[box_cls.type] = box_cls.parse_box
+        cls._box_cls_lookup[box_cls.type] = box_cls
 
     @classmethod
     def register_box_header(cls, box_header_cls):
@@ -30,15 +43,22 @@ class Parser(object):
     def register_default_box(cls, box_cls):
         cls._default_box = box_cls
 
+    @classmethod
+    def register_index_reader(cls, index_reader):
+        cls._index_reader = index_reader
+
     @classmethod
     def parse(cls, bstr=None, filename=None, bytes_input=None, file_input=None,
-              offset_bytes=0, headers_only=False, recursive=True):
+              offset_bytes=0, headers_only=False, recursive=True, lazy=False,
+              paths=None):
         """
         Parse an MP4 file or bytes into boxes
 
         :param bstr: The bitstring to parse
         :type bstr: bitstring.BitStream, bitstring.ConstBitStream
-        :param filename: Filename of an mp4 file
+        :param filename: Filename of an mp4 file. The file is memory-mapped
+                         and payloads are exposed as memoryview slices of
+                         the mapping
         :type filename: str
         :param bytes_input: Bytes of an mp4 file
         :type bytes_input: bytes
@@ -50,11 +70,21 @@ class Parser(object):
         :type: headers_only: boolean
         :param recursive: Recursively load sub-boxes
         :type: recursive: boolean
+        :param lazy: Only parse the sub-boxes of a container box when they are
+                     first accessed. The container keeps a handle to bstr
+        :type: lazy: boolean
+        :param paths: Only decode the boxes at those paths, such as
+                      "moov/trak/mdia/minf/stbl/stsz", and the containers on
+                      the way to them. Any other box is skipped and replaced
+                      by an unloaded default box
+        :type: paths: iterable of str or bytes
         :return: BMFF Boxes or Headers
         """
+        if paths is not None and not isinstance(paths, dict):
+            paths = _make_paths_tree(paths)
 
         if filename:
-            bstr = bs.ConstBitStream(filename=filename, offset=offset_bytes * 8)
+            bstr = MappedBitStream(filename, offset_bytes)
         elif bytes_input:
             bstr = bs.ConstBitStream(bytes=bytes_input, offset=offset_bytes * 8)
         elif file_input:
@@ -82,7 +112,71 @@ class Parser(object):
                     log.warning("Premature end of data")
                     raise
             else:
-                yield cls.parse_box(bstr, header, recursive=recursive)
+                yield cls.parse_box(bstr, header, recursive=recursive,
+                                    lazy=lazy, paths=paths)
+
+    @classmethod
+    def parse_many(cls, paths, workers=None, headers_only=False, recursive=True,
+                   load=False, ordered=True):
+        """
+        Parse many MP4 files in a pool of processes
+
+        :param paths: Filenames of mp4 files
+        :type paths: iterable of str
+        :param workers: Number of processes. Defaults to the number of CPUs
+        :type workers: int
+        :param headers_only: Ignore data and return just headers
+        :type: headers_only: boolean
+        :param recursive: Recursively load sub-boxes
+        :type: recursive: boolean
+        :param load: Load the boxes content, including the payload of data
+                     boxes which is then copied back from the workers
+        :type: load: boolean
+        :param ordered: Yield the results in the order of paths rather than
+                        as they complete
+        :type: ordered: boolean
+        :return: ParseResult(path, boxes, error) for each path. A file which
+                 failed to parse has no boxes and the raised error
+        """
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_parse_file, path, headers_only,
+                                       recursive, load)
+                       for path in paths]
+            for future in (futures if ordered else as_completed(futures)):
+                yield future.result()
+
+    @classmethod
+    def parse_index(cls, filename, index_filename=None):
+        """
+        Restore the boxes of an MP4 file from its sidecar index without
+        reading the boxes from the file
+
+        :param filename: Filename of the indexed mp4 file
+        :type filename: str
+        :param index_filename: Filename of the index. Defaults to filename.bzidx
+        :type index_filename: str
+        :return: read-only views of the BMFF Boxes
+        :raises: StaleIndexError if the index does not match the file
+        """
+        return cls._index_reader(filename, index_filename)
+
+    @classmethod
+    def write(cls, boxes, target):
+        """
+        Serialize boxes directly to a file object or a writable buffer. The
+        payloads are written as they are, without being copied in the bytes
+        of their containers
+
+        :param boxes: The boxes to write
+        :param target: A file object or a writable buffer
+        :type target: file, bytearray, memoryview, mmap.mmap
+        :return: the number of bytes written
+        """
+        writer = get_writer(target)
+        start_pos = writer.pos
+        for box in boxes:
+            box.write_to(writer)
+        return writer.pos - start_pos
 
     @classmethod
     def parse_header(cls, bstr):
@@ -95,17 +189,47 @@ class Parser(object):
         return header
 
     @classmethod
-    def parse_box(cls, bstr, header, default_box_cls=None, recursive=True):
+    def parse_header_buffer(cls, buffer, offset=0):
+        """
+        Parse a box header from a bytes-like buffer without going through
+        bitstring
+
+        :param buffer: bytes-like object holding the header
+        :type buffer: bytes, bytearray, memoryview, mmap.mmap
+        :param offset: position of the header in the buffer
+        :type offset: int
+        :return: BMFF box header
+        """
+        try:
+            header = cls._box_header()
+            header.parse_buffer(buffer, offset)
+        except bs.ReadError:
+            log.error("Premature end of data while reading box header")
+            raise
+        return header
+
+    @classmethod
+    def parse_box(cls, bstr, header, default_box_cls=None, recursive=True,
+                  lazy=False, paths=None):
         if default_box_cls is None:
             default_box_cls = cls._default_box
 
         # Get parser method for header type
-        parse_function = cls._box_lookup.get(header.type, default_box_cls.parse_box)
+        if paths is not None and header.type not in paths:
+            parse_function = cls._default_box.parse_box
+        else:
+            parse_function = cls._box_lookup.get(header.type, default_box_cls.parse_box)
+            if paths is not None:
+                paths = paths[header.type]
 
         try:
             box = parse_function(bstr, header)
             if recursive and isinstance(box, cls._container_box):
-                box.parse_boxes(bstr, recursive)
+                if lazy:
+                    box.defer_boxes(bstr, paths)
+                    bstr.bytepos = box.header.start_pos + box.header.box_size
+                else:
+                    box.parse_boxes(bstr, recursive, paths=paths)
             else:
                 bstr.bytepos = box.header.start_pos + box.header.box_size
         except ValueError:
@@ -150,3 +274,189 @@ class Parser(object):
         else:
             parser = cls.parse(filename=file_input, headers_only=True)
         return cls._is_mp4(parser)
+
+
+class IncrementalParser(object):
+    """
+    Push parser fed with chunks of an MP4 stream. Boxes are parsed and loaded
+    as soon as all of their bytes have been fed and only the bytes not yet
+    consumed are kept in memory. The sub-boxes of generic container boxes are
+    emitted as they complete, before their container. The payload of the
+    boxes of skip_types is dropped as it is fed and those boxes are emitted,
+    not loaded, as soon as their header is read.
+
+        parser = IncrementalParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+            for box in parser.boxes_ready():
+                print(box.header.type)
+        parser.close()
+    """
+
+    def __init__(self, skip_types=(b"mdat",)):
+        self._skip_types = skip_types
+        self._buffer = bytearray()
+        # Stream position of the first byte of the buffer
+        self._buffer_pos = 0
+        # Stream position of the next byte to parse
+        self._pos = 0
+        self._skip_size = 0
+        # Open container boxes with their end position
+        self._containers = []
+        self._ready = []
+
+    @property
+    def pos(self):
+        return self._pos
+
+    def feed(self, chunk):
+        """
+        Feed the next bytes of the stream and parse the boxes they complete
+
+        :param chunk: next bytes of the stream
+        :type chunk: bytes-like
+        """
+        if self._skip_size:
+            skipped = min(self._skip_size, len(chunk))
+            self._skip_size -= skipped
+            self._pos += skipped
+            self._buffer_pos += skipped
+            chunk = memoryview(chunk)[skipped:]
+        self._buffer += chunk
+        while self._parse_next():
+            pass
+        # Only keep the unconsumed tail
+        del self._buffer[:self._pos - self._buffer_pos]
+        self._buffer_pos = self._pos
+
+    def boxes_ready(self):
+        """
+        :return: the boxes completed since the previous call
+        """
+        ready = self._ready
+        self._ready = []
+        return ready
+
+    def close(self):
+        """
+        :raises: bitstring.ReadError if the stream ended inside of a box
+        """
+        if self._skip_size not in (0, _SKIP_TO_END) or self._containers or \
+           self._pos - self._buffer_pos < len(self._buffer):
+            log.error("Premature end of data")
+            raise bs.ReadError("Premature end of data at position {}"
+                               .format(self._pos))
+
+    def _parse_next(self):
+        offset = self._pos - self._buffer_pos
+
+        if self._containers:
+            container, end_pos = self._containers[-1]
+            if self._pos == end_pos:
+                self._containers.pop()
+                self._emit(container)
+                return True
+
+        header = Parser._box_header()
+        try:
+            header.parse_buffer(self._buffer, offset)
+        except bs.ReadError:
+            return False
+        box_cls = Parser._box_cls_lookup.get(header.type, Parser._default_box)
+
+        # A box size of 0 means the box runs to the end of the stream
+        if header.type in self._skip_types and header.box_size == 0:
+            skip_size = _SKIP_TO_END
+        elif header.box_size < header.header_size:
+            log.error("Invalid box size")
+            raise bs.ReadError("Invalid size {} of box {} at position {}"
+                               .format(header.box_size, header.type,
+                                       self._pos))
+        else:
+            skip_size = header.box_size - header.header_size
+
+        if header.type in self._skip_types:
+            header.start_pos = self._pos
+            box = box_cls(header)
+            self._skip_size = skip_size
+            skipped = min(self._skip_size, len(self._buffer) - offset -
+                          header.header_size)
+            self._skip_size -= skipped
+            self._pos += header.header_size + skipped
+            self._emit(box)
+            return True
+
+        if issubclass(box_cls, Parser._container_box) and \
+           box_cls.parse_boxes_impl is Parser._container_box.parse_boxes_impl:
+            # Generic containers have at most the version and flags of a full
+            # box header before their sub-boxes
+            available = min(header.box_size, len(self._buffer) - offset,
+                            header.header_size + 4)
+            bstr = bs.ConstBitStream(bytes=bytes(self._buffer[offset:offset + available]))
+            try:
+                box = box_cls.parse_box(bstr, Parser.parse_header(bstr))
+            except bs.ReadError:
+                return False
+            _shift_positions(box, self._pos)
+            self._containers.append((box, self._pos + header.box_size))
+            self._pos += box.boxes_start_pos - box.header.start_pos
+            return True
+
+        if len(self._buffer) - offset < header.box_size:
+            return False
+
+        bstr = bs.ConstBitStream(bytes=bytes(self._buffer[offset:offset + header.box_size]))
+        box = Parser.parse_box(bstr, Parser.parse_header(bstr))
+        box.load(bstr)
+        _shift_positions(box, self._pos)
+        self._pos += header.box_size
+        self._emit(box)
+        return True
+
+    def _emit(self, box):
+        if self._containers:
+            self._containers[-1][0].append(box)
+        self._ready.append(box)
+
+
+def _make_paths_tree(paths):
+    # Maps a box type to the tree of its sub-boxes to decode, or to None when
+    # the whole box is decoded
+    tree = {}
+    for path in paths:
+        if isinstance(path, str):
+            path = path.encode()
+        box_types = path.strip(b"/").split(b"/")
+        node = tree
+        for box_type in box_types[:-1]:
+            if box_type in node and node[box_type] is None:
+                break
+            node = node.setdefault(box_type, {})
+        else:
+            node[box_types[-1]] = None
+    return tree
+
+
+def _shift_positions(box, offset):
+    box.header.start_pos += offset
+    # The positions don't match the temporary stream of the box anymore
+    box._source = None
+    if isinstance(box, Parser._container_box):
+        if box.boxes_start_pos is not None:
+            box._boxes_start_pos += offset
+        for sub_box in box.boxes:
+            _shift_positions(sub_box, offset)
+
+
+def _parse_file(path, headers_only, recursive, load):
+    try:
+        bstr = MappedBitStream(path)
+        boxes = list(Parser.parse(bstr, headers_only=headers_only,
+                                  recursive=recursive))
+        if load and not headers_only:
+            for box in boxes:
+                box.load(bstr)
+    except Exception as error:
+        log.error("Could not parse %s: %r", path, error)
+        return ParseResult(path, None, error)
+    return ParseResult(path, boxes, None)
@@ -0,0 +1,217 @@
+""" Samples locations of a track precomputed from its sample table """
+
+from array import array
+from itertools import accumulate, chain, repeat
+
+
+class SampleIndex:
+    """ Offset, size and decoding time of every sample of a track. The stsc
+    runs are expanded so chunks holding multiple samples are supported. The
+    samples of the track fragments follow the samples of the sample table """
+
+    def __init__(self, stbl, trafs=(), trex=None):
+        """
+        :param stbl: The sample table box of the track, either parsed or
+                     restored from an index
+        :param trafs: (traf, base data offset) of the loaded track fragments
+                      of the track, in the order of the file. The bases of the
+                      trafs of a moof are resolved with get_trafs_bases
+        :param trex: The track extends box holding the defaults of the
+                     track fragments
+        """
+        tables = {box.header.type: box for box in stbl.boxes}
+
+        self._sizes = _get_sizes(tables.get(b"stsz"))
+
+        chunk_offsets = tables.get(b"stco", tables.get(b"co64"))
+        chunk_offsets = chunk_offsets.columns["chunk_offset"] \
+            if chunk_offsets is not None else array("Q")
+        self._offsets = _get_offsets(chunk_offsets, self._sizes,
+                                     tables.get(b"stsc"))
+
+        self._dts = _get_dts(tables.get(b"stts"))
+
+        if trafs:
+            self._add_trafs(trafs, trex, _get_end_time(tables.get(b"stts")))
+
+        self._len = min(len(self._sizes), len(self._offsets))
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def sizes(self):
+        return self._sizes
+
+    @property
+    def dts(self):
+        return self._dts
+
+    def get_location(self, index):
+        """
+        :param index: Index of the sample
+        :type index: int
+        :return: (offset, size) of the sample or None if there is no sample at
+                 this index
+        """
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            return None
+        return self._offsets[index], self._sizes[index]
+
+    def _add_trafs(self, trafs, trex, end_time):
+        # The columns of the sample table are not extended in place
+        self._sizes = array(self._sizes.typecode, self._sizes)
+        self._offsets = array("Q", self._offsets)
+
+        for traf, base_pos in trafs:
+            tfdt = next((box for box in traf.boxes
+                         if box.header.type == b"tfdt"), None)
+            if tfdt is not None:
+                end_time = tfdt.base_media_decode_time
+
+            for data_pos, sizes, durations in _iter_runs(traf, base_pos, trex):
+                self._sizes.extend(sizes)
+                self._offsets.extend(accumulate(chain((data_pos,),
+                                                      sizes[:-1])))
+                self._dts.extend(accumulate(chain((end_time,),
+                                                  durations[:-1])))
+                end_time += sum(durations)
+
+
+def get_trafs_bases(moof_offset, trafs, trexs=None):
+    """
+    Resolve the base data offsets of the trafs of a moof. Without an explicit
+    base, the data offsets of the first traf of a moof are relative to the
+    moof and those of the next trafs to the end of the data of the previous
+    traf, whatever its track
+
+    :param moof_offset: Position of the moof in the file
+    :type moof_offset: int
+    :param trafs: The loaded trafs of the moof in the order of the file
+    :param trexs: The track extends boxes holding the defaults of the track
+                  fragments by track id
+    :type trexs: dict
+    :return: list of (traf, base data offset)
+    """
+    if trexs is None:
+        trexs = {}
+    bases = []
+    data_end = moof_offset
+    for traf in trafs:
+        # TRAF.TFHD
+        tfhd = traf.boxes[0]
+        tf_flags = int.from_bytes(tfhd.header.flags, "big")
+        if tf_flags & tfhd.BASE_DATA_OFFSET_PRESENT:
+            base_pos = tfhd.base_data_offset
+        elif tf_flags & tfhd.DEFAULT_BASE_IS_MOOF or not bases:
+            base_pos = moof_offset
+        else:
+            base_pos = data_end
+        bases.append((traf, base_pos))
+
+        data_end = base_pos
+        for data_pos, sizes, _ in _iter_runs(traf, base_pos,
+                                             trexs.get(tfhd.track_id)):
+            data_end = data_pos + sum(sizes)
+    return bases
+
+
+def _iter_runs(traf, base_pos, trex):
+    """ (data position, sizes, durations) of the samples of the truns of a
+    traf """
+    # TRAF.TFHD
+    tfhd = traf.boxes[0]
+    tf_flags = int.from_bytes(tfhd.header.flags, "big")
+    default_duration = _get_default(tfhd, trex, tf_flags,
+                                    tfhd.DEFAULT_SAMPLE_DURATION_PRESENT,
+                                    "default_sample_duration")
+    default_size = _get_default(tfhd, trex, tf_flags,
+                                tfhd.DEFAULT_SAMPLE_SIZE_PRESENT,
+                                "default_sample_size")
+
+    data_pos = base_pos
+    for trun in (box for box in traf.boxes if box.header.type == b"trun"):
+        tr_flags = int.from_bytes(trun.header.flags, "big")
+        count = trun.sample_count
+        if not count:
+            continue
+        # Otherwise the data follows the data of the previous trun
+        if tr_flags & trun.DATA_OFFSET_PRESENT:
+            data_pos = base_pos + trun.data_offset
+
+        sizes = trun.columns["sample_size"]
+        if not tr_flags & trun.SAMPLE_SIZE_PRESENT:
+            sizes = array(sizes.typecode, [default_size]) * count
+        durations = trun.columns["sample_duration"] \
+            if tr_flags & trun.SAMPLE_DURATION_PRESENT else \
+            [default_duration] * count
+
+        yield data_pos, sizes, durations
+        data_pos += sum(sizes)
+
+
+def _get_sizes(stsz):
+    if stsz is None:
+        return array("I")
+    entry_size = stsz.columns["entry_size"]
+    if stsz.sample_size != 0:
+        return array(entry_size.typecode, [stsz.sample_size]) * \
+            stsz.sample_count
+    return entry_size
+
+
+def _get_offsets(chunk_offsets, sizes, stsc):
+    # Without a sample to chunk table, each chunk holds a single sample
+    if stsc is None or not len(stsc.columns["first_chunk"]):
+        return chunk_offsets
+
+    offsets = array("Q")
+    runs = list(zip(stsc.columns["first_chunk"],
+                    stsc.columns["samples_per_chunk"]))
+    for i, (first_chunk, samples_per_chunk) in enumerate(runs):
+        # Chunks are numbered from 1
+        end_chunk = runs[i + 1][0] - 1 if i + 1 < len(runs) else \
+            len(chunk_offsets)
+        if samples_per_chunk == 1:
+            offsets.fromlist(chunk_offsets[first_chunk - 1:end_chunk].tolist())
+            continue
+        for chunk_offset in chunk_offsets[first_chunk - 1:end_chunk]:
+            sample = len(offsets)
+            chunk_sizes = sizes[sample:sample + samples_per_chunk]
+            if not chunk_sizes:
+                break
+            offsets.extend(accumulate(chain((chunk_offset,),
+                                            chunk_sizes[:-1])))
+
+    return offsets
+
+
+def _get_default(tfhd, trex, tf_flags, flag, name):
+    if tf_flags & flag:
+        return getattr(tfhd, name)
+    return getattr(trex, name) if trex is not None else 0
+
+
+def _get_end_time(stts):
+    if stts is None:
+        return 0
+    return sum(sample_count * sample_delta for sample_count, sample_delta in
+               zip(stts.columns["sample_count"], stts.columns["sample_delta"]))
+
+
+def _get_dts(stts):
+    if stts is None:
+        return array("Q")
+    deltas = chain.from_iterable(
+        repeat(sample_delta, sample_count) for sample_count, sample_delta in
+        zip(stts.columns["sample_count"], stts.columns["sample_delta"]))
+    dts = array("Q", accumulate(chain((0,), deltas)))
+    # Drop the end time of the last sample
+    dts.pop()
+    return dts
@@ -0,0 +1,363 @@
+import io
+import mmap
+import os
+import weakref
+
+import bitstring as bs
+
+# MappedBitStream hands its mapping to the byte store of bitstring 3
+if not bs.__version__.startswith("3."):
+    raise ImportError("pybzparse requires bitstring 3, found {}"
+                      .format(bs.__version__))
+
+# Size of the chunks of a payload read at once
+PAYLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class _MappedByteArray(bs.MmapByteArray):
+    """ The bytes of a mapping owned by a MappedBitStream, in the form
+    bitstring reads its files through """
+
+    __slots__ = ()
+
+    def __init__(self, source, mapping, byteoffset):
+        # Unlike MmapByteArray, reuse the mapping instead of creating one
+        self.source = source
+        self.filemap = mapping
+        self.filelength = len(mapping)
+        self.byteoffset = byteoffset
+        self.bytelength = self.filelength - byteoffset
+
+
+class MappedBitStream(bs.ConstBitStream):
+    """ A ConstBitStream over a memory-mapped file which also exposes the
+    mapping as a memoryview so payloads can be sliced without being copied """
+
+    def __new__(cls, filename=None, offset_bytes=0, writable=False):
+        if filename is None:
+            # bitstring builds the results of reads and slices through
+            # self.__class__(), those are plain in-memory streams
+            return bs.ConstBitStream()
+
+        # Writes to a writable mapping go to the file and are seen by the
+        # reads of the stream
+        source = open(filename, "r+b" if writable else "rb")
+        try:
+            mapping = mmap.mmap(source.fileno(), 0,
+                                access=mmap.ACCESS_WRITE if writable
+                                else mmap.ACCESS_READ)
+        except BaseException:
+            source.close()
+            raise
+        if offset_bytes > len(mapping):
+            mapping.close()
+            source.close()
+            raise bs.CreationError("File is not long enough for specified "
+                                   "length and offset.")
+
+        # The stream reads the bytes of the single mapping of the file
+        x = super().__new__(cls)
+        rawarray = _MappedByteArray(source, mapping, offset_bytes)
+        x._datastore = bs.ConstByteStore(rawarray, rawarray.bytelength * 8, 0)
+        x.buffer = memoryview(mapping)[offset_bytes:]
+        # The file is kept open with the mapping to copy its bytes in the
+        # kernel
+        x._close_file = weakref.finalize(mapping, source.close)
+        x._file = source if not offset_bytes else None
+        return x
+
+    def __init__(self, filename=None, offset_bytes=0, writable=False):
+        super().__init__()
+
+    def flush(self):
+        """ Write the changes of a writable mapping to the file """
+        self.buffer.obj.flush()
+
+    def __copy__(self):
+        # The copy shares the mapping but gets its own position
+        x = object.__new__(type(self))
+        x._datastore = self._datastore
+        x._pos = 0
+        x.buffer = self.buffer
+        x._close_file = self._close_file
+        x._file = self._file
+        return x
+
+    def close(self):
+        """ Close the file and unmap it. The mapping stays alive while
+        payloads sliced from it are referenced """
+        self._close_file()
+        mapping = self.buffer.obj
+        self.buffer.release()
+        try:
+            mapping.close()
+        except BufferError:
+            pass
+
+    def fileno(self):
+        """
+        :return: the file descriptor of the mapped file
+        :raises: io.UnsupportedOperation if the stream doesn't start at the
+                 beginning of the file
+        """
+        if self._file is None:
+            raise io.UnsupportedOperation("The stream doesn't start at the "
+                                          "beginning of the file")
+        return self._file.fileno()
+
+    def read_at(self, offset, size):
+        """
+        Read bytes at an offset without using or moving the position
+
+        :param offset: Position of the first byte to read
+        :type offset: int
+        :param size: Number of bytes to read
+        :type size: int
+        :return: memoryview slice of the mapping
+        """
+        end = offset + size
+        if end > len(self.buffer):
+            raise bs.ReadError("Reading off the end of the data. Tried to read "
+                               "{} bytes when only {} available."
+                               .format(size, len(self.buffer) - offset))
+        return self.buffer[offset:end]
+
+
+class FileReader:
+    """ Reads bytes at offsets of a file through a single file descriptor.
+    The reads don't use the file position so threads can share a reader """
+
+    def __init__(self, file):
+        """
+        :param file: A filename, a file object or a file descriptor. A file
+                     opened from its filename is closed with the reader
+        """
+        if isinstance(file, int):
+            self._fd = file
+            self._owns_fd = False
+        elif hasattr(file, "fileno"):
+            self._fd = file.fileno()
+            self._owns_fd = False
+        else:
+            self._fd = os.open(file, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            self._owns_fd = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        if self._owns_fd and self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+
+    def read_at(self, offset, size):
+        """
+        Read bytes at an offset of the file
+
+        :param offset: Position of the first byte to read
+        :type offset: int
+        :param size: Number of bytes to read
+        :type size: int
+        :return: bytes
+        """
+        data = _pread(self._fd, size, offset)
+        if len(data) < size:
+            # Complete a partial read
+            buffer = bytearray(size)
+            buffer[:len(data)] = data
+            readinto_at(self._fd, [memoryview(buffer)[len(data):]],
+                        offset + len(data))
+            data = bytes(buffer)
+        return data
+
+    def readinto_at(self, buffers, offset):
+        readinto_at(self._fd, buffers, offset)
+
+
+def get_buffer(bstr):
+    """
+    Get the bytes-like buffer backing a stream, if any
+
+    :param bstr: The bitstring to inspect
+    :return: memoryview over the stream's bytes or None
+    """
+    return getattr(bstr, "buffer", None)
+
+
+def read_bytes(bstr, size):
+    """
+    Read bytes from the current byte position of a stream. A memory-mapped
+    stream returns a zero-copy memoryview slice of its mapping.
+
+    :param bstr: The bitstring to read from
+    :type bstr: bitstring.ConstBitStream, MappedBitStream
+    :param size: Number of bytes to read
+    :type size: int
+    :return: bytes or memoryview
+    """
+    buffer = get_buffer(bstr)
+    if buffer is None:
+        return bstr.read(size * 8).bytes
+
+    start = bstr.bytepos
+    end = start + size
+    if end > len(buffer):
+        raise bs.ReadError("Reading off the end of the data. Tried to read "
+                           "{} bytes when only {} available."
+                           .format(size, len(buffer) - start))
+    bstr.bytepos = end
+    return buffer[start:end]
+
+
+def read_at(source, offset, size):
+    """
+    Read bytes at an offset of a source without using or moving its position
+    so the source can be shared between threads
+
+    :param source: A MappedBitStream, a FileReader or a bitstring
+    :param offset: Position of the first byte to read
+    :type offset: int
+    :param size: Number of bytes to read
+    :type size: int
+    :return: bytes or memoryview
+    """
+    if hasattr(source, "read_at"):
+        return source.read_at(offset, size)
+
+    # Slicing a bitstring doesn't move its position
+    end = offset + size
+    if end * 8 > source.len:
+        raise bs.ReadError("Reading off the end of the data. Tried to read "
+                           "{} bytes when only {} available."
+                           .format(size, source.len // 8 - offset))
+    return source[offset * 8:end * 8].bytes
+
+
+def read_stream_at(source, offset, size):
+    """
+    Read bytes at an offset of a source into a stream of their own so they
+    can be parsed without using or moving the position of the source
+
+    :param source: A MappedBitStream, a FileReader or a bitstring
+    :param offset: Position of the first byte to read
+    :type offset: int
+    :param size: Number of bytes to read
+    :type size: int
+    :return: ConstBitStream starting at the byte at offset in the source
+    """
+    return bs.ConstBitStream(bytes=read_at(source, offset, size))
+
+
+class PayloadView:
+    """ Read-only view of a range of bytes of a source. Nothing is read until
+    the view is indexed, sliced, iterated by chunks or converted to bytes """
+
+    def __init__(self, source, offset, size):
+        """
+        :param source: A MappedBitStream, a FileReader or a bitstring
+        :param offset: Position of the first byte of the view in the source
+        :type offset: int
+        :param size: Number of bytes of the view
+        :type size: int
+        """
+        self._source = source
+        self._offset = offset
+        self._size = size
+
+    def __repr__(self, *args, **kwargs):
+        return "{class_name}(offset={offset}, size={size})".format(
+            class_name=self.__class__.__name__, offset=self._offset,
+            size=self._size)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            data = read_at(self._source, self._offset + start,
+                           max(stop - start, 0)) if step == 1 else bytes(self)
+            return bytes(data) if step == 1 else data[index]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("payload index out of range")
+        return read_at(self._source, self._offset + index, 1)[0]
+
+    def __bytes__(self):
+        return bytes(read_at(self._source, self._offset, self._size))
+
+    def __eq__(self, other):
+        if isinstance(other, PayloadView):
+            other = bytes(other)
+        elif not isinstance(other, (bytes, bytearray, memoryview)):
+            return NotImplemented
+        return len(other) == self._size and bytes(self) == other
+
+    __hash__ = None
+
+    @property
+    def offset(self):
+        return self._offset
+
+    def iter_chunks(self, chunk_size=PAYLOAD_CHUNK_SIZE):
+        """
+        :param chunk_size: Maximum size of the chunks
+        :type chunk_size: int
+        :return: the bytes of the view read chunk by chunk
+        """
+        end = self._offset + self._size
+        for offset in range(self._offset, end, chunk_size):
+            yield read_at(self._source, offset, min(chunk_size, end - offset))
+
+
+def readinto_at(fd, buffers, offset):
+    """
+    Fill buffers with the bytes of a file starting at an offset, without
+    using or moving the file position. The buffers are filled in a single
+    os.preadv call when it is available.
+
+    :param fd: File descriptor to read from
+    :type fd: int
+    :param buffers: Writable bytes-like objects to fill in order
+    :type buffers: list
+    :param offset: Position in the file of the first byte to read
+    :type offset: int
+    """
+    buffers = [memoryview(buffer).cast("B") for buffer in buffers
+               if len(buffer)]
+    while buffers:
+        size = sum(len(buffer) for buffer in buffers)
+        if hasattr(os, "preadv"):
+            read = os.preadv(fd, buffers, offset)
+        else:
+            data = _pread(fd, size, offset)
+            read = len(data)
+            data_pos = 0
+            for buffer in buffers:
+                chunk = data[data_pos:data_pos + len(buffer)]
+                buffer[:len(chunk)] = chunk
+                data_pos += len(chunk)
+        if read == 0:
+            raise bs.ReadError("Reading off the end of the data. Tried to read "
+                               "{} bytes at {}.".format(size, offset))
+        offset += read
+        # Drop the filled buffers and continue after a partial read
+        while buffers and read >= len(buffers[0]):
+            read -= len(buffers.pop(0))
+        if read:
+            buffers[0] = buffers[0][read:]
+
+
+def _pread(fd, size, offset):
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    # Without pread, the reads of a shared file descriptor aren't thread-safe
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
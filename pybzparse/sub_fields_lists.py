@@ -1,6 +1,10 @@
+import sys
 from abc import ABCMeta, abstractmethod
+from array import array
+from collections.abc import Sequence
 
 from pybzparse.fields_lists import *
+from pybzparse.sources import read_at, read_stream_at
 
 
 class AbstractSubFieldsList(metaclass=ABCMeta):
@@ -18,9 +22,212 @@ class AbstractSubFieldsList(metaclass=ABCMeta):
 
     @abstractmethod
     def load_sub_fields(self, bstr, header):
+        """
+        Load the entries of a box at their position in the source without
+        using or moving the position of the source. The entries nested in
+        an entry are read from the stream their entry was read from
+
+        :param bstr: The source holding the box
+        :param header: The header of the box
+        :return: the position following the entries in the source
+        """
         raise NotImplemented()
 
 
+# Array typecodes of the sample tables values
+_UINT32 = next(typecode for typecode in "IL" if array(typecode).itemsize == 4)
+_INT32 = _UINT32.lower()
+_UINT64 = next(typecode for typecode in "LQ" if array(typecode).itemsize == 8)
+_INT64 = _UINT64.lower()
+
+
+class ColumnsEntry:
+    """ View of an entry of a sub fields list stored in columns """
+
+    __slots__ = ("_columns", "_index", "_owner")
+
+    def __init__(self, columns, index, owner=None):
+        """
+        :param columns: The arrays of the values by field name
+        :param index: The index of the entry in the columns
+        :param owner: The sub fields list notified of the changes
+        """
+        object.__setattr__(self, "_columns", columns)
+        object.__setattr__(self, "_index", index)
+        object.__setattr__(self, "_owner", owner)
+
+    def __repr__(self, *args, **kwargs):
+        return "{class_name} : {content!r} ".format(
+            class_name=self.__class__.__name__,
+            content={name: column[self._index]
+                     for name, column in self._columns.items()})
+
+    def __getattr__(self, name):
+        try:
+            return self._columns[name][self._index]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name not in self._columns:
+            raise AttributeError(name)
+        # Like fields, the value can come with its type
+        if isinstance(value, tuple):
+            value = value[0]
+        self._columns[name][self._index] = value
+        if self._owner is not None:
+            self._owner._mark_modified()
+
+
+class ColumnsView(Sequence):
+    """ Sequence of the entries of a sub fields list stored in columns """
+
+    def __init__(self, columns, owner=None):
+        self._columns = columns
+        self._owner = owner
+
+    def __len__(self):
+        return len(next(iter(self._columns.values())))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("entry index out of range")
+        return ColumnsEntry(self._columns, index, self._owner)
+
+
+class AbstractColumnsSubFieldsList(AbstractSubFieldsList):
+    """ Sub fields list of fixed size entries stored in one array per field
+    instead of one fields list per entry """
+
+    # (field name, array typecode) of the entries
+    _columns_layout = ()
+    _count_field_name = "_entry_count"
+    # The count of the entries gives the size of the columns
+    _resizing_fields = ("entry_count",)
+
+    def __init__(self):
+        super().__init__()
+
+        self._entries_start_pos = None
+        self._columns = {name: array(typecode)
+                         for name, typecode in self._columns_layout}
+        self._entries = ColumnsView(self._columns, self)
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def append_and_return(self):
+        for column in self._columns.values():
+            column.append(0)
+        setattr(self, self._count_field_name,
+                getattr(self, self._count_field_name) + 1)
+        self._mark_dirty()
+        return self._entries[-1]
+
+    def extend(self, **columns):
+        """
+        Append entries from a sequence of values per field
+
+        :param columns: The values of the entries by field name
+        """
+        lengths = {len(columns[name]) for name in self._columns}
+        if len(lengths) != 1:
+            raise ValueError("Columns don't have the same length")
+        for name, column in self._columns.items():
+            values = columns[name]
+            if not isinstance(values, array) or values.typecode != column.typecode:
+                values = array(column.typecode, values)
+            column.extend(values)
+        setattr(self, self._count_field_name,
+                getattr(self, self._count_field_name) + lengths.pop())
+        self._mark_dirty()
+
+    def clear(self):
+        for column in self._columns.values():
+            del column[:]
+        setattr(self, self._count_field_name, 0)
+        self._mark_dirty()
+
+    def pop(self):
+        entry = ColumnsEntry({name: array(column.typecode, [column.pop()])
+                              for name, column in self._columns.items()}, 0)
+        setattr(self, self._count_field_name,
+                getattr(self, self._count_field_name) - 1)
+        self._mark_dirty()
+        return entry
+
+    def load_sub_fields(self, bstr, header):
+        typecodes = self._get_wire_typecodes(header)
+        itemsize = array(typecodes[0]).itemsize
+        size = self._get_entries_count() * len(typecodes) * itemsize
+        data = read_at(bstr, self._entries_start_pos, size)
+        unpacked = _unpack_columns(data, typecodes)
+        for column, values in zip(self._columns.values(), unpacked):
+            if values.typecode != column.typecode:
+                values = array(column.typecode, values)
+            column[:] = values
+        return self._entries_start_pos + size
+
+    def parse_fields(self, bstr, header):
+        super().parse_fields(bstr, header)
+        self._entries_start_pos = bstr.bytepos
+
+    def _get_entries_bytes(self, header=None):
+        return _pack_columns(list(self._columns.values()),
+                             self._get_wire_typecodes(header))
+
+    def _get_bytes_size(self):
+        return super()._get_bytes_size() + \
+            self._get_entries_count() * self._get_entry_size()
+
+    def _get_entries_count(self):
+        return getattr(self, self._count_field_name)
+
+    def _get_entry_size(self):
+        return sum(array(typecode).itemsize
+                   for typecode in self._get_wire_typecodes())
+
+    def _get_wire_typecodes(self, header=None):
+        del header
+        return tuple(typecode for _, typecode in self._columns_layout)
+
+
+def _unpack_columns(data, typecodes):
+    # Entries are made of big-endian values of the same size
+    raw = array(_UINT32 if array(typecodes[0]).itemsize == 4 else _UINT64)
+    raw.frombytes(data)
+    if sys.byteorder == "little":
+        raw.byteswap()
+    columns = []
+    for i, typecode in enumerate(typecodes):
+        column = raw[i::len(typecodes)] if len(typecodes) > 1 else raw
+        if column.typecode != typecode:
+            column = array(typecode, column.tobytes())
+        columns.append(column)
+    return columns
+
+
+def _pack_columns(columns, typecodes):
+    raw_typecode = _UINT32 if array(typecodes[0]).itemsize == 4 else _UINT64
+    raw = array(raw_typecode, bytes(array(raw_typecode).itemsize *
+                                    len(columns[0]) * len(columns)))
+    for i, (column, typecode) in enumerate(zip(columns, typecodes)):
+        if column.typecode != typecode:
+            column = array(typecode, column)
+        if typecode != raw_typecode:
+            column = array(raw_typecode, column.tobytes())
+        raw[i::len(columns)] = column
+    if sys.byteorder == "little":
+        raw.byteswap()
+    return raw.tobytes()
+
+
 # meta boxes
 class ItemLocationSubFieldsList(AbstractSubFieldsList, ItemLocationBoxFieldsList):
     def __init__(self):
@@ -38,33 +245,41 @@ class ItemLocationSubFieldsList(AbstractSubFieldsList, ItemLocationBoxFieldsList
         return self._items
 
     def append_and_return(self):
-        item = ItemLocationItemSubFieldsList(self._index_size.value,
-                                             self._offset_size.value,
-                                             self._length_size.value,
-                                             self._base_offset_size.value)
+        item = ItemLocationItemSubFieldsList(self._index_size,
+                                             self._offset_size,
+                                             self._length_size,
+                                             self._base_offset_size)
+        item._owner = self
         self._items.append(item)
-        self._item_count.value += 1
+        self._item_count += 1
+        self._mark_dirty()
         return item
 
     def clear(self):
         del self._items[:]
-        self._item_count.value = 0
+        self._item_count = 0
+        self._mark_dirty()
 
     def pop(self):
         item = self._items.pop()
-        self._item_count.value -= 1
+        self._item_count -= 1
+        self._mark_dirty()
         return item
 
     def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._items_start_pos
-        for i in range(self._item_count.value):
-            item = ItemLocationItemSubFieldsList(self._index_size.value,
-                                                 self._offset_size.value,
-                                                 self._length_size.value,
-                                                 self._base_offset_size.value)
-            item.parse_fields(bstr, header)
-            item.load_sub_fields(bstr, header)
+        entries_bstr = read_stream_at(
+            bstr, self._items_start_pos,
+            header.start_pos + header.box_size - self._items_start_pos)
+        for i in range(self._item_count):
+            item = ItemLocationItemSubFieldsList(self._index_size,
+                                                 self._offset_size,
+                                                 self._length_size,
+                                                 self._base_offset_size)
+            item._owner = self
+            item.parse_fields(entries_bstr, header)
+            item.load_sub_fields(entries_bstr, header)
             self._items.append(item)
+        return self._items_start_pos + entries_bstr.bytepos
 
     def parse_fields(self, bstr, header):
         super().parse_fields(bstr, header)
@@ -80,7 +295,6 @@ class ItemLocationItemSubFieldsList(AbstractSubFieldsList,
         self._offset_size = offset_size
         self._length_size = length_size
 
-        self._extents_start_pos = None
         self._extents = []
 
     def __bytes__(self):
@@ -95,31 +309,33 @@ class ItemLocationItemSubFieldsList(AbstractSubFieldsList,
         extent = ItemLocationBoxItemExtentFieldsList(self._index_size,
                                                      self._offset_size,
                                                      self._length_size)
+        extent._owner = self
         self._extents.append(extent)
-        self._extent_count.value += 1
+        self._extent_count += 1
+        self._mark_dirty()
         return extent
 
     def clear(self):
         del self._extents[:]
-        self._extent_count.value = 0
+        self._extent_count = 0
+        self._mark_dirty()
 
     def pop(self):
         extent = self._extents.pop()
-        self._extent_count.value -= 1
+        self._extent_count -= 1
+        self._mark_dirty()
         return extent
 
     def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._extents_start_pos
-        for i in range(self._extent_count.value):
+        # Continue reading the stream the entry was read from
+        for i in range(self._extent_count):
             extent = ItemLocationBoxItemExtentFieldsList(self._index_size,
                                                          self._offset_size,
                                                          self._length_size)
+            extent._owner = self
             extent.parse_fields(bstr, header)
             self._extents.append(extent)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        self._extents_start_pos = bstr.bytepos
+        return bstr.bytepos
 
 
 class ItemPropertyAssociationSubFieldsList(AbstractSubFieldsList,
@@ -140,26 +356,34 @@ class ItemPropertyAssociationSubFieldsList(AbstractSubFieldsList,
 
     def append_and_return(self):
         entry = ItemPropertyAssociationEntrySubFieldsList()
+        entry._owner = self
         self._entries.append(entry)
-        self._entry_count.value += 1
+        self._entry_count += 1
+        self._mark_dirty()
         return entry
 
     def clear(self):
         del self._entries[:]
-        self._entry_count.value = 0
+        self._entry_count = 0
+        self._mark_dirty()
 
     def pop(self):
         entry = self._entries.pop()
-        self._entry_count.value -= 1
+        self._entry_count -= 1
+        self._mark_dirty()
         return entry
 
     def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._entries_start_pos
-        for i in range(self._entry_count.value):
+        entries_bstr = read_stream_at(
+            bstr, self._entries_start_pos,
+            header.start_pos + header.box_size - self._entries_start_pos)
+        for i in range(self._entry_count):
             entry = ItemPropertyAssociationEntrySubFieldsList()
-            entry.parse_fields(bstr, header)
-            entry.load_sub_fields(bstr, header)
+            entry._owner = self
+            entry.parse_fields(entries_bstr, header)
+            entry.load_sub_fields(entries_bstr, header)
             self._entries.append(entry)
+        return self._entries_start_pos + entries_bstr.bytepos
 
     def parse_fields(self, bstr, header):
         super().parse_fields(bstr, header)
@@ -171,7 +395,6 @@ class ItemPropertyAssociationEntrySubFieldsList(
     def __init__(self):
         super().__init__()
 
-        self._associations_start_pos = None
         self._associations = []
 
     def __bytes__(self):
@@ -184,29 +407,31 @@ class ItemPropertyAssociationEntrySubFieldsList(
 
     def append_and_return(self):
         entry = ItemPropertyAssociationBoxEntryAssociationsFieldsList()
+        entry._owner = self
         self._associations.append(entry)
-        self._association_count.value += 1
+        self._association_count += 1
+        self._mark_dirty()
         return entry
 
     def clear(self):
         del self._associations[:]
-        self._association_count.value = 0
+        self._association_count = 0
+        self._mark_dirty()
 
     def pop(self):
         entry = self._associations.pop()
-        self._association_count.value -= 1
+        self._association_count -= 1
+        self._mark_dirty()
         return entry
 
     def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._associations_start_pos
-        for i in range(self._association_count.value):
+        # Continue reading the stream the entry was read from
+        for i in range(self._association_count):
             association = ItemPropertyAssociationBoxEntryAssociationsFieldsList()
+            association._owner = self
             association.parse_fields(bstr, header)
             self._associations.append(association)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        self._associations_start_pos = bstr.bytepos
+        return bstr.bytepos
 
 
 # edts boxes
@@ -227,25 +452,33 @@ class EditListSubFieldsList(AbstractSubFieldsList, EditListBoxFieldsList):
 
     def append_and_return(self):
         entry = EditListBoxEntryFieldsList()
+        entry._owner = self
         self._entries.append(entry)
-        self._entry_count.value += 1
+        self._entry_count += 1
+        self._mark_dirty()
         return entry
 
     def clear(self):
         del self._entries[:]
-        self._entry_count.value = 0
+        self._entry_count = 0
+        self._mark_dirty()
 
     def pop(self):
         entry = self._entries.pop()
-        self._entry_count.value -= 1
+        self._entry_count -= 1
+        self._mark_dirty()
         return entry
 
     def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._entries_start_pos
-        for i in range(self._entry_count.value):
+        entries_bstr = read_stream_at(
+            bstr, self._entries_start_pos,
+            header.start_pos + header.box_size - self._entries_start_pos)
+        for i in range(self._entry_count):
             entry = EditListBoxEntryFieldsList()
-            entry.parse_fields(bstr, header)
+            entry._owner = self
+            entry.parse_fields(entries_bstr, header)
             self._entries.append(entry)
+        return self._entries_start_pos + entries_bstr.bytepos
 
     def parse_fields(self, bstr, header):
         super().parse_fields(bstr, header)
@@ -253,235 +486,110 @@ class EditListSubFieldsList(AbstractSubFieldsList, EditListBoxFieldsList):
 
 
 # stbl boxes
-class TimeToSampleSubFieldsList(AbstractSubFieldsList,
+class TimeToSampleSubFieldsList(AbstractColumnsSubFieldsList,
                                 TimeToSampleBoxFieldsList):
-    def __init__(self):
-        super().__init__()
-
-        self._entries_start_pos = None
-        self._entries = []
+    _columns_layout = (("sample_count", _UINT32), ("sample_delta", _UINT32))
 
     def __bytes__(self):
-        return b''.join([TimeToSampleBoxFieldsList.__bytes__(self)] +
-                        [bytes(entry) for entry in self._entries])
+        return b''.join([TimeToSampleBoxFieldsList.__bytes__(self),
+                         self._get_entries_bytes()])
 
     @property
     def entries(self):
         return self._entries
 
-    def append_and_return(self):
-        entry = TimeToSampleBoxEntryFieldsList()
-        self._entries.append(entry)
-        self._entry_count.value += 1
-        return entry
-
-    def clear(self):
-        del self._entries[:]
-        self._entry_count.value = 0
 
-    def pop(self):
-        entry = self._entries.pop()
-        self._entry_count.value -= 1
-        return entry
-
-    def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._entries_start_pos
-        for i in range(self._entry_count.value):
-            entry = TimeToSampleBoxEntryFieldsList()
-            entry.parse_fields(bstr, header)
-            self._entries.append(entry)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        self._entries_start_pos = bstr.bytepos
-
-
-class CompositionOffsetSubFieldsList(AbstractSubFieldsList,
+class CompositionOffsetSubFieldsList(AbstractColumnsSubFieldsList,
                                      CompositionOffsetBoxFieldsList):
-    def __init__(self):
-        super().__init__()
-
-        self._entries_start_pos = None
-        self._entries = []
+    # sample_offset is signed in version 1 of the box
+    _columns_layout = (("sample_count", _UINT32), ("sample_offset", _INT64))
 
     def __bytes__(self):
-        return b''.join([CompositionOffsetBoxFieldsList.__bytes__(self)] +
-                        [bytes(entry) for entry in self._entries])
+        return b''.join([CompositionOffsetBoxFieldsList.__bytes__(self),
+                         self._get_entries_bytes()])
 
     @property
     def entries(self):
         return self._entries
 
-    def append_and_return(self):
-        entry = CompositionOffsetBoxEntryFieldsList()
-        self._entries.append(entry)
-        self._entry_count.value += 1
-        return entry
-
-    def clear(self):
-        del self._entries[:]
-        self._entry_count.value = 0
-
-    def pop(self):
-        entry = self._entries.pop()
-        self._entry_count.value -= 1
-        return entry
-
-    def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._entries_start_pos
-        for i in range(self._entry_count.value):
-            entry = CompositionOffsetBoxEntryFieldsList()
-            entry.parse_fields(bstr, header)
-            self._entries.append(entry)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        self._entries_start_pos = bstr.bytepos
-
-
-class SampleSizeSubFieldsList(AbstractSubFieldsList, SampleSizeBoxFieldsList):
-    def __init__(self):
-        super().__init__()
-
-        self._samples_start_pos = None
-        self._samples = []
+    def _get_entry_size(self):
+        # The wire size doesn't depend on the sign of the offsets
+        return 8
+
+    def _get_entries_bytes(self, header=None):
+        typecode = self._get_wire_typecodes(header)[1]
+        sample_offsets = self._columns["sample_offset"]
+        if sample_offsets:
+            # Don't let the offsets wrap around on the wire
+            low, high = (-(1 << 31), (1 << 31) - 1) if typecode == _INT32 \
+                else (0, (1 << 32) - 1)
+            if min(sample_offsets) < low or max(sample_offsets) > high:
+                raise ValueError("Sample offsets [{}, {}] out of the range of "
+                                 "a version {} ctts"
+                                 .format(min(sample_offsets),
+                                         max(sample_offsets),
+                                         int(typecode == _INT32)))
+        return super()._get_entries_bytes(header)
+
+    def _get_wire_typecodes(self, header=None):
+        # The version of the box gives the sign of the offsets. Without a
+        # header, the entries are written as a version 0 box
+        signed = header is not None and header.version == 1
+        return _UINT32, _INT32 if signed else _UINT32
+
+
+class SampleSizeSubFieldsList(AbstractColumnsSubFieldsList,
+                              SampleSizeBoxFieldsList):
+    _columns_layout = (("entry_size", _UINT32),)
+    _count_field_name = "_sample_count"
+    # A constant size drops the entries
+    _resizing_fields = ("sample_count", "sample_size")
 
     def __bytes__(self):
-        return b''.join([SampleSizeBoxFieldsList.__bytes__(self)] +
-                        [bytes(sample) for sample in self._samples])
+        return b''.join([SampleSizeBoxFieldsList.__bytes__(self),
+                         self._get_entries_bytes()])
 
     @property
     def samples(self):
-        return self._samples
-
-    def append_and_return(self):
-        sample = SampleSizeBoxSampleFieldsList()
-        self._samples.append(sample)
-        self._sample_count.value += 1
-        return sample
-
-    def clear(self):
-        del self._samples[:]
-        self._sample_count.value = 0
-
-    def pop(self):
-        entry = self._samples.pop()
-        self._sample_count.value -= 1
-        return entry
+        return self._entries
 
-    def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._samples_start_pos
+    def _get_entries_count(self):
         # if a constant size is used, there's no array
-        if self._sample_size.value != 0:
-            return
-        for i in range(self._sample_count.value):
-            sample = SampleSizeBoxSampleFieldsList()
-            sample.parse_fields(bstr, header)
-            self._samples.append(sample)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        self._samples_start_pos = bstr.bytepos
+        if self._sample_size != 0:
+            return 0
+        return super()._get_entries_count()
 
 
-class SampleToChunkSubFieldsList(AbstractSubFieldsList,
+class SampleToChunkSubFieldsList(AbstractColumnsSubFieldsList,
                                  SampleToChunkBoxFieldsList):
-    def __init__(self):
-        super().__init__()
-
-        self._entries_start_pos = None
-        self._entries = []
+    _columns_layout = (("first_chunk", _UINT32),
+                       ("samples_per_chunk", _UINT32),
+                       ("sample_description_index", _UINT32))
 
     def __bytes__(self):
-        return b''.join([SampleToChunkBoxFieldsList.__bytes__(self)] +
-                        [bytes(entry) for entry in self._entries])
+        return b''.join([SampleToChunkBoxFieldsList.__bytes__(self),
+                         self._get_entries_bytes()])
 
     @property
     def entries(self):
         return self._entries
 
-    def append_and_return(self):
-        entry = SampleToChunkBoxEntryFieldsList()
-        self._entries.append(entry)
-        self._entry_count.value += 1
-        return entry
-
-    def clear(self):
-        del self._entries[:]
-        self._entry_count.value = 0
-
-    def pop(self):
-        entry = self._entries.pop()
-        self._entry_count.value -= 1
-        return entry
-
-    def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._entries_start_pos
-        for i in range(self._entry_count.value):
-            entry = SampleToChunkBoxEntryFieldsList()
-            entry.parse_fields(bstr, header)
-            self._entries.append(entry)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        self._entries_start_pos = bstr.bytepos
-
-
-class ChunkOffsetSubFieldsList(AbstractSubFieldsList, ChunkOffsetBoxFieldsList):
-    def __init__(self):
-        super().__init__()
 
-        self._entries_start_pos = None
-        self._entries = []
+class ChunkOffsetSubFieldsList(AbstractColumnsSubFieldsList,
+                               ChunkOffsetBoxFieldsList):
+    _columns_layout = (("chunk_offset", _UINT32),)
 
     def __bytes__(self):
-        return b''.join([ChunkOffsetBoxFieldsList.__bytes__(self)] +
-                        [bytes(sample) for sample in self._entries])
+        return b''.join([ChunkOffsetBoxFieldsList.__bytes__(self),
+                         self._get_entries_bytes()])
 
     @property
     def entries(self):
         return self._entries
 
-    def append_and_return(self):
-        entry = ChunkOffsetBoxEntryFieldsList()
-        self._entries.append(entry)
-        self._entry_count.value += 1
-        return entry
-
-    def clear(self):
-        del self._entries[:]
-        self._entry_count.value = 0
-
-    def pop(self):
-        entry = self._entries.pop()
-        self._entry_count.value -= 1
-        return entry
-
-    def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._entries_start_pos
-        for i in range(self._entry_count.value):
-            entry = ChunkOffsetBoxEntryFieldsList()
-            entry.parse_fields(bstr, header)
-            self._entries.append(entry)
-
-    def parse_fields(self, bstr, header):
-        super().parse_fields(bstr, header)
-        self._entries_start_pos = bstr.bytepos
-
 
 class ChunkOffset64SubFieldsList(ChunkOffsetSubFieldsList):
-    def append_and_return(self):
-        entry = ChunkOffset64BoxEntryFieldsList()
-        self._entries.append(entry)
-        self._entry_count.value += 1
-        return entry
-
-    def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._entries_start_pos
-        for i in range(self._entry_count.value):
-            entry = ChunkOffset64BoxEntryFieldsList()
-            entry.parse_fields(bstr, header)
-            self._entries.append(entry)
+    _columns_layout = (("chunk_offset", _UINT64),)
 
 
 # hev1, hvc1 boxes
@@ -502,26 +610,34 @@ class HEVCConfigurationSubFieldsList(AbstractSubFieldsList, HEVCConfigurationBox
 
     def append_and_return(self):
         entry = HEVCConfigurationArraySubFieldsList()
+        entry._owner = self
         self._arrays.append(entry)
-        self._num_of_arrays.value += 1
+        self._num_of_arrays += 1
+        self._mark_dirty()
         return entry
 
     def clear(self):
         del self._arrays[:]
-        self._num_of_arrays.value = 0
+        self._num_of_arrays = 0
+        self._mark_dirty()
 
     def pop(self):
         entry = self._arrays.pop()
-        self._num_of_arrays.value -= 1
+        self._num_of_arrays -= 1
+        self._mark_dirty()
         return entry
 
     def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._arrays_start_pos
-        for i in range(self._num_of_arrays.value):
+        entries_bstr = read_stream_at(
+            bstr, self._arrays_start_pos,
+            header.start_pos + header.box_size - self._arrays_start_pos)
+        for i in range(self._num_of_arrays):
             array = HEVCConfigurationArraySubFieldsList()
-            array.parse_fields(bstr, header)
-            array.load_sub_fields(bstr, header)
+            array._owner = self
+            array.parse_fields(entries_bstr, header)
+            array.load_sub_fields(entries_bstr, header)
             self._arrays.append(array)
+        return self._arrays_start_pos + entries_bstr.bytepos
 
     def parse_fields(self, bstr, header):
         super().parse_fields(bstr, header)
@@ -532,7 +648,6 @@ class HEVCConfigurationArraySubFieldsList(AbstractSubFieldsList, HEVCConfigurati
     def __init__(self):
         super().__init__()
 
-        self._nalus_start_pos = None
         self._nalus = []
 
     def __bytes__(self):
@@ -545,26 +660,173 @@ class HEVCConfigurationArraySubFieldsList(AbstractSubFieldsList, HEVCConfigurati
 
     def append_and_return(self):
         entry = HEVCConfigurationBoxNaluFieldsList()
+        entry._owner = self
         self._nalus.append(entry)
-        self._num_nalus.value += 1
+        self._num_nalus += 1
+        self._mark_dirty()
         return entry
 
     def clear(self):
         del self._nalus[:]
-        self._num_nalus.value = 0
+        self._num_nalus = 0
+        self._mark_dirty()
 
     def pop(self):
         entry = self._nalus.pop()
-        self._num_nalus.value -= 1
+        self._num_nalus -= 1
+        self._mark_dirty()
         return entry
 
     def load_sub_fields(self, bstr, header):
-        bstr.bytepos = self._nalus_start_pos
-        for i in range(self._num_nalus.value):
+        # Continue reading the stream the entry was read from
+        for i in range(self._num_nalus):
             nalu = HEVCConfigurationBoxNaluFieldsList()
+            nalu._owner = self
             nalu.parse_fields(bstr, header)
             self._nalus.append(nalu)
+        return bstr.bytepos
+
+
+# traf boxes
+class TrackRunSubFieldsList(AbstractColumnsSubFieldsList, TrackRunBoxFieldsList):
+    """ The tr_flags of the header of the box select the columns present in
+    the box. The other columns are kept filled with zeros """
+
+    _columns_layout = (("sample_duration", _UINT32),
+                       ("sample_size", _UINT32),
+                       ("sample_flags", _UINT32),
+                       # signed in version 1 of the box
+                       ("sample_composition_time_offset", _INT64))
+    _columns_flags = (TrackRunBoxFieldsList.SAMPLE_DURATION_PRESENT,
+                      TrackRunBoxFieldsList.SAMPLE_SIZE_PRESENT,
+                      TrackRunBoxFieldsList.SAMPLE_FLAGS_PRESENT,
+                      TrackRunBoxFieldsList.SAMPLE_COMPOSITION_TIME_OFFSETS_PRESENT)
+    _count_field_name = "_sample_count"
+    _resizing_fields = ("sample_count",)
+
+    def __bytes__(self):
+        return b''.join([TrackRunBoxFieldsList.__bytes__(self),
+                         self._get_entries_bytes()])
+
+    @property
+    def samples(self):
+        return self._entries
+
+    def extend(self, **columns):
+        """
+        Append samples from a sequence of values per field. The missing
+        columns are filled with zeros
+
+        :param columns: The values of the samples by field name
+        """
+        length = len(next(iter(columns.values())))
+        for name, typecode in self._columns_layout:
+            if name not in columns:
+                columns[name] = array(typecode, bytes(length *
+                                                      array(typecode).itemsize))
+        super().extend(**columns)
+
+    def load_sub_fields(self, bstr, header):
+        names = self._get_wire_names(header)
+        count = self._get_entries_count()
+        size = count * len(names) * 4
+        unpacked = _unpack_columns(read_at(bstr, self._entries_start_pos,
+                                           size),
+                                   self._get_wire_typecodes(header)) \
+            if names else []
+        unpacked = dict(zip(names, unpacked))
+        for name, column in self._columns.items():
+            values = unpacked.get(name)
+            if values is None:
+                values = array(column.typecode, bytes(count * column.itemsize))
+            elif values.typecode != column.typecode:
+                values = array(column.typecode, values)
+            column[:] = values
+        return self._entries_start_pos + size
+
+    def _get_entries_bytes(self):
+        names = self._get_wire_names()
+        if not names:
+            return b''
+        return _pack_columns([self._columns[name] for name in names],
+                             self._get_wire_typecodes())
+
+    def _get_entry_size(self):
+        return 4 * len(self._get_wire_names())
+
+    def _get_wire_names(self, header=None):
+        if header is None:
+            header = self.header
+        tr_flags = int.from_bytes(header.flags, "big")
+        return tuple(name for (name, _), flag in zip(self._columns_layout,
+                                                     self._columns_flags)
+                     if tr_flags & flag)
+
+    def _get_wire_typecodes(self, header=None):
+        if header is None:
+            header = self.header
+        # Signed composition time offsets are only found in version 1
+        return tuple(_INT32 if name == "sample_composition_time_offset" and
+                     header.version == 1 else _UINT32
+                     for name in self._get_wire_names(header))
+
+
+# mfra boxes
+class TrackFragmentRandomAccessSubFieldsList(AbstractSubFieldsList,
+                                             TrackFragmentRandomAccessBoxFieldsList):
+    def __init__(self):
+        super().__init__()
+
+        self._entries_start_pos = None
+        self._entries = []
+
+    def __bytes__(self):
+        return b''.join([TrackFragmentRandomAccessBoxFieldsList.__bytes__(self)] +
+                        [bytes(entry) for entry in self._entries])
+
+    @property
+    def entries(self):
+        return self._entries
+
+    def append_and_return(self):
+        entry = TrackFragmentRandomAccessBoxEntryFieldsList(
+            *self._get_numbers_sizes())
+        entry._owner = self
+        self._entries.append(entry)
+        self._number_of_entry += 1
+        self._mark_dirty()
+        return entry
+
+    def clear(self):
+        del self._entries[:]
+        self._number_of_entry = 0
+        self._mark_dirty()
+
+    def pop(self):
+        entry = self._entries.pop()
+        self._number_of_entry -= 1
+        self._mark_dirty()
+        return entry
+
+    def load_sub_fields(self, bstr, header):
+        entries_bstr = read_stream_at(
+            bstr, self._entries_start_pos,
+            header.start_pos + header.box_size - self._entries_start_pos)
+        for i in range(self._number_of_entry):
+            entry = TrackFragmentRandomAccessBoxEntryFieldsList(
+                *self._get_numbers_sizes())
+            entry._owner = self
+            entry.parse_fields(entries_bstr, header)
+            self._entries.append(entry)
+        return self._entries_start_pos + entries_bstr.bytepos
 
     def parse_fields(self, bstr, header):
         super().parse_fields(bstr, header)
-        self._nalus_start_pos = bstr.bytepos
+        self._entries_start_pos = bstr.bytepos
+
+    def _get_numbers_sizes(self):
+        # The length sizes are the sizes in bytes minus 1
+        return tuple((length_size or 0) + 1 for length_size in
+                     (self._length_size_of_traf_num,
+                      self._length_size_of_trun_num,
+                      self._length_size_of_sample_num))
@@ -1,11 +1,22 @@
+import os
+from array import array
 from ctypes import c_uint32
 from datetime import datetime, timedelta
+from itertools import accumulate, chain
+
+import bitstring as bs
 
 from pybzparse import boxes as bx_def
 from pybzparse.headers import BoxHeader, FullBoxHeader
+from pybzparse.sources import read_at, readinto_at
 
 BEGIN = datetime(1904, 1, 1, 0, 0)
 MAX_UINT_32 = c_uint32(-1).value
+# Samples separated by at most this many bytes are read together
+SAMPLES_MAX_GAP = 64 * 1024
+# Maximum number of buffers filled by a single read
+_IOV_MAX = max(os.sysconf("SC_IOV_MAX"), 2) \
+    if "SC_IOV_MAX" in getattr(os, "sysconf_names", {}) else 1024
 
 
 def to_mp4_time(date_time):
@@ -26,6 +37,25 @@ def gen_sample_offsets(samples_sizes, samples_offsets):
             yield offset
 
 
+def get_samples_offsets(samples_sizes, samples_offsets):
+    """
+    :param samples_sizes: Sizes of the samples
+    :param samples_offsets: Offsets of the samples or offset of the first
+                            sample when the samples are contiguous
+    :type samples_offsets: int or sequence of int
+    :return: array of the offsets of the samples
+    """
+    if isinstance(samples_offsets, int):
+        offsets = array("Q", accumulate(chain((samples_offsets,),
+                                              samples_sizes)))
+        # Drop the end of the last sample
+        offsets.pop()
+        return offsets
+    if isinstance(samples_offsets, array):
+        return samples_offsets
+    return array("Q", samples_offsets)
+
+
 def make_mvhd(creation_time, modification_time, samples_count):
     # MOOV.MVHD
     mvhd = bx_def.MVHD(FullBoxHeader())
@@ -213,9 +243,7 @@ def make_trak(creation_time, modification_time, samples_sizes, samples_offsets):
 
     stsz.sample_size = (0,)
 
-    for samples_size in samples_sizes:
-        sample = stsz.append_and_return()
-        sample.entry_size = (samples_size,)
+    stsz.extend(entry_size=samples_sizes)
 
     stbl.append(stsz)
 
@@ -233,29 +261,21 @@ def make_trak(creation_time, modification_time, samples_sizes, samples_offsets):
 
     stbl.append(stsc)
 
-    # MOOV.TRAK.MDIA.MINF.STBL.STCO
-    co = bx_def.STCO(FullBoxHeader())
-    co.header.type = b"stco"
+    samples_offsets = get_samples_offsets(samples_sizes, samples_offsets)
+
+    # If an offset is bigger than 2^32-1, use the 64 bits implementation
+    if len(samples_offsets) and max(samples_offsets) > MAX_UINT_32:
+        # MOOV.TRAK.MDIA.MINF.STBL.CO64
+        co = bx_def.CO64(FullBoxHeader())
+        co.header.type = b"co64"
+    else:
+        # MOOV.TRAK.MDIA.MINF.STBL.STCO
+        co = bx_def.STCO(FullBoxHeader())
+        co.header.type = b"stco"
     co.header.version = (0,)
     co.header.flags = (b"\x00\x00\x00",)
 
-    for offset in gen_sample_offsets(samples_sizes, samples_offsets):
-        # If the offset gets bigger than 2^32-1, use the 64 bits implementation
-        if offset > MAX_UINT_32:
-            # MOOV.TRAK.MDIA.MINF.STBL.CO64
-            co = bx_def.CO64(FullBoxHeader())
-            co.header.type = b"co64"
-            co.header.version = (0,)
-            co.header.flags = (b"\x00\x00\x00",)
-            break
-        entry = co.append_and_return()
-        entry.chunk_offset = (offset,)
-
-    # If the offset gets bigger than 2^32-1, add again using co64
-    if isinstance(co, bx_def.CO64):
-        for offset in gen_sample_offsets(samples_sizes, samples_offsets):
-            entry = co.append_and_return()
-            entry.chunk_offset = (offset,)
+    co.extend(chunk_offset=samples_offsets)
 
     stbl.append(co)
 
@@ -419,6 +439,138 @@ def make_vide_trak(creation_time, modification_time, name,
     return trak
 
 
+def make_mvex(track_ids):
+    # MOOV.MVEX
+    mvex = bx_def.MVEX(BoxHeader())
+    mvex.header.type = b"mvex"
+
+    for track_id in track_ids:
+        # MOOV.MVEX.TREX
+        trex = bx_def.TREX(FullBoxHeader())
+
+        trex.header.type = b"trex"
+        trex.header.version = (0,)
+        trex.header.flags = (b"\x00\x00\x00",)
+
+        trex.track_id = (track_id,)
+        trex.default_sample_description_index = (1,)
+        # 1 img / sec, like the stts of make_trak
+        trex.default_sample_duration = (20,)
+        trex.default_sample_size = (0,)
+        trex.default_sample_flags = (0,)
+
+        mvex.append(trex)
+
+    return mvex
+
+
+def make_moof(sequence_number, trafs):
+    # MOOF
+    moof = bx_def.MOOF(BoxHeader())
+    moof.header.type = b"moof"
+
+    # MOOF.MFHD
+    mfhd = bx_def.MFHD(FullBoxHeader())
+
+    mfhd.header.type = b"mfhd"
+    mfhd.header.version = (0,)
+    mfhd.header.flags = (b"\x00\x00\x00",)
+    mfhd.sequence_number = (sequence_number,)
+
+    moof.append(mfhd)
+
+    for traf in trafs:
+        moof.append(traf)
+
+    return moof
+
+
+def make_traf(track_id, base_media_decode_time, samples_sizes):
+    # MOOF.TRAF
+    traf = bx_def.TRAF(BoxHeader())
+    traf.header.type = b"traf"
+
+    # MOOF.TRAF.TFHD
+    tfhd = bx_def.TFHD(FullBoxHeader())
+
+    tfhd.header.type = b"tfhd"
+    tfhd.header.version = (0,)
+    # default-base-is-moof: the data offsets are relative to the moof
+    tfhd.header.flags = (b"\x02\x00\x00",)
+    tfhd.track_id = (track_id,)
+
+    traf.append(tfhd)
+
+    # MOOF.TRAF.TFDT
+    tfdt = bx_def.TFDT(FullBoxHeader())
+
+    tfdt.header.type = b"tfdt"
+    tfdt.header.version = (1,)
+    tfdt.header.flags = (b"\x00\x00\x00",)
+    tfdt.base_media_decode_time = (base_media_decode_time,)
+
+    traf.append(tfdt)
+
+    # MOOF.TRAF.TRUN
+    trun = bx_def.TRUN(FullBoxHeader())
+
+    trun.header.type = b"trun"
+    trun.header.version = (0,)
+    # data-offset-present and sample-size-present, the durations are the
+    # defaults of the trex
+    trun.header.flags = (b"\x00\x02\x01",)
+    # to be set once the size of the moof is known
+    trun.data_offset = (0,)
+
+    trun.extend(sample_size=samples_sizes)
+
+    traf.append(trun)
+
+    return traf
+
+
+def make_tfra(track_id):
+    # MFRA.TFRA
+    tfra = bx_def.TFRA(FullBoxHeader())
+
+    tfra.header.type = b"tfra"
+    tfra.header.version = (1,)
+    tfra.header.flags = (b"\x00\x00\x00",)
+
+    tfra.track_id = (track_id,)
+    # traf, trun and sample numbers on 1 byte
+    tfra.length_size_of_traf_num = (0,)
+    tfra.length_size_of_trun_num = (0,)
+    tfra.length_size_of_sample_num = (0,)
+
+    return tfra
+
+
+def make_mfra(tfras):
+    # MFRA
+    mfra = bx_def.MFRA(BoxHeader())
+    mfra.header.type = b"mfra"
+
+    for tfra in tfras:
+        mfra.append(tfra)
+
+    # MFRA.MFRO
+    mfro = bx_def.MFRO(FullBoxHeader())
+
+    mfro.header.type = b"mfro"
+    mfro.header.version = (0,)
+    mfro.header.flags = (b"\x00\x00\x00",)
+    mfro.mfra_size = (0,)
+
+    mfra.append(mfro)
+
+    # == size of the whole mfra, found at the end of the file
+    mfra.refresh_box_size()
+    mfro.mfra_size = (mfra.header.box_size,)
+
+    return mfra
+
+
 def find_boxes(boxes, box_types):
     for box in boxes:
         if box.header.type in box_types:
@@ -468,21 +620,7 @@ def get_sample_table(trak):
 
 
 def get_sample_location(trak, index):
-    sample_location = None
-
-    stbl = get_sample_table(trak)
-
-    stco = next(find_boxes(stbl.boxes, [b"stco", b"co64"]))
-    stsz = next(find_boxes(stbl.boxes, b"stsz"))
-    if index < len(stco.entries):
-        offset = stco.entries[index].chunk_offset
-        if stsz.samples:
-            size = stsz.samples[index].entry_size
-        else:
-            size = stsz.sample_size
-        sample_location = (offset, size)
-
-    return sample_location
+    return trak.sample_index.get_location(index)
 
 
 def get_sample_bytes(bstr, trak, index):
@@ -492,5 +630,84 @@ def get_sample_bytes(bstr, trak, index):
         return None
 
     offset, size = location
-    bstr.bytepos = offset
-    return bstr.read("bytes:{}".format(size))
+    return read_at(bstr, offset, size)
+
+
+def get_samples_bytes(source, trak, indices, max_gap=SAMPLES_MAX_GAP):
+    """
+    Read the bytes of multiple samples of a trak. The samples are sorted by
+    offset and the ones close to each other are read together to limit the
+    number of reads
+
+    :param source: A bitstring, a file object or a file descriptor
+    :param trak: The trak of the samples
+    :param indices: Indices of the samples to read
+    :type indices: iterable of int
+    :param max_gap: Maximum number of unused bytes read to merge the reads of
+                    two samples
+    :type max_gap: int
+    :return: list of read-only memoryviews of the samples bytes in the order
+             of indices, None for the indices without a sample. The samples
+             of a memory-mapped source are views of its mapping, the others
+             are views of the buffers they were read in
+    """
+    sample_index = trak.sample_index
+    locations = [sample_index.get_location(index) for index in indices]
+    sorted_locations = sorted(set(location for location in locations
+                                  if location is not None))
+
+    if isinstance(source, bs.ConstBitStream):
+        samples = _read_samples(source, sorted_locations, max_gap)
+    else:
+        fd = source if isinstance(source, int) else source.fileno()
+        samples = _readinto_samples(fd, sorted_locations, max_gap)
+
+    # Duplicated indices get their own view of the same sample
+    return [memoryview(samples[location]).toreadonly()
+            if location is not None else None
+            for location in locations]
+
+
+def _coalesce_locations(locations, max_gap, max_count=None):
+    run = []
+    run_end = None
+    for offset, size in locations:
+        if run and (offset < run_end or offset - run_end > max_gap or
+                    len(run) == max_count):
+            yield run
+            run = []
+        run.append((offset, size))
+        run_end = offset + size
+    if run:
+        yield run
+
+
+def _read_samples(bstr, locations, max_gap):
+    samples = {}
+    for run in _coalesce_locations(locations, max_gap):
+        run_start = run[0][0]
+        data = memoryview(read_at(bstr, run_start, sum(run[-1]) - run_start))
+        for offset, size in run:
+            samples[(offset, size)] = data[offset - run_start:
+                                           offset - run_start + size]
+    return samples
+
+
+def _readinto_samples(fd, locations, max_gap):
+    samples = {}
+    # Bytes between samples are read in a scratch buffer
+    gap = memoryview(bytearray(max_gap))
+    # Each sample can be preceded by a gap
+    max_count = _IOV_MAX // 2
+    for run in _coalesce_locations(locations, max_gap, max_count):
+        buffers = []
+        buffers_end = run[0][0]
+        for offset, size in run:
+            if offset > buffers_end:
+                buffers.append(gap[:offset - buffers_end])
+            sample = bytearray(size)
+            buffers.append(sample)
+            samples[(offset, size)] = sample
+            buffers_end = offset + size
+        readinto_at(fd, buffers, run[0][0])
+    return samples
@@ -0,0 +1,182 @@
+""" Destinations of the serialized boxes """
+
+import errno
+import io
+import os
+
+import bitstring as bs
+
+from pybzparse.fields_lists import AbstractFieldsList
+from pybzparse.sources import PAYLOAD_CHUNK_SIZE, PayloadView
+
+# Errors of copy_file_range and sendfile when they don't support the files
+_UNSUPPORTED_COPY_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                            errno.EBADF, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+class FileWriter:
+    """ Writes the boxes to a file object as they are serialized """
+
+    def __init__(self, file):
+        """
+        :param file: Binary file object opened for writing
+        """
+        self._file = file
+        self._pos = 0
+
+    @property
+    def pos(self):
+        """ Number of bytes written """
+        return self._pos
+
+    def write(self, data):
+        data = memoryview(data)
+        self._file.write(data)
+        self._pos += data.nbytes
+
+    def write_fields(self, fields_list):
+        # Boxes override __bytes__, only pack the fields
+        self.write(AbstractFieldsList.__bytes__(fields_list))
+
+    def copy_from(self, source, offset, size):
+        """
+        Copy bytes of a source as they are. Between two files, the bytes are
+        copied by the kernel
+
+        :param source: A MappedBitStream, a FileReader or a bitstring
+        :param offset: Position of the bytes in the source
+        :type offset: int
+        :param size: Number of bytes to copy
+        :type size: int
+        """
+        src_fd = _get_fileno(source)
+        dst_fd = _get_fileno(self._file) if src_fd is not None else None
+        if dst_fd is None:
+            for chunk in PayloadView(source, offset, size).iter_chunks():
+                self.write(chunk)
+            return
+
+        self._file.flush()
+        copy_range(src_fd, dst_fd, offset, size)
+        # Let the file object find the position moved by the kernel
+        if self._file.seekable():
+            self._file.seek(0, os.SEEK_CUR)
+        self._pos += size
+
+
+class BufferWriter:
+    """ Writes the boxes in a preallocated writable buffer """
+
+    def __init__(self, buffer, offset=0):
+        """
+        :param buffer: writable bytes-like object large enough to hold the
+                       boxes
+        :type buffer: bytearray, memoryview, mmap.mmap
+        :param offset: position of the boxes in the buffer
+        :type offset: int
+        """
+        self._buffer = memoryview(buffer).cast("B")
+        self._pos = offset
+
+    @property
+    def pos(self):
+        """ Position following the bytes written in the buffer """
+        return self._pos
+
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        self._buffer[self._pos:self._pos + data.nbytes] = data
+        self._pos += data.nbytes
+
+    def write_fields(self, fields_list):
+        self._pos = fields_list.pack_into(self._buffer, self._pos)
+
+    def copy_from(self, source, offset, size):
+        """
+        Copy bytes of a source as they are
+
+        :param source: A MappedBitStream, a FileReader or a bitstring
+        :param offset: Position of the bytes in the source
+        :type offset: int
+        :param size: Number of bytes to copy
+        :type size: int
+        """
+        for chunk in PayloadView(source, offset, size).iter_chunks():
+            self.write(chunk)
+
+
+def get_writer(target):
+    """
+    :param target: A writer, a file object or a writable buffer
+    :return: the writer of the target
+    """
+    if isinstance(target, (FileWriter, BufferWriter)):
+        return target
+    if hasattr(target, "write"):
+        return FileWriter(target)
+    return BufferWriter(target)
+
+
+def _get_fileno(file):
+    try:
+        return file.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return None
+
+
+def write_all(fd, data):
+    """
+    Write all the bytes to a file descriptor
+
+    :param fd: File descriptor of the destination
+    :param data: bytes-like object to write
+    """
+    data = memoryview(data)
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _copy_file_range(src_fd, dst_fd, offset, size):
+    return os.copy_file_range(src_fd, dst_fd, size, offset)
+
+
+def _sendfile(src_fd, dst_fd, offset, size):
+    return os.sendfile(dst_fd, src_fd, offset, size)
+
+
+def _pread_write(src_fd, dst_fd, offset, size):
+    data = os.pread(src_fd, min(size, PAYLOAD_CHUNK_SIZE), offset)
+    write_all(dst_fd, data)
+    return len(data)
+
+
+_COPY_FUNCTIONS = tuple(
+    copy for name, copy in (("copy_file_range", _copy_file_range),
+                            ("sendfile", _sendfile))
+    if hasattr(os, name)) + (_pread_write,)
+
+
+def copy_range(src_fd, dst_fd, offset, size):
+    """
+    Copy bytes of a file at the position of another file, in the kernel
+    when it is supported
+
+    :param src_fd: File descriptor of the source
+    :param dst_fd: File descriptor of the destination
+    :param offset: Position of the bytes in the source
+    :param size: Number of bytes to copy
+    """
+    end = offset + size
+    for copy in _COPY_FUNCTIONS:
+        try:
+            while offset < end:
+                copied = copy(src_fd, dst_fd, offset, end - offset)
+                if not copied:
+                    raise bs.ReadError("Premature end of file")
+                offset += copied
+            return
+        except OSError as error:
+            # The last copy is plain reads and writes, its errors are real
+            if copy is _pread_write or \
+                    error.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                raise
@@ -17,7 +17,7 @@ setup(
     author_email="satya.ortiz-gagne@mila.quebec",
     description="MP4 / ISO base media file format (ISO/IEC 14496-12 - MPEG-4 Part 12) file parser",
     requires=["bitstring"],
-    install_requires=["bitstring"],
+    install_requires=["bitstring>=3.1,<4"],
     setup_requires=["pytest-runner"],
     tests_require=["pytest"],
     long_description=long_description,
@@ -1,6 +1,9 @@
 """ Benzina MP4 Parser based on https://github.com/use-sparingly/pymp4parse """
 
-from bitstring import pack
+import pickle
+
+import pytest
+from bitstring import pack, CreationError, ReadError
 
 from pybzparse import Parser, boxes as bx_def, fields_lists as flists
 from pybzparse.headers import FullBoxHeader, MAX_UINT_32
@@ -125,6 +128,155 @@ def test_full_box_header():
     assert bytes(full_box_header) == bs.bytes
 
 
+def test_full_box_header_extended_user_type():
+    bs = pack("uintbe:32, bytes:4, uintbe:64, bytes:16, uintbe:8, bits:24",
+              1, b"uuid", 100, b"a" * 16, 0, b"\x00\x00\x01")
+    box_header = Parser.parse_header(bs)
+    header_end = bs.bytepos
+    full_box_header = FullBoxHeader()
+    full_box_header.extend_header(bs, box_header)
+
+    # Only the version and flags are read after the box header
+    assert bs.bytepos == header_end + 4
+    assert full_box_header.type == b"uuid" + b"a" * 16
+    assert full_box_header.box_size == 100
+    assert full_box_header.header_size == 36
+    assert full_box_header.version == 0
+    assert full_box_header.flags == b"\x00\x00\x01"
+
+    assert bytes(full_box_header) == bs.bytes
+
+
+def test_fields_list_bytes_fallback():
+    fields_list = flists.BoxHeaderFieldsList()
+    fields_list.box_size = 8
+    fields_list.box_type = b"abcd"
+    assert bytes(fields_list) == pack("uintbe:32, bytes:4", 8, b"abcd").bytes
+
+    # Values which don't fit their type are still reported by bitstring
+    fields_list.box_size = -1
+    with pytest.raises(CreationError):
+        bytes(fields_list)
+
+    fields_list.box_size = 8
+    fields_list.box_type = b"abc"
+    with pytest.raises(CreationError):
+        bytes(fields_list)
+
+
+def test_schema_fields_list():
+    class SchemaFieldsList(flists.AbstractSchemaFieldsList):
+        _schema = (
+            flists.SchemaField("time", "uintbe:64", short_type="uintbe:32"),
+            flists.SchemaField("offset", "uintbe:32", flag=0x1),
+            flists.SchemaField("language", "uint:5", count=3),
+            flists.SchemaField("pad0", "bits:1", default=0x1, public=False),
+            flists.SchemaField("values", "uintbe:16", count=2),
+            flists.SchemaField("name_length", "uintbe:8"),
+            flists.SchemaField("name", "bytes", count="name_length"))
+
+    bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, "
+              "uintbe:32, uintbe:32, uint:5, uint:5, uint:5, bits:1, "
+              "uintbe:16, uintbe:16, uintbe:8, bytes:3",
+              30, b"test", 0, b"\x00\x00\x01",
+              10, 20, 1, 2, 3, "0b1", 4, 5, 3, b"abc")
+    header = FullBoxHeader()
+    header.parse(bs)
+
+    fields_list = SchemaFieldsList()
+    assert not hasattr(fields_list, "pad0")
+    fields_list.parse_fields(bs, header)
+    assert bs.bytepos == 30
+
+    assert fields_list.time == 10
+    assert fields_list.offset == 20
+    assert fields_list.language == [1, 2, 3]
+    assert fields_list.values == [4, 5]
+    assert fields_list.name == b"abc"
+    assert bytes(fields_list) == bs.bytes[12:]
+    assert fields_list._get_bytes_size() == 18
+
+    # Optional fields are skipped when their flag isn't set
+    bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, "
+              "uintbe:64, uint:5, uint:5, uint:5, bits:1, "
+              "uintbe:16, uintbe:16, uintbe:8, bytes:0",
+              27, b"test", 1, b"\x00\x00\x00",
+              10, 1, 2, 3, "0b1", 4, 5, 0, b"")
+    header = FullBoxHeader()
+    header.parse(bs)
+
+    fields_list = SchemaFieldsList()
+    fields_list.parse_fields(bs, header)
+    assert fields_list.time == 10
+    assert fields_list.offset is None
+    assert fields_list.name == b""
+    assert bytes(fields_list) == bs.bytes[12:]
+    assert fields_list._get_bytes_size() == 15
+
+
+def test_fields_list_slots():
+    entry = flists.EditListBoxEntryFieldsList()
+    # The values are kept in slots declared by the schema
+    assert not hasattr(entry, "__dict__")
+    assert entry.segment_duration is None
+
+    entry.segment_duration = (1, "uintbe:32")
+    entry.media_time = 2
+    entry.media_rate_integer = 1
+    entry.media_rate_fraction = 0
+    assert entry.segment_duration == 1
+    assert [field.type for field in entry.fields] == \
+        ["uintbe:32", "uintbe:64", "uintbe:16", "uintbe:16"]
+    assert bytes(entry) == pack("uintbe:32, uintbe:64, uintbe:16, uintbe:16",
+                                1, 2, 1, 0).bytes
+
+    # Instances of the same layout share their types
+    other = flists.EditListBoxEntryFieldsList()
+    other.segment_duration = (3, "uintbe:32")
+    assert other._types is entry._types
+
+
+def test_box_header_buffer():
+    bs = pack("bytes:2, uintbe:32, bytes:4, uintbe:64, bytes:16", b"\x00\x00",
+              1, b"uuid", MAX_UINT_32 + 1,
+              b":benzina\x00\x00\x00\x00\x00\x00\x00\x00")
+    box_header = Parser.parse_header_buffer(memoryview(bs.bytes), 2)
+
+    assert box_header.start_pos == 2
+    assert box_header.type == b"uuid:benzina\x00\x00\x00\x00\x00\x00\x00\x00"
+    assert box_header.box_size == MAX_UINT_32 + 1
+    assert box_header.header_size == 32
+    assert box_header.content_size == MAX_UINT_32 + 1 - 32
+    assert bytes(box_header) == bs.bytes[2:]
+
+
+def test_full_box_header_buffer():
+    bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24",
+              100, b"abcd", 1, b"\x00\x00\x07")
+    full_box_header = FullBoxHeader()
+    full_box_header.parse_buffer(bs.bytes)
+
+    assert full_box_header.start_pos == 0
+    assert full_box_header.type == b"abcd"
+    assert full_box_header.box_size == 100
+    assert full_box_header.header_size == 12
+    assert full_box_header.content_size == 88
+    assert full_box_header.version == 1
+    assert full_box_header.flags == b"\x00\x00\x07"
+
+    assert bytes(full_box_header) == bs.bytes
+
+
+def test_box_header_premature_end():
+    bs = pack("uintbe:32, bytes:4, uintbe:32", 1, b"abcd", 0)
+
+    with pytest.raises(ReadError):
+        Parser.parse_header(bs)
+
+    with pytest.raises(ReadError):
+        Parser.parse_header_buffer(bs.bytes[:6])
+
+
 def test_ftyp_box():
     bs = pack("uintbe:32, bytes:4, "
               "bytes:4, uintbe:32, bytes:12",
@@ -350,6 +502,24 @@ def test_elst_box():
     assert bytes(box) == bs.bytes
 
 
+def test_elst_box_entries_slots():
+    bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, "
+              "uintbe:32, uintbe:32, uintbe:32, uintbe:16, uintbe:16",
+              28, b"elst", 0, b"\x00\x00\x00",
+              1, 3000, 0, 1, 0)
+
+    box_header = Parser.parse_header(bs)
+    box = bx_def.ELST.parse_box(bs, box_header)
+    box.load(bs)
+
+    assert not hasattr(box.entries[0], "__dict__")
+    assert not hasattr(box.entries[0]._segment_duration, "__dict__")
+
+    box = pickle.loads(pickle.dumps(box))
+    assert box.entries[0].segment_duration == 3000
+    assert bytes(box) == bs.bytes
+
+
 def test_vmhd_box():
     bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, "
               "uintbe:16, uintbe:16, uintbe:16, uintbe:16",
@@ -573,6 +743,55 @@ def test_co64_box():
     assert bytes(box) == bs.bytes
 
 
+def test_stco_box_columns():
+    bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, "
+              "uintbe:32, uintbe:32, uintbe:32, uintbe:32",
+              28, b"stco", 0, b"\x00\x00\x00",
+              3, 0, 1, 2)
+
+    box_header = Parser.parse_header(bs)
+    stco = bx_def.STCO.parse_box(bs, box_header)
+    box = stco
+    box.load(bs)
+
+    assert list(box.columns["chunk_offset"]) == [0, 1, 2]
+    assert [entry.chunk_offset for entry in box.entries] == [0, 1, 2]
+    assert box.entries[-1].chunk_offset == 2
+
+    box.entries[1].chunk_offset = 10
+    assert box.columns["chunk_offset"][1] == 10
+
+    entry = box.pop()
+    assert entry.chunk_offset == 2
+    assert box.entry_count == 2
+    assert len(box.entries) == 2
+
+    entry = box.append_and_return()
+    entry.chunk_offset = 2
+    assert box.entry_count == 3
+    assert list(box.columns["chunk_offset"]) == [0, 10, 2]
+
+    with pytest.raises(IndexError):
+        box.entries[3]
+
+
+def test_ctts_box_v1_columns():
+    bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, "
+              "uintbe:32, uintbe:32, intbe:32, uintbe:32, intbe:32",
+              32, b"ctts", 1, b"\x00\x00\x00",
+              2, 1, -1, 2, 3)
+
+    box_header = Parser.parse_header(bs)
+    ctts = bx_def.CTTS.parse_box(bs, box_header)
+    box = ctts
+    box.load(bs)
+
+    assert list(box.columns["sample_count"]) == [1, 2]
+    assert list(box.columns["sample_offset"]) == [-1, 3]
+
+    assert bytes(box) == bs.bytes
+
+
 def test_dref_box():
     bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, uintbe:32",
               16, b"dref", 0, b"\x00\x00\x00", 1)
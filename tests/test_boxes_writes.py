@@ -1,5 +1,6 @@
 """ Benzina MP4 Parser based on https://github.com/use-sparingly/pymp4parse """
 
+import pytest
 from bitstring import pack
 
 from pybzparse import Parser, boxes as bx_def, fields_lists as flists
@@ -20,6 +21,18 @@ def test_header_fields_list():
     assert bytes(fields_list) == bs.bytes
 
 
+def test_header_fields_list_pack_into():
+    bs = pack("uintbe:32, bytes:4", 100, b"abcd")
+
+    fields_list = flists.BoxHeaderFieldsList()
+    fields_list.box_size = 100
+    fields_list.box_type = b'abcd'
+
+    buffer = bytearray(10)
+    assert fields_list.pack_into(buffer, 2) == 10
+    assert buffer == b"\0\0" + bs.bytes
+
+
 def test_header_extended_fields_list():
     bs = pack("uintbe:32, bytes:4, uintbe:64", 1, b"abcd", MAX_UINT_32 + 1)
 
@@ -980,6 +993,32 @@ def test_ctts_box_v1():
     assert bytes(box) == bs.bytes
 
 
+def test_ctts_box_v0_negative_offset():
+    box_header = FullBoxHeader()
+    ctts = bx_def.CTTS(box_header)
+
+    ctts.header.type = b"ctts"
+    ctts.header.version = 0
+    ctts.header.flags = b"\x00\x00\x00"
+
+    entry = ctts.append_and_return()
+    entry.sample_count = 1
+    entry.sample_offset = -1
+
+    ctts.refresh_box_size()
+
+    # The offsets of a version 0 box are unsigned
+    with pytest.raises(ValueError):
+        bytes(ctts)
+
+    ctts.header.version = 1
+    assert bytes(ctts)[-4:] == b"\xff\xff\xff\xff"
+
+    entry.sample_offset = 1 << 31
+    with pytest.raises(ValueError):
+        bytes(ctts)
+
+
 def test_stsz_box():
     bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, "
               "uintbe:32, uintbe:32, uintbe:32",
@@ -1138,6 +1177,48 @@ def test_co64_box():
     assert bytes(box) == bs.bytes
 
 
+def test_trun_box():
+    bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, "
+              "uintbe:32, intbe:32, "
+              "uintbe:32, intbe:32, uintbe:32, intbe:32",
+              36, b"trun", 1, b"\x00\x0a\x01",
+              2, 44,
+              10, -20, 30, 40)
+
+    box_header = FullBoxHeader()
+    trun = bx_def.TRUN(box_header)
+
+    trun.header.type = b"trun"
+    trun.header.version = 1
+    # data-offset, sample-size and sample-composition-time-offset present
+    trun.header.flags = b"\x00\x0a\x01"
+    trun.data_offset = 44
+
+    trun.extend(sample_size=[10, 30],
+                sample_composition_time_offset=[-20, 40])
+
+    trun.refresh_box_size()
+
+    box = trun
+
+    assert box.header.type == b"trun"
+    assert box.header.box_size == 36
+
+    assert box.sample_count == 2
+    assert box.data_offset == 44
+    assert box.first_sample_flags is None
+    assert len(box.samples) == 2
+    assert box.samples[1].sample_size == 30
+    assert box.samples[0].sample_composition_time_offset == -20
+    assert box.samples[0].sample_duration == 0
+
+    parsed_box = next(Parser.parse(bs))
+    parsed_box.load(bs)
+    assert list(parsed_box.columns["sample_size"]) == [10, 30]
+    assert bytes(parsed_box) == bs.bytes
+    assert bytes(box) == bs.bytes
+
+
 def test_dref_box():
     bs = pack("uintbe:32, bytes:4, uintbe:8, bits:24, uintbe:32",
               16, b"dref", 0, b"\x00\x00\x00", 1)
@@ -0,0 +1,182 @@
+import pytest
+from bitstring import ConstBitStream
+
+from pybzparse import Parser, headers
+from pybzparse.dataset import DatasetReader, DatasetWriter, \
+                              FragmentedDatasetWriter
+
+
+def _read_inputs():
+    inputs = []
+    for i in range(3):
+        with open("tests/data/small_vid_mdat_im{}".format(i), "rb") as f:
+            inputs.append(f.read())
+    return inputs
+
+
+def test_dataset_reader():
+    reader = DatasetReader("tests/data/small_dataset.out.mp4")
+    inputs = _read_inputs()
+
+    assert len(reader) == 3
+    assert set(reader.traks) == {b"VideoHandler\0", b"bzna_inputs\0",
+                                 b"bzna_fnames\0", b"bzna_targets\0"}
+
+    image, target, filename = reader[1]
+    assert image == inputs[1]
+    assert target == 1
+    assert filename == b"/path/image_2_name.JPEG"
+
+    assert [item.target for item in reader] == [0, 1, 0]
+    assert [item.filename for item in reader[1:]] == \
+           [b"/path/image_2_name.JPEG", b"/path/image_3_name.JPEG"]
+    assert reader[-1].input == inputs[2]
+
+    with pytest.raises(IndexError):
+        reader[3]
+
+
+def test_dataset_reader_close():
+    inputs = _read_inputs()
+
+    with DatasetReader("tests/data/small_dataset.out.mp4") as reader:
+        item = reader[0]
+        assert not reader.closed
+    assert reader.closed
+
+    # The items read before the reader was closed are still readable
+    assert item.input == inputs[0]
+    with pytest.raises(ValueError):
+        reader[0]
+    reader.close()
+
+
+def test_dataset_reader_missing_traks():
+    reader = DatasetReader("tests/data/small_dataset.out.mp4",
+                           targets_name=b"unknown\0", fnames_name=b"unknown\0")
+
+    assert reader[0] == (_read_inputs()[0], None, None)
+
+    with pytest.raises(ValueError):
+        DatasetReader("tests/data/small_dataset.out.mp4",
+                      inputs_name=b"unknown\0")
+
+
+def test_dataset_writer(tmp_path):
+    filename = str(tmp_path / "dataset.mp4")
+    inputs = _read_inputs()
+
+    with DatasetWriter(filename) as writer:
+        for i, input in enumerate(inputs):
+            assert writer.add(input, i - 1, "/path/{}".format(i)) == i
+        assert len(writer) == 3
+
+        with pytest.raises(ValueError):
+            writer.add(b"", target=None, filename="/path/3")
+
+    assert writer.closed
+
+    bstr = ConstBitStream(filename=filename)
+    boxes = [box for box in Parser.parse(bstr)]
+    assert [box.header.type for box in boxes] == \
+           [b"ftyp", b"free", b"mdat", b"moov"]
+    assert boxes[2].header.header_size == 8
+    assert boxes[2].header.box_size == 8 + sum(len(input) for input in inputs) + \
+        3 * 8 + len(b"/path/0") * 3
+
+    reader = DatasetReader(filename)
+    assert len(reader) == 3
+    assert [tuple(item) for item in reader] == \
+           [(inputs[i], i - 1, "/path/{}".format(i).encode())
+            for i in range(3)]
+
+
+def test_dataset_writer_large_mdat(tmp_path, monkeypatch):
+    filename = str(tmp_path / "dataset.mp4")
+    inputs = _read_inputs()
+
+    # Force the 64 bits size of the mdat
+    monkeypatch.setattr(headers, "MAX_UINT_32", sum(len(input) for input in inputs))
+
+    with DatasetWriter(filename) as writer:
+        for input in inputs:
+            writer.add(input)
+
+    bstr = ConstBitStream(filename=filename)
+    boxes = [box for box in Parser.parse(bstr)]
+    assert [box.header.type for box in boxes] == [b"ftyp", b"mdat", b"moov"]
+    assert boxes[1].header.header_size == 16
+
+    reader = DatasetReader(filename)
+    assert set(reader.traks) == {b"bzna_inputs\0"}
+    assert [tuple(item) for item in reader] == \
+           [(input, None, None) for input in inputs]
+
+
+def test_fragmented_dataset_writer(tmp_path):
+    filename = str(tmp_path / "dataset.mp4")
+    inputs = _read_inputs()
+
+    with FragmentedDatasetWriter(filename, fragment_size=2) as writer:
+        for i, input in enumerate(inputs):
+            file_size = writer._file.tell()
+            assert writer.add(input, i - 1, "/path/{}".format(i)) == i
+            # The inputs are written as they are added
+            assert writer._file.tell() >= file_size + len(input)
+        assert len(writer) == 3
+
+    bstr = ConstBitStream(filename=filename)
+    boxes = [box for box in Parser.parse(bstr)]
+    # The free boxes fill the room reserved for the moofs
+    assert [box.header.type for box in boxes] == \
+           [b"ftyp", b"moov", b"moof", b"free", b"mdat", b"moof", b"free",
+            b"mdat", b"mfra"]
+    assert boxes[3].header.box_size == 16
+    assert boxes[6].header.box_size == 16 + 3 * 4
+
+    mfra = boxes[-1]
+    mfra.load(bstr)
+    tfra = mfra.boxes[0]
+    assert tfra.track_id == 1
+    assert [entry.moof_offset for entry in tfra.entries] == \
+           [boxes[2].header.start_pos, boxes[5].header.start_pos]
+    assert [entry.time for entry in tfra.entries] == [0, 40]
+    assert mfra.boxes[-1].mfra_size == mfra.header.box_size
+
+    moof = boxes[5]
+    moof.load(bstr)
+    trun = moof.boxes[1].boxes[-1]
+    assert trun.sample_count == 1
+    assert list(trun.columns["sample_size"]) == [len(inputs[2])]
+
+    with FragmentedDatasetWriter(filename, append=True) as writer:
+        assert len(writer) == 3
+        assert writer.add(inputs[0], 2, "/path/3") == 3
+
+    reader = DatasetReader(filename)
+    assert len(reader) == 4
+    assert [tuple(item) for item in reader] == \
+           [(inputs[i % 3], i - 1, "/path/{}".format(i).encode())
+            for i in range(4)]
+
+
+def test_fragmented_dataset_reader_without_mfra(tmp_path):
+    filename = str(tmp_path / "dataset.mp4")
+    inputs = _read_inputs()
+
+    with FragmentedDatasetWriter(filename, fragment_size=2) as writer:
+        for input in inputs:
+            writer.add(input)
+
+    # The fragments are found by scanning the boxes following the moov
+    boxes = [box for box in Parser.parse(filename=filename)]
+    with open(filename, "r+b") as f:
+        f.truncate(boxes[-1].header.start_pos)
+
+    reader = DatasetReader(filename)
+    assert [tuple(item) for item in reader] == \
+           [(input, None, None) for input in inputs]
+
+    with pytest.raises(ValueError):
+        FragmentedDatasetWriter("tests/data/small_dataset.out.mp4",
+                                append=True)
@@ -0,0 +1,114 @@
+import pytest
+from bitstring import ConstBitStream
+
+from pybzparse import Parser, boxes as bx_def, faststart, \
+    headers as hd_def, utils
+
+
+def _parse(filename):
+    bstr = ConstBitStream(filename=filename)
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+    return bstr, boxes
+
+
+def _get_samples(filename):
+    bstr, boxes = _parse(filename)
+    trak = next(utils.find_boxes(next(utils.find_boxes(boxes, b"moov")).boxes,
+                                 b"trak"))
+    return [utils.get_sample_bytes(bstr, trak, i)
+            for i in range(len(trak.sample_index))]
+
+
+def test_relocate_moov(tmp_path):
+    filename = str(tmp_path / "small_vid.mp4")
+    faststart.relocate_moov("tests/data/small_vid.mp4", filename)
+
+    bstr, boxes = _parse(filename)
+    assert [box.header.type for box in boxes] == \
+           [b"ftyp", b"free", b"moov", b"mdat"]
+    assert bstr.len // 8 == 519080
+    assert _get_samples(filename) == _get_samples("tests/data/small_vid.mp4")
+
+    # The moov is already at the front
+    relocated_filename = str(tmp_path / "small_vid.relocated.mp4")
+    faststart.relocate_moov(filename, relocated_filename)
+    with open(filename, "rb") as f, open(relocated_filename, "rb") as g:
+        assert f.read() == g.read()
+
+    with pytest.raises(ValueError):
+        faststart.relocate_moov(filename, filename)
+
+
+def test_relocate_moov_co64(tmp_path, monkeypatch):
+    filename = str(tmp_path / "small_dataset.mp4")
+    # Force the upgrade of the chunk offsets to 64 bits
+    monkeypatch.setattr(faststart, "MAX_UINT_32", 1024)
+    faststart.relocate_moov("tests/data/small_dataset.out.mp4", filename)
+
+    _, boxes = _parse(filename)
+    moov = boxes[1]
+    assert moov.header.type == b"moov"
+    for trak in utils.find_boxes(moov.boxes, b"trak"):
+        stbl = utils.get_sample_table(trak)
+        assert stbl.boxes[-1].header.type == b"co64"
+
+    assert _get_samples(filename) == \
+        _get_samples("tests/data/small_dataset.out.mp4")
+
+
+def test_relocate_moov_no_moov(tmp_path):
+    with pytest.raises(ValueError):
+        faststart.relocate_moov("tests/data/photo.heic",
+                                str(tmp_path / "photo.heic"))
+
+
+def test_shift_item_locations():
+    _, boxes = _parse("tests/data/photo.heic")
+    iloc = next(utils.find_boxes(boxes[1].boxes, b"iloc"))
+    offsets = [(item.construction_method, extent.extent_offset)
+               for item in iloc.items for extent in item.extents]
+
+    faststart._shift_item_locations(iloc, lambda offset: offset + 10)
+
+    # Items in the idat are not moved
+    assert [extent.extent_offset for item in iloc.items
+            for extent in item.extents] == \
+           [offset + 10 if not construction_method else offset
+            for construction_method, offset in offsets]
+
+    with pytest.raises(ValueError):
+        faststart._shift_item_locations(iloc, lambda offset: offset << 32)
+
+
+def test_shift_item_locations_base_offset():
+    iloc = bx_def.ItemLocationBox(hd_def.FullBoxHeader())
+    iloc.offset_size = 4
+    iloc.length_size = 4
+    iloc.base_offset_size = 4
+    iloc.index_size = 0
+    iloc.item_count = 0
+
+    for item_id, base_offset, extents_offsets in ((1, 0, (100, 1000)),
+                                                  (2, 900, (0, 50)),
+                                                  (3, 0, ())):
+        item = iloc.append_and_return()
+        item.item_id = item_id
+        item.construction_method = 0
+        item.data_reference_index = 0
+        item.base_offset = base_offset
+        item.extent_count = 0
+        for extent_offset in extents_offsets:
+            extent = item.append_and_return()
+            extent.extent_offset = extent_offset
+            extent.extent_length = 10
+
+    faststart._shift_item_locations(
+        iloc, lambda offset: offset + 10 if offset >= 500 else offset)
+
+    # With a base offset of 0, the extents offsets are absolute
+    assert [(item.base_offset, [extent.extent_offset
+                                for extent in item.extents])
+            for item in iloc.items] == \
+        [(0, [100, 1010]), (910, [0, 50]), (0, [])]
@@ -0,0 +1,86 @@
+import os
+import shutil
+
+import pytest
+from bitstring import ConstBitStream
+
+from pybzparse import Parser, index, utils
+
+
+def _copy_video(tmp_path):
+    filename = str(tmp_path / "small_vid.mp4")
+    shutil.copyfile("tests/data/small_vid.mp4", filename)
+    return filename
+
+
+def _parse_video():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+
+    return boxes
+
+
+def test_write_read_index(tmp_path):
+    filename = _copy_video(tmp_path)
+    index_filename = index.write_index(filename)
+
+    assert index_filename == filename + ".bzidx"
+
+    boxes = _parse_video()
+    indexed_boxes = Parser.parse_index(filename)
+
+    def _assert_same_tree(boxes, indexed_boxes):
+        assert len(boxes) == len(indexed_boxes)
+        for box, indexed_box in zip(boxes, indexed_boxes):
+            assert indexed_box.header.type == box.header.type
+            assert indexed_box.header.start_pos == box.header.start_pos
+            assert indexed_box.header.header_size == box.header.header_size
+            assert indexed_box.header.box_size == box.header.box_size
+            assert indexed_box.header.content_size == box.header.content_size
+            _assert_same_tree(getattr(box, "boxes", []), indexed_box.boxes)
+
+    _assert_same_tree(boxes, indexed_boxes)
+
+    trak = next(utils.find_boxes(boxes, b"moov")).boxes[1]
+    indexed_trak = next(utils.find_boxes(indexed_boxes, b"moov")).boxes[1]
+
+    assert utils.get_name(indexed_trak) == utils.get_name(trak)
+
+    stbl = utils.get_sample_table(trak)
+    indexed_stbl = utils.get_sample_table(indexed_trak)
+    stsz = next(utils.find_boxes(stbl.boxes, b"stsz"))
+    indexed_stsz = next(utils.find_boxes(indexed_stbl.boxes, b"stsz"))
+    stco = next(utils.find_boxes(stbl.boxes, b"stco"))
+    indexed_stco = next(utils.find_boxes(indexed_stbl.boxes, b"stco"))
+
+    assert indexed_stsz.sample_size == stsz.sample_size
+    assert indexed_stsz.sample_count == stsz.sample_count
+    assert list(indexed_stsz.columns["entry_size"]) == \
+           [sample.entry_size for sample in stsz.samples]
+    assert list(indexed_stco.columns["chunk_offset"]) == \
+           [entry.chunk_offset for entry in stco.entries]
+
+    assert list(indexed_trak.sample_index.offsets) == \
+           list(trak.sample_index.offsets)
+    assert list(indexed_trak.sample_index.sizes) == \
+           list(trak.sample_index.sizes)
+    assert list(indexed_trak.sample_index.dts) == \
+           list(trak.sample_index.dts)
+
+
+def test_stale_index(tmp_path):
+    filename = _copy_video(tmp_path)
+    index_filename = str(tmp_path / "other.bzidx")
+    index.write_index(filename, index_filename=index_filename)
+
+    assert Parser.parse_index(filename, index_filename)
+
+    with open(filename, "ab") as f:
+        f.write(b"\0")
+
+    with pytest.raises(index.StaleIndexError):
+        Parser.parse_index(filename, index_filename)
+
+    assert not os.path.exists(filename + ".bzidx")
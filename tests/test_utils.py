@@ -1,9 +1,12 @@
+from array import array
 from datetime import datetime
 
+import pytest
 from bitstring import pack
 
 from pybzparse import boxes as bx_def, headers as hd_def
 import pybzparse.utils as utils
+from pybzparse.sample_index import SampleIndex, get_trafs_bases
 
 
 def test_to_mp4_date():
@@ -578,6 +581,32 @@ def test_make_vide_trak():
     assert pasp.v_spacing == 1
 
 
+def test_make_trak_arrays():
+    samples_sizes = array("I", [10, 20, 30])
+    trak = utils.make_trak(0, 0, samples_sizes, 100)
+    stbl = utils.get_sample_table(trak)
+    stsz = next(utils.find_boxes(stbl.boxes, b"stsz"))
+    stco = next(utils.find_boxes(stbl.boxes, b"stco"))
+
+    assert stsz.sample_count == 3
+    assert list(stsz.columns["entry_size"]) == [10, 20, 30]
+    assert stco.entry_count == 3
+    assert list(stco.columns["chunk_offset"]) == [100, 110, 130]
+
+    samples_offsets = array("Q", [0, utils.MAX_UINT_32, utils.MAX_UINT_32 + 10])
+    trak = utils.make_trak(0, 0, samples_sizes, samples_offsets)
+    stbl = utils.get_sample_table(trak)
+    co64 = next(utils.find_boxes(stbl.boxes, b"co64"))
+
+    assert co64.entry_count == 3
+    assert list(co64.columns["chunk_offset"]) == list(samples_offsets)
+    assert utils.get_sample_location(trak, 2) == (utils.MAX_UINT_32 + 10, 30)
+
+    stts = next(utils.find_boxes(stbl.boxes, b"stts"))
+    with pytest.raises(ValueError):
+        stts.extend(sample_count=[1, 2], sample_delta=[1])
+
+
 def test_find_boxes():
     boxes = [bx_def.UnknownBox(hd_def.BoxHeader()),
              bx_def.UnknownBox(hd_def.BoxHeader()),
@@ -660,3 +689,96 @@ def test_get_sample_location():
 
     assert utils.get_sample_location(trak, 0) == (23456, 12345)
     assert utils.get_sample_location(trak, 1) == (78901, 67890)
+    assert utils.get_sample_location(trak, 2) is None
+
+
+
+def test_get_sample_location_modified():
+    trak = utils.make_trak(0, 0, [10, 20, 30], [100, 200, 300])
+    stbl = utils.get_sample_table(trak)
+    stco = next(utils.find_boxes(stbl.boxes, b"stco"))
+    stsz = next(utils.find_boxes(stbl.boxes, b"stsz"))
+
+    assert utils.get_sample_location(trak, 1) == (200, 20)
+
+    stco.entries[1].chunk_offset = 999
+    assert utils.get_sample_location(trak, 1) == (999, 20)
+
+    stsz.columns["entry_size"][1] = 25
+    stsz.mark_dirty()
+    assert utils.get_sample_location(trak, 1) == (999, 25)
+
+    stco.append_and_return().chunk_offset = 400
+    stsz.append_and_return().entry_size = 40
+    assert utils.get_sample_location(trak, 3) == (400, 40)
+
+def test_get_sample_location_chunks():
+    trak = utils.make_meta_trak(0, 0, b"trak1\0", [10, 20, 30, 40, 50], 100)
+    stbl = utils.get_sample_table(trak)
+
+    # 2 chunks of 2 samples followed by a chunk of 1 sample
+    stsc = next(utils.find_boxes(stbl.boxes, b"stsc"))
+    stsc.entries[0].samples_per_chunk = 2
+    entry = stsc.append_and_return()
+    entry.first_chunk = 3
+    entry.samples_per_chunk = 1
+    entry.sample_description_index = 1
+
+    stco = next(utils.find_boxes(stbl.boxes, b"stco"))
+    stco.clear()
+    for offset in (100, 1000, 2000):
+        stco.append_and_return().chunk_offset = offset
+
+    assert [utils.get_sample_location(trak, i) for i in range(5)] == \
+           [(100, 10), (110, 20), (1000, 30), (1030, 40), (2000, 50)]
+    assert utils.get_sample_location(trak, -1) == (2000, 50)
+    assert utils.get_sample_location(trak, 5) is None
+
+    assert list(trak.sample_index.dts) == [0, 20, 40, 60, 80]
+
+
+def test_sample_index_trafs_implicit_base():
+    stbl = utils.get_sample_table(utils.make_trak(0, 0, [], 0))
+    moof_offset = 1000
+    trafs = [utils.make_traf(1, 0, [10, 20]),
+             utils.make_traf(1, 0, [30]),
+             utils.make_traf(1, 0, [40])]
+    for traf in trafs:
+        tfhd, trun = traf.boxes[0], traf.boxes[-1]
+        # Neither base-data-offset-present nor default-base-is-moof
+        tfhd.header.flags = (b"\x00\x00\x00",)
+        trun.data_offset = (100,)
+    # The data of the last traf directly follows the data of the previous
+    trafs[2].boxes[-1].header.flags = (b"\x00\x02\x00",)
+
+    sample_index = SampleIndex(stbl, get_trafs_bases(moof_offset, trafs))
+
+    # The first traf is based on the moof, the next trafs on the end of the
+    # data of the previous traf
+    assert list(sample_index.offsets) == [1100, 1110, 1230, 1260]
+    assert list(sample_index.sizes) == [10, 20, 30, 40]
+
+    sample_index = SampleIndex(stbl,
+                               get_trafs_bases(moof_offset, trafs[:1]) +
+                               get_trafs_bases(moof_offset + 500, trafs[1:2]))
+    assert list(sample_index.offsets) == [1100, 1110, 1600]
+
+
+def test_sample_index_trafs_implicit_base_tracks():
+    stbl = utils.get_sample_table(utils.make_trak(0, 0, [], 0))
+    moof_offset = 1000
+    trafs = [utils.make_traf(1, 0, [10, 20]), utils.make_traf(2, 0, [30])]
+    for traf in trafs:
+        traf.boxes[0].header.flags = (b"\x00\x00\x00",)
+    trafs[0].boxes[-1].data_offset = (100,)
+    # The data of the traf of the second track follows the data of the traf
+    # of the first track
+    trafs[1].boxes[-1].header.flags = (b"\x00\x02\x00",)
+
+    bases = get_trafs_bases(moof_offset, trafs)
+    assert [base_pos for _, base_pos in bases] == [1000, 1130]
+
+    sample_index = SampleIndex(stbl, [traf_base for traf_base in bases
+                                      if traf_base[0].boxes[0].track_id == 2])
+    assert list(sample_index.offsets) == [1130]
+    assert list(sample_index.sizes) == [30]
@@ -1,8 +1,17 @@
 """ Benzina MP4 Parser based on https://github.com/use-sparingly/pymp4parse """
 
-from bitstring import ConstBitStream
+import copy
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
-from pybzparse import Parser
+import pytest
+from bitstring import ConstBitStream, ReadError
+
+from pybzparse import Parser, boxes as bx_def, utils
+from pybzparse.boxes import UnknownBox
+from pybzparse.parser import IncrementalParser
+from pybzparse.sources import FileReader, MappedBitStream, PayloadView, \
+                              readinto_at
 
 
 # TODO: add test_video_guided_parsing
@@ -19,3 +28,595 @@ def test_video_bytes():
         box.load(bstr)
 
     assert b''.join([bytes(box) for box in boxes]) == bstr.bytes
+
+
+def test_video_mapped_bytes():
+    bstr = MappedBitStream("tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+
+    for box in boxes:
+        box.load(bstr)
+
+    mdat = next(box for box in boxes if box.header.type == b"mdat")
+
+    assert isinstance(mdat.data, memoryview)
+    assert mdat.data.obj is bstr.buffer.obj
+    assert len(mdat.data) == mdat.header.content_size
+    assert b''.join([bytes(box) for box in boxes]) == bstr.bytes
+
+
+def test_video_mapped_close():
+    bstr = MappedBitStream("tests/data/small_vid.mp4", offset_bytes=4)
+    assert bstr.read("bytes:4") == bstr.buffer[:4] == b"ftyp"
+    assert bstr.bytes == bstr.buffer
+
+    mapping = bstr.buffer.obj
+    bstr.close()
+    assert mapping.closed
+
+
+def test_video_payload_view(tmp_path):
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+
+    for box in boxes:
+        box.load(bstr)
+
+    mdat = next(box for box in boxes if box.header.type == b"mdat")
+    data = bstr.bytes[mdat.header.start_pos + mdat.header.header_size:
+                      mdat.header.start_pos + mdat.header.box_size]
+
+    # The payload is only read when it is accessed
+    assert isinstance(mdat.data, PayloadView)
+    assert mdat.data.offset == mdat.header.start_pos + mdat.header.header_size
+    assert len(mdat.data) == len(data)
+    assert mdat.data[10:20] == data[10:20]
+    assert mdat.data[-1] == data[-1]
+    assert b''.join(mdat.iter_data(chunk_size=4096)) == data
+    assert mdat.data == data
+
+    filename = str(tmp_path / "small_vid.mp4")
+    with open(filename, "wb") as f:
+        Parser.write(boxes, f)
+
+    with open(filename, "rb") as f:
+        assert f.read() == bstr.bytes
+
+
+def test_video_filename_parse():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(filename="tests/data/small_vid.mp4")]
+
+    assert [box.header.type for box in boxes] == \
+           [box.header.type for box in Parser.parse(bstr)]
+
+    free = boxes[1]
+    free.load(bstr)
+
+    assert free.header.type == b"free"
+    assert free.payload == bstr.bytes[free.header.start_pos + free.header.header_size:
+                                      free.header.start_pos + free.header.box_size]
+
+
+def test_video_lazy_parsing():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr, lazy=True)]
+    moov = boxes[-1]
+
+    assert moov.header.type == b"moov"
+    assert moov._boxes == []
+
+    box_iterator = Parser.parse(bstr, lazy=True)
+    bstr.pos = 0
+    assert next(box_iterator).header.type == b"ftyp"
+    pos = bstr.pos
+
+    trak = moov.boxes[1]
+
+    # Accessing the sub-boxes does not move the stream
+    assert bstr.pos == pos
+    assert next(box_iterator).header.type == b"free"
+    assert trak.header.type == b"trak"
+    assert trak._boxes == []
+    assert [box.header.type for box in trak.boxes] == \
+           [b"tkhd", b"edts", b"mdia"]
+
+    for box in boxes:
+        box.load(bstr)
+
+    assert b''.join([bytes(box) for box in boxes]) == bstr.bytes
+
+
+def test_video_paths_parsing():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr, paths={"moov/trak/mdia/minf/stbl/stsz",
+                                                      b"moov/mvhd"})]
+
+    assert [box.header.type for box in boxes] == \
+           [b"ftyp", b"free", b"mdat", b"moov"]
+    assert isinstance(boxes[0], UnknownBox)
+    assert isinstance(boxes[2], UnknownBox)
+
+    moov = boxes[-1]
+    assert isinstance(moov.boxes[0], bx_def.MVHD)
+    assert isinstance(moov.boxes[2], UnknownBox)
+
+    trak = moov.boxes[1]
+    assert isinstance(trak.boxes[0], UnknownBox)
+    stbl = trak.boxes[-1].boxes[-1].boxes[-1]
+    assert stbl.header.type == b"stbl"
+    assert [type(box) for box in stbl.boxes] == \
+           [UnknownBox, UnknownBox, UnknownBox, bx_def.STSZ, UnknownBox]
+    assert stbl.boxes[3].sample_count == 3
+
+    bstr.pos = 0
+    lazy_boxes = [box for box in Parser.parse(bstr, lazy=True,
+                                              paths=["moov/trak/mdia/minf/stbl/stsz"])]
+    lazy_stbl = lazy_boxes[-1].boxes[1].boxes[-1].boxes[-1].boxes[-1]
+    assert [type(box) for box in lazy_stbl.boxes] == \
+           [type(box) for box in stbl.boxes]
+
+    for box in boxes:
+        box.load(bstr)
+
+    assert b''.join([bytes(box) for box in boxes]) == bstr.bytes
+
+
+def test_video_write(tmp_path):
+    bstr = MappedBitStream("tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+
+    filename = str(tmp_path / "small_vid.mp4")
+    with open(filename, "wb") as f:
+        assert Parser.write(boxes, f) == len(bstr.bytes)
+    with open(filename, "rb") as f:
+        assert f.read() == bstr.bytes
+
+    buffer = bytearray(len(bstr.bytes))
+    assert Parser.write(boxes, buffer) == len(buffer)
+    assert buffer == bstr.bytes
+
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    buffer = bytearray(moov.header.box_size)
+    assert moov.write_to(memoryview(buffer)) == len(buffer)
+    assert buffer == bytes(moov)
+
+    with pytest.raises(ValueError):
+        moov.write_to(bytearray(moov.header.box_size - 1))
+
+
+def test_video_write_unmodified(tmp_path):
+    bstr = MappedBitStream("tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr, paths=["moov/trak/mdia/hdlr"])]
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    trak = next(utils.find_boxes(moov.boxes, b"trak"))
+    mdia = next(utils.find_boxes(trak.boxes, b"mdia"))
+    hdlr = next(utils.find_boxes(mdia.boxes, b"hdlr"))
+    mdat = next(utils.find_boxes(boxes, b"mdat"))
+    mdat.load(bstr)
+
+    # The boxes which weren't decoded are copied as they are
+    filename = str(tmp_path / "small_vid.mp4")
+    with open(filename, "wb") as f:
+        f.write(b"\0" * 4)
+        assert Parser.write(boxes, f) == len(bstr.bytes)
+        assert f.tell() == len(bstr.bytes) + 4
+    with open(filename, "rb") as f:
+        assert f.read() == b"\0" * 4 + bstr.bytes
+
+    hdlr.name = b"LongerVideoHandler\0"
+    assert [box._is_unmodified() for box in (hdlr, mdia, trak, moov)] == \
+        [False] * 4
+    assert mdat._is_unmodified()
+    # minf isn't decoded
+    assert mdia.boxes[-1]._is_unmodified()
+
+    moov.refresh_box_size()
+    buffer = bytearray(sum(box.header.box_size for box in boxes))
+    Parser.write(boxes, buffer)
+
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    trak = next(utils.find_boxes(moov.boxes, b"trak"))
+    mdia = next(utils.find_boxes(trak.boxes, b"mdia"))
+    next(utils.find_boxes(mdia.boxes, b"hdlr")).name = \
+        b"LongerVideoHandler\0"
+    moov.refresh_box_size()
+    assert buffer == b''.join(bytes(box) for box in boxes)
+
+
+def test_video_write_modified_entries():
+    bstr = MappedBitStream("tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    stbl = utils.get_sample_table(moov.boxes[1])
+    stsz = next(utils.find_boxes(stbl.boxes, b"stsz"))
+    stco = next(utils.find_boxes(stbl.boxes, b"stco"))
+
+    stco.entries[0].chunk_offset = 12345
+    stsz.samples[0].entry_size = 7
+    assert not stco._is_unmodified() and not stsz._is_unmodified()
+
+    buffer = bytearray(sum(box.header.box_size for box in boxes))
+    Parser.write(boxes, buffer)
+    assert buffer == b''.join(bytes(box) for box in boxes)
+    assert buffer != bstr.bytes
+
+
+def test_video_write_unmodified_error(tmp_path):
+    bstr = MappedBitStream("tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+
+    filename = str(tmp_path / "small_vid.mp4")
+    open(filename, "wb").close()
+    with open(filename, "rb") as f:
+        with pytest.raises(OSError):
+            Parser.write(boxes, f)
+
+
+def test_video_patch(tmp_path):
+    filename = str(tmp_path / "small_vid.mp4")
+    shutil.copyfile("tests/data/small_vid.mp4", filename)
+
+    bstr = MappedBitStream(filename, writable=True)
+    boxes = [box for box in Parser.parse(bstr, paths=[
+        "moov/mvhd", "moov/trak/mdia/hdlr", "moov/trak/mdia/minf/stbl/stco"])]
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    moov.load(bstr)
+    mvhd, trak = moov.boxes[:2]
+    mdia = next(utils.find_boxes(trak.boxes, b"mdia"))
+    hdlr = next(utils.find_boxes(mdia.boxes, b"hdlr"))
+    stco = utils.get_sample_table(trak).boxes[-1]
+
+    mvhd.timescale = 600
+    mvhd.patch(bstr.buffer)
+    hdlr.name = b"AudioHandler\0"
+    hdlr.patch(bstr.buffer)
+    stco.columns["chunk_offset"][0] = 50
+    stco.patch(bstr.buffer)
+    mdia.patch(bstr.buffer)
+
+    hdlr.name = b"LongerVideoHandler\0"
+    with pytest.raises(ValueError):
+        hdlr.patch(bstr.buffer)
+    with pytest.raises(ValueError):
+        stco.append_and_return()
+        stco.patch(bstr.buffer)
+
+    bstr.flush()
+    del bstr, boxes, moov, mvhd, trak, mdia, hdlr, stco
+
+    bstr = ConstBitStream(filename=filename)
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    trak = moov.boxes[1]
+
+    assert bstr.len == ConstBitStream(filename="tests/data/small_vid.mp4").len
+    assert moov.boxes[0].timescale == 600
+    assert utils.get_name(trak) == b"AudioHandler\0"
+    assert list(utils.get_sample_table(trak).boxes[-1]
+                .columns["chunk_offset"]) == [50]
+
+
+def test_video_refresh_box_size():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    mvhd, trak = moov.boxes[:2]
+    mdia = next(utils.find_boxes(trak.boxes, b"mdia"))
+    hdlr = next(utils.find_boxes(mdia.boxes, b"hdlr"))
+    stbl = utils.get_sample_table(trak)
+    stsz = next(utils.find_boxes(stbl.boxes, b"stsz"))
+
+    assert not moov.dirty
+    moov_size = moov.header.box_size
+
+    # Changing a value doesn't change the size
+    hdlr.pre_defined = 1
+    assert not mdia.dirty
+
+    hdlr.name = b"LongerVideoHandler\0"
+    assert [box.dirty for box in (hdlr, mdia, trak, moov)] == [True] * 4
+    assert not mvhd.dirty and not stbl.dirty
+
+    stsz.extend(entry_size=[10, 20])
+    assert stbl.dirty
+
+    moov.refresh_box_size()
+
+    assert not mdia.dirty
+    assert moov.header.box_size == moov_size + 6 + 8
+    for box in (moov, trak, mdia, hdlr, stbl, stsz):
+        assert box.header.box_size == len(bytes(box))
+
+
+
+def test_video_refresh_box_size_clean():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    moov_bytes = bytes(moov)
+
+    moov.refresh_box_size()
+
+    assert not moov.dirty
+    assert moov._is_unmodified()
+    edts = next(utils.find_boxes(moov.boxes[1].boxes, b"edts"))
+    assert edts.boxes[0]._source is not None
+
+    buffer = bytearray(len(moov_bytes))
+    moov.write_to(buffer)
+    assert buffer == moov_bytes
+
+
+def test_video_refresh_box_size_entries():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    trak = moov.boxes[1]
+    edts = next(utils.find_boxes(trak.boxes, b"edts"))
+    elst = edts.boxes[0]
+    assert elst.header.type == b"elst"
+    moov_size = moov.header.box_size
+    elst_size = elst.header.box_size
+
+    # Changing a value of an entry marks the box and its containers modified
+    elst.entries[0].media_time = elst.entries[0].media_time
+    assert not elst._is_unmodified() and not moov._is_unmodified()
+    assert not elst.dirty
+
+    entry = elst.append_and_return()
+    entry.segment_duration = 1
+    entry.media_time = 0
+    entry.media_rate_integer = 1
+    entry.media_rate_fraction = 0
+
+    moov.refresh_box_size()
+
+    assert elst.header.box_size == elst_size + 20
+    assert moov.header.box_size == moov_size + 20
+    for box in (moov, trak, edts, elst):
+        assert box.header.box_size == len(bytes(box))
+
+
+def test_video_refresh_box_size_replaced():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+
+    free = next(utils.find_boxes(boxes, b"free"))
+    moov = next(utils.find_boxes(boxes, b"moov"))
+    trak = moov.boxes[1]
+    mdia = next(utils.find_boxes(trak.boxes, b"mdia"))
+    mvhd, tkhd, mdhd = moov.boxes[0], trak.boxes[0], mdia.boxes[0]
+    moov_size = moov.header.box_size
+
+    # Boxes replaced in the lists of clean containers
+    moov.boxes[0] = free
+    mdia.boxes[0] = copy.deepcopy(mdhd)
+
+    moov.refresh_box_size()
+
+    assert moov.header.box_size == moov_size - mvhd.header.box_size + \
+        free.header.box_size
+    for box in (moov, trak, mdia):
+        assert box.header.box_size == len(bytes(box))
+        assert not box._is_unmodified()
+    assert tkhd._is_unmodified()
+
+    buffer = bytearray(moov.header.box_size)
+    moov.write_to(buffer)
+    assert buffer == bytes(moov)
+
+
+def test_video_get_samples_bytes():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+    trak = boxes[-1].boxes[1]
+
+    indices = [2, 0, 5, 2, -1]
+    samples_bytes = [utils.get_sample_bytes(bstr, trak, index)
+                     for index in indices]
+    assert samples_bytes[2] is None
+
+    assert utils.get_samples_bytes(bstr, trak, indices) == samples_bytes
+    assert utils.get_samples_bytes(MappedBitStream("tests/data/small_vid.mp4"),
+                                   trak, indices) == samples_bytes
+
+    with open("tests/data/small_vid.mp4", "rb") as f:
+        # Read the samples separately or all at once
+        for max_gap in (0, 1024 * 1024):
+            assert utils.get_samples_bytes(f, trak, indices, max_gap) == \
+                   samples_bytes
+            assert utils.get_samples_bytes(f.fileno(), trak, indices,
+                                           max_gap) == samples_bytes
+        assert f.tell() == 0
+
+        # The samples are read-only views whatever the source and the
+        # duplicated indices get their own view
+        for source in (bstr, MappedBitStream("tests/data/small_vid.mp4"), f):
+            samples = utils.get_samples_bytes(source, trak, indices)
+            assert [type(sample) for sample in samples] == \
+                   [memoryview, memoryview, type(None), memoryview,
+                    memoryview]
+            assert all(sample.readonly for sample in samples
+                       if sample is not None)
+            assert samples[0] is not samples[3]
+
+        # A memory-mapped source isn't copied
+        mapped = MappedBitStream("tests/data/small_vid.mp4")
+        sample = utils.get_samples_bytes(mapped, trak, [0])[0]
+        assert sample.obj is mapped.buffer.obj
+
+        with pytest.raises(ReadError):
+            readinto_at(f.fileno(), [bytearray(16)], 519070)
+
+
+def test_video_shared_reader():
+    bstr = MappedBitStream("tests/data/small_vid.mp4")
+    boxes = [box for box in Parser.parse(bstr)]
+    for box in boxes:
+        box.load(bstr)
+    trak = boxes[-1].boxes[1]
+
+    samples_bytes = [bytes(utils.get_sample_bytes(bstr, trak, index))
+                     for index in range(3)]
+
+    # Payloads and samples are read without moving the stream
+    bstr.pos = 0
+    boxes[1].load(bstr)
+    boxes[2].load(bstr)
+    assert utils.get_sample_bytes(bstr, trak, 1) == samples_bytes[1]
+    assert bstr.pos == 0
+
+    # So are the entries of the sample tables
+    moov = [box for box in Parser.parse(bstr)][-1]
+    bstr.pos = 0
+    moov.load(bstr)
+    assert bstr.pos == 0
+    assert bytes(moov) == bytes(boxes[-1])
+
+    with FileReader("tests/data/small_vid.mp4") as reader, \
+            ThreadPoolExecutor(4) as executor:
+        assert reader.read_at(40, 8) == bytes(boxes[2].header)
+        assert utils.get_sample_bytes(reader, trak, 2) == samples_bytes[2]
+
+        moov = [box for box in Parser.parse(bstr)][-1]
+        moov.load(reader)
+        assert bytes(moov) == bytes(boxes[-1])
+
+        indices = [i % 3 for i in range(64)]
+        for source in (bstr, reader):
+            results = executor.map(
+                lambda index: utils.get_sample_bytes(source, trak, index),
+                indices)
+            assert [bytes(result) for result in results] == \
+                   [samples_bytes[index] for index in indices]
+
+        with pytest.raises(ReadError):
+            reader.read_at(519070, 16)
+
+
+def test_video_parse_many(tmp_path):
+    truncated = str(tmp_path / "truncated.mp4")
+    with open("tests/data/small_vid.mp4", "rb") as f:
+        data = f.read()
+    with open(truncated, "wb") as f:
+        f.write(data[:-100])
+
+    paths = ["tests/data/small_vid.mp4", truncated,
+             "tests/data/photo.heic", str(tmp_path / "missing.mp4")]
+    results = list(Parser.parse_many(paths, workers=2, load=True))
+
+    assert [result.path for result in results] == paths
+
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    assert results[0].error is None
+    assert b''.join([bytes(box) for box in results[0].boxes]) == bstr.bytes
+
+    assert results[1].boxes is None
+    assert results[1].error is not None
+
+    assert results[2].error is None
+    assert [box.header.type for box in results[2].boxes] == \
+           [b"ftyp", b"meta", b"mdat"]
+
+    assert results[3].boxes is None
+    assert isinstance(results[3].error, FileNotFoundError)
+
+    results = list(Parser.parse_many(paths[:1], headers_only=True,
+                                     ordered=False))
+
+    assert [header.type for header in results[0].boxes] == \
+           [b"ftyp", b"free", b"mdat", b"moov"]
+
+
+def test_video_incremental_parsing():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    data = bstr.bytes
+
+    for chunk_size in (1, 7, 4096, len(data)):
+        parser = IncrementalParser()
+        boxes = []
+        for i in range(0, len(data), chunk_size):
+            parser.feed(data[i:i + chunk_size])
+            boxes.extend(parser.boxes_ready())
+            assert len(parser._buffer) < max(chunk_size, 512)
+        parser.close()
+
+        moov = boxes[-1]
+        mdat = next(box for box in boxes if box.header.type == b"mdat")
+
+        assert [box.header.type for box in boxes
+                if box.header.type in (b"ftyp", b"free", b"mdat", b"trak",
+                                       b"moov")] == \
+               [b"ftyp", b"free", b"mdat", b"trak", b"moov"]
+        assert mdat.header.start_pos == 40
+        assert mdat.header.box_size == 518258
+        assert mdat.data is None
+        assert moov.header.start_pos == 518298
+        assert [box.header.type for box in moov.boxes] == \
+               [b"mvhd", b"trak", b"udta"]
+        assert bytes(moov) == \
+               data[moov.header.start_pos:
+                    moov.header.start_pos + moov.header.box_size]
+        for box in (boxes[1], moov):
+            buffer = bytearray(box.header.box_size)
+            box.write_to(buffer)
+            assert buffer == data[box.header.start_pos:
+                                  box.header.start_pos + box.header.box_size]
+
+        stbl = moov.boxes[1].boxes[-1].boxes[-1].boxes[-1]
+        assert stbl.header.start_pos == 518699
+        assert stbl.boxes_start_pos == 518707
+
+
+def test_video_incremental_parsing_premature_end():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+
+    parser = IncrementalParser()
+    parser.feed(bstr.bytes[:-100])
+
+    with pytest.raises(ReadError):
+        parser.close()
+
+
+def test_video_incremental_parsing_mdat_to_end():
+    bstr = ConstBitStream(filename="tests/data/small_vid.mp4")
+    data = bstr.bytes
+    # An mdat of size 0 runs to the end of the stream
+    data = data[:40] + b"\x00\x00\x00\x00mdat" + data[48:]
+
+    parser = IncrementalParser()
+    for i in range(0, len(data), 4096):
+        parser.feed(data[i:i + 4096])
+    parser.close()
+
+    boxes = parser.boxes_ready()
+    assert [box.header.type for box in boxes] == [b"ftyp", b"free", b"mdat"]
+    assert parser.pos == len(data)
+
+    parser = IncrementalParser()
+    with pytest.raises(ReadError):
+        parser.feed(data[:32] + b"\x00\x00\x00\x04free")